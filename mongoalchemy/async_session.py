@@ -0,0 +1,185 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' An :class:`AsyncSession` is a :class:`~mongoalchemy.session.Session` for
+    *asyncio* applications.  Queries are built exactly as they are with a
+    ``Session``, but the operations which talk to the database are coroutines
+    which run the blocking *pymongo* calls in an executor, so the event loop
+    keeps running while they wait::
+
+        s = AsyncSession(some_db)
+        async with s:
+            await s.insert(some_obj)
+            async for obj in s.query(SomeClass).filter(SomeClass.age > 10):
+                ...
+            await s.execute(s.query(SomeClass).set(SomeClass.age, 0))
+
+    ``async for`` over a query fetches and unwraps its results in batches of
+    :attr:`~mongoalchemy.query.QueryResult.async_batch_size` in the executor.
+    Results are unwrapped by the same code as the blocking API, so
+    identity maps, trusted unwrapping and generated codecs all apply.
+
+    By default each session has its own single thread executor, so the
+    operations of a session are run one at a time and in the order they were
+    awaited, just as they would be by a ``Session``.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from mongoalchemy.session import Session
+from mongoalchemy.util import run_in_executor
+
+
+class AsyncSession(object):
+
+    def __init__(self, database, executor=None, **kwargs):
+        '''
+        Create an asynchronous session connecting to `database`.
+
+        :param database: the database to connect to, as for \
+            :class:`~mongoalchemy.session.Session`.  May also be an existing \
+            ``Session``, which is then wrapped
+        :param executor: the :class:`concurrent.futures.Executor` blocking \
+            operations are run in.  By default the session creates its own \
+            single thread executor, which :func:`close` shuts down.  A shared \
+            executor with more than one worker must not run two operations \
+            of the same session at once
+        :param kwargs: keyword arguments for the ``Session`` init function \
+            (``safe``, ``autoflush``, ``insert_batch_size``, ``identity_map``)
+
+        **Fields**:
+            * session: the underlying :class:`~mongoalchemy.session.Session`
+            * executor: the executor operations are run in
+        '''
+        if isinstance(database, Session):
+            if kwargs:
+                raise TypeError('Session arguments given for an existing session')
+            session = database
+        else:
+            session = Session(database, **kwargs)
+        self.__own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1)
+        self.session = session
+        self.executor = session.executor = executor
+
+    @classmethod
+    def connect(cls, database, safe=False, *args, **kwds):
+        ''' Create a connection as :func:`~mongoalchemy.session.Session.connect`
+            does and return an asynchronous session using it.  The
+            ``executor`` keyword argument is passed to the init function.'''
+        executor = kwds.pop('executor', None)
+        return AsyncSession(Session.connect(database, safe, *args, **kwds),
+            executor=executor)
+
+    @property
+    def db(self):
+        return self.session.db
+
+    @property
+    def backend(self):
+        return self.session.backend
+
+    @property
+    def identity_map(self):
+        return self.session.identity_map
+
+    def run(self, fun, *args, **kwargs):
+        ''' Returns an awaitable for ``fun(*args, **kwargs)`` run in the
+            session's executor.  Use it for the blocking methods which have
+            no coroutine here, e.g. ``await s.run(query.one)``'''
+        return run_in_executor(self.executor, fun, *args, **kwargs)
+
+    def query(self, type):
+        ''' Begin a query on the database's collection for `type`.  Use
+            ``async for`` to iterate over the results.
+
+         .. seealso:: :func:`~mongoalchemy.session.Session.query`'''
+        return self.session.query(type)
+
+    def remove_query(self, type):
+        ''' Begin a remove query on the database's collection for `type`.
+            Run it with :func:`execute`.'''
+        return self.session.remove_query(type)
+
+    def clear(self):
+        ''' Clear the queue of database operations without executing any of
+             the pending operations'''
+        self.session.clear()
+
+    async def insert(self, item, safe=None):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.insert` '''
+        return await self.run(self.session.insert, item, safe=safe)
+
+    async def update(self, item, *args, **kwargs):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.update` '''
+        return await self.run(self.session.update, item, *args, **kwargs)
+
+    async def remove(self, obj, safe=None):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.remove` '''
+        return await self.run(self.session.remove, obj, safe=safe)
+
+    async def flush(self, safe=None):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.flush` '''
+        return await self.run(self.session.flush, safe=safe)
+
+    async def find_and_modify(self, expression):
+        ''' Execute the find and modify expression ``expression`` (created
+            with :func:`~mongoalchemy.query.Query.find_and_modify`) and return
+            the unwrapped document.'''
+        return await self.run(self.session.execute_find_and_modify, expression)
+
+    async def execute(self, expression):
+        ''' Execute an update, find and modify or remove expression and
+            return the result of its ``execute`` method.'''
+        return await self.run(expression.execute)
+
+    async def ensure_indexes(self, *classes, **kwargs):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.ensure_indexes` '''
+        return await self.run(self.session.ensure_indexes, *classes, **kwargs)
+
+    async def get_indexes(self, cls):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.get_indexes` '''
+        return await self.run(self.session.get_indexes, cls)
+
+    async def clear_collection(self, *classes):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.clear_collection` '''
+        return await self.run(self.session.clear_collection, *classes)
+
+    async def end(self):
+        ''' Coroutine for :func:`~mongoalchemy.session.Session.end` '''
+        return await self.run(self.session.end)
+
+    async def close(self):
+        ''' End the session and shut down its executor if the session
+            created it.  The session can't be used afterwards.'''
+        try:
+            await self.end()
+        finally:
+            if self.__own_executor:
+                self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.end()
+        return False
@@ -0,0 +1,193 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+'''
+
+A backend is the storage engine a :class:`~mongoalchemy.session.Session`
+sends its operations to.  The interface is the subset of the *pymongo*
+database, collection and cursor API which MongoAlchemy uses, so a pymongo
+``Database`` is wrapped by the thin :class:`PymongoBackend` and its
+collections and cursors are used as they are.  Other engines, like the
+in-memory :class:`~mongoalchemy.memory.MemoryBackend`, implement
+:class:`Backend`, :class:`BackendCollection` and :class:`BackendCursor`::
+
+    >>> from mongoalchemy.memory import MemoryBackend
+    >>> session = Session(MemoryBackend())
+
+Query specs, update documents, sort specifications and field lists are
+passed in the form MongoDB (and pymongo) expect them, exactly as they are
+produced by :class:`~mongoalchemy.query.Query` and
+:class:`~mongoalchemy.update_expression.UpdateExpression`.
+
+'''
+
+
+class Backend(object):
+    ''' A database.  Collections are looked up by name with
+        ``backend[name]``. '''
+
+    #: The name of the database
+    name = None
+
+    def __getitem__(self, name):
+        ''' Returns the :class:`BackendCollection` called ``name``, creating it
+            if needed.'''
+        raise NotImplementedError()
+
+    def end_request(self):
+        ''' Called when a session ends, to release any resources held for the
+            current thread '''
+        pass
+
+
+class BackendCollection(object):
+    ''' A collection of documents.  The methods take the same arguments as
+        the pymongo 1.x/2.x ``Collection`` methods with the same names. '''
+
+    #: The name of the collection
+    name = None
+
+    #: The ``database.collection`` name of the collection
+    full_name = None
+
+    def find(self, spec=None, fields=None):
+        ''' Returns a :class:`BackendCursor` for the documents matching
+            ``spec``, including only ``fields`` (a list of names or a dict of
+            names to booleans) if it is not ``None``.'''
+        raise NotImplementedError()
+
+    def insert(self, doc_or_docs, safe=False):
+        ''' Insert a document or a list of documents, setting their ``_id``
+            if they don't have one.  Returns the id or list of ids.
+            Documents can be :class:`~mongoalchemy.raw.RawDocument` objects,
+            which always have an ``_id``.'''
+        raise NotImplementedError()
+
+    def save(self, to_save, safe=False):
+        ''' Insert ``to_save``, or replace the document with the same
+            ``_id``.  Returns the ``_id``.  ``to_save`` can be a
+            :class:`~mongoalchemy.raw.RawDocument`.'''
+        raise NotImplementedError()
+
+    def update(self, spec, document, upsert=False, multi=False, safe=False):
+        ''' Apply the update document (or replacement) ``document`` to the
+            first document matching ``spec``, or to all of them with ``multi``.'''
+        raise NotImplementedError()
+
+    def remove(self, spec_or_id=None, safe=False):
+        ''' Remove the documents matching ``spec_or_id`` (a spec or an
+            ``_id``), or every document if it is ``None``.'''
+        raise NotImplementedError()
+
+    def find_and_modify(self, query={}, update=None, upsert=False, sort=None,
+            fields=None, new=False, remove=False):
+        ''' Atomically update (or remove) the first document matching
+            ``query`` and return it, as it was before the update unless
+            ``new`` is set.'''
+        raise NotImplementedError()
+
+    def ensure_index(self, key_or_list, unique=False, drop_dups=False,
+            sparse=False):
+        ''' Create an index on the ``(field, direction)`` pairs in
+            ``key_or_list`` if it doesn't exist yet.'''
+        raise NotImplementedError()
+
+    def index_information(self):
+        ''' Returns the indexes on the collection in the pymongo format '''
+        raise NotImplementedError()
+
+
+class BackendCursor(object):
+    ''' The results of a find.  ``sort``, ``hint``, ``limit`` and ``skip``
+        modify the cursor before it is iterated and return it.'''
+
+    def sort(self, key_or_list, direction=None):
+        raise NotImplementedError()
+
+    def hint(self, index):
+        raise NotImplementedError()
+
+    def limit(self, limit):
+        raise NotImplementedError()
+
+    def skip(self, skip):
+        raise NotImplementedError()
+
+    def batch_size(self, batch_size):
+        ''' Sets the number of documents fetched at a time '''
+        raise NotImplementedError()
+
+    def count(self, with_limit_and_skip=False):
+        raise NotImplementedError()
+
+    def distinct(self, key):
+        raise NotImplementedError()
+
+    def explain(self):
+        raise NotImplementedError()
+
+    def rewind(self):
+        raise NotImplementedError()
+
+    def buffered(self):
+        ''' The number of results which have been fetched from the server
+            but not returned yet, or ``None`` if the cursor doesn't know.
+            Used to find the batch boundaries of profiled queries.'''
+        return None
+
+    def clone(self):
+        raise NotImplementedError()
+
+    def __getitem__(self, index):
+        raise NotImplementedError()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        raise NotImplementedError()
+
+
+class PymongoBackend(Backend):
+    ''' The :class:`Backend` for a pymongo ``Database``.  Its collections are
+        the pymongo collections themselves.'''
+
+    def __init__(self, database):
+        self.database = database
+        self.name = database.name
+
+    def __getitem__(self, name):
+        return self.database[name]
+
+    def end_request(self):
+        self.database.connection.end_request()
+
+    def __getattr__(self, name):
+        # Anything else (commands, etc.) is done on the database itself
+        return getattr(self.database, name)
+
+
+def get_backend(database):
+    ''' Returns ``database`` if it is a :class:`Backend`, otherwise wraps the
+        pymongo ``Database`` in a :class:`PymongoBackend` '''
+    if isinstance(database, Backend):
+        return database
+    return PymongoBackend(database)
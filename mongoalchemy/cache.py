@@ -0,0 +1,483 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Process-wide caches of query results and documents.
+
+    A :class:`QueryCache` given to sessions stores the documents returned by
+    their queries, so identical queries are answered without a round trip
+    until the entry expires or is evicted::
+
+        cache = QueryCache(max_entries=1000, ttl=30)
+        session = Session(db, cache=cache)
+
+    The :class:`DocumentCache` enabled with :func:`enable_document_cache` is
+    a second level cache of single documents by ``_id``, used by every
+    session.  Queries for one ``_id`` (like
+    ``session.query(Account).filter(Account.mongo_id == id).one()``) are
+    answered from it, and :func:`~mongoalchemy.document.Document.commit` and
+    flushed inserts write the saved documents through to it::
+
+        enable_document_cache(max_bytes=64 * 1024 * 1024)
+
+    Any write to a collection through a session using the query cache
+    (updates, removes, find and modify and flushed inserts) drops the cached
+    query results for that collection.  Writes to a single ``_id`` drop that
+    document from the document cache; other writes drop all of the
+    collection's documents.  Writes made by other processes, by sessions
+    without the query cache, or by other means than sessions and ``commit``,
+    are only seen once the entries
+    expire, so ``ttl`` is the longest a result can be stale.
+
+    Results are only stored once they have been read to the end.  Documents
+    are copied in and out of the caches, so changing a loaded object never
+    changes what later queries return.
+'''
+
+import threading
+import time
+import weakref
+from collections import namedtuple, OrderedDict
+from copy import deepcopy
+from bson import BSON
+from mongoalchemy.backend import BackendCursor
+from mongoalchemy.query import _canonical
+from mongoalchemy.query_expression import RE_TYPE
+from mongoalchemy.raw import RawDocument
+
+#: A snapshot of the counters of a :class:`QueryCache` or
+#: :class:`DocumentCache`.  ``entries`` is the number of cached results (or
+#: documents) and ``size`` their total size: the number of entries for a
+#: :class:`QueryCache`, the number of BSON bytes for a :class:`DocumentCache`.
+#: ``stores`` is the number of entries added, ``evictions`` the entries
+#: dropped to stay within the cache's limit, ``expirations`` the entries
+#: found to be older than ``ttl`` and ``invalidations`` the entries dropped
+#: because of writes.
+CacheStats = namedtuple('CacheStats', ('entries', 'size', 'hits', 'misses',
+    'stores', 'evictions', 'expirations', 'invalidations'))
+
+#: The process-wide :class:`DocumentCache`, if one is enabled
+document_cache = None
+
+
+class _Cache(object):
+    # An LRU cache with a time to live, whose keys are tuples starting with
+    # the (database name, collection name) namespace of the entry.  Each
+    # entry has a size; the least recently used entries are evicted to keep
+    # the total size within limit.  Every namespace has a generation, which
+    # changes when entries in it are invalidated, so that results read
+    # while a write happened aren't stored
+    def __init__(self, limit, ttl, clock):
+        self.limit = limit
+        self.ttl = ttl
+        self.clock = clock
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__keys = {}
+        self.__generations = {}
+        self.__size = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__stores = 0
+        self.__evictions = 0
+        self.__expirations = 0
+        self.__invalidations = 0
+
+    def _get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+                self.__discard(key)
+                self.__expirations += 1
+                entry = None
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[0]
+
+    def _put(self, key, value, size, generation=None):
+        # Stores value unless the namespace was invalidated since generation
+        # was read.  Without a generation, the value is written through:
+        # reads which started before it aren't stored
+        namespace = key[0]
+        with self.__lock:
+            if generation is None:
+                self.__bump(namespace)
+            elif self.__generations.get(namespace, 0) != generation:
+                return
+            self.__discard(key)
+            if size > self.limit:
+                return
+            expires = None if self.ttl is None else self.clock() + self.ttl
+            self.__entries[key] = (value, expires, size)
+            self.__keys.setdefault(namespace, set()).add(key)
+            self.__size += size
+            self.__stores += 1
+            while self.__size > self.limit:
+                self.__discard(next(iter(self.__entries)))
+                self.__evictions += 1
+
+    def _discard(self, key):
+        with self.__lock:
+            self.__bump(key[0])
+            if self.__discard(key):
+                self.__invalidations += 1
+
+    def generation(self, namespace):
+        ''' A number which changes whenever entries of the collection
+            ``namespace`` are invalidated '''
+        return self.__generations.get(namespace, 0)
+
+    def invalidate(self, namespace):
+        ''' Drop the cached entries of the collection ``namespace``, a
+            ``(database name, collection name)`` pair '''
+        with self.__lock:
+            self.__bump(namespace)
+            keys = list(self.__keys.get(namespace, ()))
+            for key in keys:
+                self.__discard(key)
+            self.__invalidations += len(keys)
+
+    def clear(self):
+        ''' Drop all cached entries '''
+        with self.__lock:
+            for namespace in self.__keys:
+                self.__bump(namespace)
+            self.__entries.clear()
+            self.__keys.clear()
+            self.__size = 0
+
+    def stats(self):
+        ''' Returns the current :data:`CacheStats` '''
+        with self.__lock:
+            return CacheStats(len(self.__entries), self.__size, self.__hits,
+                self.__misses, self.__stores, self.__evictions,
+                self.__expirations, self.__invalidations)
+
+    def __bump(self, namespace):
+        self.__generations[namespace] = self.__generations.get(namespace, 0) + 1
+
+    def __discard(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return False
+        self.__size -= entry[2]
+        keys = self.__keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.__keys[key[0]]
+        return True
+
+
+class QueryCache(_Cache):
+    ''' An LRU cache of query results with a time to live.  Sessions
+        created with the cache register its listeners (see :func:`attach`),
+        so their writes invalidate it; :func:`close` unregisters them.
+    '''
+    def __init__(self, max_entries=1000, ttl=60, max_result_size=1000,
+            clock=time.monotonic):
+        '''
+        :param max_entries: the maximum number of cached results.  The least \
+            recently used ones are evicted first
+        :param ttl: how long a result is cached, in seconds.  ``None`` keeps \
+            results until they are evicted or invalidated
+        :param max_result_size: results with more documents than this are \
+            not cached
+        :param clock: the function giving the current time, in seconds
+        '''
+        super(QueryCache, self).__init__(max_entries, ttl, clock)
+        self.max_result_size = max_result_size
+        self.__sessions = weakref.WeakSet()
+
+    def attach(self, session):
+        ''' Register the listeners invalidating the cache on ``session``.
+            Called by :class:`~mongoalchemy.session.Session` for sessions
+            created with ``cache=`` this cache.'''
+        if session in self.__sessions:
+            return
+        session.add_listener(after_write=self.after_write,
+            after_flush=self.after_flush)
+        self.__sessions.add(session)
+
+    def detach(self, session):
+        ''' Unregister the listeners registered by :func:`attach` '''
+        if session not in self.__sessions:
+            return
+        session.remove_listener(after_write=self.after_write,
+            after_flush=self.after_flush)
+        self.__sessions.discard(session)
+
+    def close(self):
+        ''' Clear the cache and stop listening for writes.  Sessions using
+            the cache must not be used afterwards.'''
+        for session in list(self.__sessions):
+            self.detach(session)
+        self.clear()
+
+    def key(self, namespace, query, spec, fields):
+        ''' The key of the results of ``query`` (with the query document
+            ``spec`` and the field names ``fields``) in the collection
+            ``namespace`` '''
+        return (namespace, _canonical(spec), tuple(query.sort),
+            None if fields is None else tuple(sorted(fields)),
+            tuple(query.hints), query.get_skip(), query.get_limit())
+
+    def get(self, key):
+        ''' The cached documents for ``key``, or ``None`` '''
+        return self._get(key)
+
+    def put(self, key, documents, generation):
+        ''' Cache ``documents`` for ``key``, unless the collection has been
+            invalidated since ``generation`` was read '''
+        self._put(key, documents, 1, generation)
+
+    def cursor(self, session, query, collection, spec, fields, find):
+        ''' A cursor for the results of ``query``: a :class:`CachedCursor`
+            if they are cached, otherwise the cursor returned by ``find()``,
+            recording its documents for the cache.  Used by
+            :func:`~mongoalchemy.session.Session.execute_query`.'''
+        namespace = (session.backend.name, collection.name)
+        key = self.key(namespace, query, spec, fields)
+        generation = self.generation(namespace)
+        documents = self.get(key)
+        if documents is not None:
+            return CachedCursor(documents, find)
+        return RecordingCursor(find(), self, key, generation)
+
+    def _record(self, document):
+        return deepcopy(document)
+
+    def _recorded(self, key, documents, generation):
+        self.put(key, documents, generation)
+
+    def after_write(self, event):
+        ''' The session listener invalidating the collection written to '''
+        self.invalidate((event.session.backend.name, event.collection))
+
+    def after_flush(self, event):
+        ''' The session listener invalidating the collections inserted into '''
+        name = event.session.backend.name
+        for collection in set(item.get_collection_name() for item in event.session.queue):
+            self.invalidate((name, collection))
+
+
+class DocumentCache(_Cache):
+    ''' An LRU cache of documents by collection and ``_id``, kept as BSON
+        within a memory budget.  See :func:`enable_document_cache`.'''
+
+    #: Id queries for more than one document aren't cached
+    max_result_size = 1
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=None,
+            clock=time.monotonic):
+        '''
+        :param max_bytes: the maximum total size of the cached documents, \
+            in BSON bytes.  The least recently used ones are evicted first
+        :param ttl: how long a document is cached, in seconds.  ``None`` \
+            keeps documents until they are evicted or invalidated
+        :param clock: the function giving the current time, in seconds
+        '''
+        super(DocumentCache, self).__init__(max_bytes, ttl, clock)
+
+    def get(self, namespace, id):
+        ''' A copy of the cached document with the ``_id`` ``id`` in the
+            collection ``namespace``, or ``None`` '''
+        data = self._get((namespace, id))
+        return None if data is None else BSON(data).decode()
+
+    def put(self, namespace, document, generation=None):
+        ''' Cache (a copy of) ``document``, which must have an ``_id``.
+            With a ``generation``, as returned by :func:`generation`, it is
+            only cached if the collection hasn't been written to since.
+            Without, it is written through, as when it is saved.'''
+        data = _encode(document)
+        if data is None:
+            self.discard(namespace, document['_id'])
+        else:
+            self._put((namespace, document['_id']), data, len(data), generation)
+
+    def discard(self, namespace, id):
+        ''' Drop the document with the ``_id`` ``id`` '''
+        self._discard((namespace, id))
+
+    def cursor(self, session, query, collection, spec, fields, find):
+        ''' A cursor for the results of ``query`` if it is a lookup by
+            ``_id`` (of whole documents), otherwise ``None``.  The cursor is a
+            :class:`CachedCursor` if the document is cached, or the cursor
+            returned by ``find()``, recording the document.'''
+        id = _lookup_id(spec)
+        if id is _NOT_AN_ID or fields is not None or query.get_skip():
+            return None
+        namespace = (session.backend.name, collection.name)
+        generation = self.generation(namespace)
+        data = self._get((namespace, id))
+        if data is not None:
+            return CachedCursor([data], find, load=_decode)
+        return RecordingCursor(find(), self, (namespace, id), generation)
+
+    def _record(self, document):
+        return _encode(document)
+
+    def _recorded(self, key, documents, generation):
+        if len(documents) == 1 and documents[0] is not None:
+            self._put(key, documents[0], len(documents[0]), generation)
+
+    def after_write(self, event):
+        ''' The session listener dropping the documents written to '''
+        namespace = (event.session.backend.name, event.collection)
+        id = _lookup_id(event.spec)
+        if id is _NOT_AN_ID:
+            self.invalidate(namespace)
+        else:
+            self.discard(namespace, id)
+
+
+_NOT_AN_ID = object()
+
+def _lookup_id(spec):
+    # The _id a query document is for, if it is {'_id' : value}
+    if not isinstance(spec, dict) or len(spec) != 1:
+        return _NOT_AN_ID
+    id = spec.get('_id', _NOT_AN_ID)
+    if isinstance(id, (dict, list, RE_TYPE)):
+        return _NOT_AN_ID
+    try:
+        hash(id)
+    except TypeError:
+        return _NOT_AN_ID
+    return id
+
+def _encode(document):
+    if type(document) is RawDocument:
+        return bytes(document.raw)
+    try:
+        return BSON.encode(document)
+    except Exception:
+        return None
+
+def _decode(data):
+    return BSON(data).decode()
+
+def enable_document_cache(max_bytes=16 * 1024 * 1024, ttl=None):
+    ''' Start caching documents by ``_id`` for every session in a new
+        :class:`DocumentCache` and return it.  Takes the arguments of
+        :class:`DocumentCache`.'''
+    from mongoalchemy.session import add_global_listener
+    global document_cache
+    disable_document_cache()
+    cache = DocumentCache(max_bytes=max_bytes, ttl=ttl)
+    add_global_listener(after_write=cache.after_write)
+    document_cache = cache
+    return cache
+
+def disable_document_cache():
+    ''' Stop caching documents '''
+    from mongoalchemy.session import remove_global_listener
+    global document_cache
+    if document_cache is not None:
+        remove_global_listener(after_write=document_cache.after_write)
+    document_cache = None
+
+
+class CachedCursor(BackendCursor):
+    ''' A cursor over cached results, which are copied with ``load``.
+        Anything but reading them (e.g. ``count`` or ``explain``) is done by
+        a real cursor, created with ``find()`` when it is first needed.'''
+    def __init__(self, documents, find, load=deepcopy):
+        self.documents = documents
+        self.find = find
+        self.load = load
+        self.__position = 0
+        self.__cursor = None
+
+    def __next__(self):
+        if self.__position >= len(self.documents):
+            raise StopIteration
+        self.__position += 1
+        return self.load(self.documents[self.__position - 1])
+
+    def __getitem__(self, index):
+        return self.load(self.documents[index])
+
+    def rewind(self):
+        self.__position = 0
+        return self
+
+    def clone(self):
+        return CachedCursor(self.documents, self.find, self.load)
+
+    def buffered(self):
+        return len(self.documents) - self.__position
+
+    def __real(self):
+        if self.__cursor is None:
+            self.__cursor = self.find()
+        return self.__cursor
+
+    def count(self, with_limit_and_skip=False):
+        return self.__real().count(with_limit_and_skip=with_limit_and_skip)
+
+    def distinct(self, key):
+        return self.__real().distinct(key)
+
+    def explain(self):
+        return self.__real().explain()
+
+
+class RecordingCursor(object):
+    ''' Wraps the cursor of a query which wasn't cached, keeping a copy of
+        the documents it returns.  They are given to the cache when the
+        cursor is exhausted, unless there are more than the cache's
+        ``max_result_size``.'''
+    def __init__(self, cursor, cache, key, generation):
+        self.cursor = cursor
+        self.cache = cache
+        self.key = key
+        self.generation = generation
+        self.documents = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            value = next(self.cursor)
+        except StopIteration:
+            if self.documents is not None:
+                self.cache._recorded(self.key, self.documents, self.generation)
+                self.documents = None
+            raise
+        if self.documents is not None:
+            if len(self.documents) < self.cache.max_result_size:
+                self.documents.append(self.cache._record(value))
+            else:
+                self.documents = None
+        return value
+
+    def rewind(self):
+        self.cursor.rewind()
+        self.documents = []
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
@@ -0,0 +1,315 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+'''
+
+A compiled codec is a pair of ``wrap`` and ``unwrap`` functions generated
+for a single :class:`~mongoalchemy.document.Document` subclass.  They are used
+instead of the generic :func:`~mongoalchemy.document.Document.wrap` and
+:func:`~mongoalchemy.document.Document.unwrap` when the document's
+``config_compiled_codec`` option is set::
+
+    >>> class Event(Document):
+    ...     config_compiled_codec = True
+    ...     name = StringField()
+    ...     count = IntField(min_value=0)
+
+The generated functions look up every field by its ``db_field`` directly and
+inline the type and range checks of the built-in scalar fields (and of lists,
+sets and dicts of them), skipping the per-field wrapper layers added by
+:class:`~mongoalchemy.fields.FieldMeta`.  Anything which isn't inlined ---
+custom fields, fields with user-supplied validators, ``None`` values, values
+which fail the inlined checks --- is handed to the field's own ``wrap`` or
+``unwrap``, so results and exceptions are the same as with the generic path.
+
+Codecs are generated the first time they are needed, so the bounds of the
+fields (``min_value``, ``max_length``, etc.) are read at that point.
+
+'''
+
+from datetime import datetime
+from pymongo.objectid import ObjectId
+
+from mongoalchemy.util import UNSET
+from mongoalchemy.exceptions import MissingValueException
+from mongoalchemy.fields import Field, StringField, IntField, FloatField, \
+        BoolField, DateTimeField, ObjectIdField, AnythingField, ListField, \
+        SetField, DictField
+
+
+class Codec(object):
+    ''' The generated functions for one document class.
+
+        **Fields**:
+            * type: the :class:`~mongoalchemy.document.Document` subclass
+            * wrap: function taking a document and returning its SON form
+            * unwrap: function taking a SON object and returning a document
+            * source: the generated source code, for debugging
+    '''
+    def __init__(self, type, wrap, unwrap, source):
+        self.type = type
+        self.wrap = wrap
+        self.unwrap = unwrap
+        self.source = source
+
+
+def get_codec(cls):
+    ''' Returns the :class:`Codec` for the document class ``cls``,
+        generating it on first use.'''
+    codec = cls.__dict__.get('_compiled_codec')
+    if codec is None:
+        codec = compile_codec(cls)
+        cls._compiled_codec = codec
+    return codec
+
+
+def _wrap_slow(doc, name, field, res):
+    # The per-field logic of Document.wrap, for values which aren't simply
+    # stored on the document (defaults, computed values, missing values)
+    try:
+        value = getattr(doc, name)
+        if value is None and field._allow_none:
+            return
+    except AttributeError:
+        if field.required:
+            raise MissingValueException(name)
+        return
+    res[field.db_field] = field.wrap(value)
+
+
+class _Namespace(dict):
+    def add(self, prefix, value):
+        name = '%s_%d' % (prefix, len(self))
+        self[name] = value
+        return name
+
+
+def _has_validators(field):
+    return field.validator is not None or field.unwrap_validator is not None \
+            or field.wrap_validator is not None
+
+
+def _bounds(ns, x, field, length=False):
+    checks = []
+    subject = 'len(%s)' % x if length else x
+    if field.min is not None:
+        checks.append('%s >= %s' % (subject, ns.add('min', field.min)))
+    if field.max is not None:
+        checks.append('%s <= %s' % (subject, ns.add('max', field.max)))
+    return checks
+
+
+def _scalar(ns, field, x, wrap):
+    ''' Returns ``(check, convert)`` expressions for a scalar field applied
+        to the variable ``x``, or ``None`` if the field can't be inlined '''
+    if _has_validators(field):
+        return None
+    kind = type(field)
+    if kind is StringField:
+        checks = ['isinstance(%s, str)' % x] + _bounds(ns, x, field, length=True)
+        return ' and '.join(checks), 'str(%s)' % x
+    if kind is IntField:
+        checks = ['isinstance(%s, int)' % x] + _bounds(ns, x, field)
+        return ' and '.join(checks), 'int(%s)' % x
+    if kind is FloatField:
+        checks = ['isinstance(%s, float)' % x] + _bounds(ns, x, field)
+        return ' and '.join(checks), 'float(%s)' % x
+    if kind is BoolField:
+        return 'isinstance(%s, bool)' % x, x
+    if kind is DateTimeField:
+        checks = ['isinstance(%s, datetime)' % x] + _bounds(ns, x, field)
+        return ' and '.join(checks), x
+    if kind is ObjectIdField:
+        return 'isinstance(%s, ObjectId)' % x, x
+    if kind is AnythingField:
+        return 'True', x
+    return None
+
+
+def _container(ns, field, x, wrap):
+    ''' Returns ``(check, convert)`` expressions for a list, set or dict of
+        inlinable scalars, or ``None`` '''
+    if _has_validators(field):
+        return None
+    kind = type(field)
+    if kind in (ListField, SetField):
+        item = _scalar(ns, field.item_type, '_i', wrap)
+        if item is None:
+            return None
+        item_check, item_convert = item
+        if kind is ListField:
+            type_check = 'isinstance(%s, (list, tuple))' % x
+        elif wrap:
+            type_check = 'isinstance(%s, set)' % x
+        else:
+            type_check = 'isinstance(%s, list)' % x
+        checks = [type_check] + _bounds(ns, x, field, length=True)
+        if item_check != 'True':
+            checks.append('all(%s for _i in %s)' % (item_check, x))
+        if kind is SetField and not wrap:
+            convert = '{%s for _i in %s}' % (item_convert, x)
+        else:
+            convert = '[%s for _i in %s]' % (item_convert, x)
+        return ' and '.join(checks), convert
+    if kind is DictField:
+        value = _scalar(ns, field.value_type, '_v', wrap)
+        if value is None:
+            return None
+        value_check, value_convert = value
+        item_check = "isinstance(_k, str) and '.' not in _k and '$' not in _k"
+        if value_check != 'True':
+            item_check = '%s and %s' % (item_check, value_check)
+        checks = ['isinstance(%s, dict)' % x,
+            'all(%s for _k, _v in %s.items())' % (item_check, x)]
+        convert = '{_k: %s for _k, _v in %s.items()}' % (value_convert, x)
+        return ' and '.join(checks), convert
+    return None
+
+
+def _document_field(field):
+    from mongoalchemy.document import DocumentField
+    return type(field) is DocumentField and not _has_validators(field)
+
+
+def _document_list(field):
+    return type(field) is ListField and not _has_validators(field) and \
+            _document_field(field.item_type)
+
+
+def can_construct(cls, fields):
+    ''' Whether documents of class ``cls`` with the fields ``fields`` can be
+        built without calling ``__init__``, because neither the class nor its
+        fields customize how values are set '''
+    from mongoalchemy.document import Document
+    if cls.__init__ is not Document.__init__:
+        return False
+    for field in fields:
+        if type(field).set_value is not Field.set_value:
+            return False
+    return True
+
+
+def plain_get(field):
+    ''' Whether reading ``field`` from a document just returns its value '''
+    return type(field).__get__ is Field.__get__
+
+
+def compile_codec(cls):
+    ''' Generates the :class:`Codec` for the document class ``cls`` '''
+    ns = _Namespace(cls=cls, UNSET=UNSET, ObjectId=ObjectId,
+        datetime=datetime, wrap_slow=_wrap_slow, new=object.__new__,
+        generic_unwrap=cls._unwrap)
+
+    # Each field once, under the first name it appears with
+    fields = []
+    seen = set()
+    for name, field in cls._schema.fields:
+        if id(field) in seen:
+            continue
+        seen.add(id(field))
+        fields.append((name, field))
+
+    # wrap
+    lines = ['def wrap(doc):',
+             '    res = dict(doc._Document__extra_fields)',
+             '    values = doc._field_values']
+    for name, field in fields:
+        f = ns.add('field', field)
+        if not plain_get(field):
+            lines.append('    wrap_slow(doc, %r, %s, res)' % (name, f))
+            continue
+        lines.append('    v = values.get(%r, UNSET)' % field._name)
+        lines.append('    if v is UNSET or v is None:')
+        lines.append('        wrap_slow(doc, %r, %s, res)' % (name, f))
+        inline = _scalar(ns, field, 'v', True) or _container(ns, field, 'v', True)
+        if inline is not None:
+            check, convert = inline
+            lines.append('    elif %s:' % check)
+            lines.append('        res[%r] = %s' % (field.db_field, convert))
+        elif _document_field(field):
+            t = ns.add('type', field.type)
+            lines.append('    elif v.__class__ is %s:' % t)
+            lines.append('        res[%r] = v.wrap()' % field.db_field)
+        elif _document_list(field):
+            t = ns.add('type', field.item_type.type)
+            checks = ['isinstance(v, (list, tuple))'] + \
+                    _bounds(ns, 'v', field, length=True) + \
+                    ['all(_i.__class__ is %s for _i in v)' % t]
+            lines.append('    elif %s:' % ' and '.join(checks))
+            lines.append('        res[%r] = [_i.wrap() for _i in v]' % field.db_field)
+        lines.append('    else:')
+        lines.append('        res[%r] = %s.wrap(v)' % (field.db_field, f))
+    lines.append('    return res')
+
+    # unwrap
+    lines += ['', 'def unwrap(obj):',
+              '    values = {}',
+              '    found = 0']
+    for name, field in fields:
+        f = ns.add('field', field)
+        target = 'values[%r]' % field._name
+        lines.append('    v = obj.get(%r, UNSET)' % field.db_field)
+        lines.append('    if v is not UNSET:')
+        lines.append('        found += 1')
+        lines.append('        if v is None:')
+        lines.append('            %s = %s.unwrap(v)' % (target, f))
+        inline = _scalar(ns, field, 'v', False) or _container(ns, field, 'v', False)
+        if inline is not None:
+            check, convert = inline
+            lines.append('        elif %s:' % check)
+            lines.append('            %s = %s' % (target, convert))
+        elif _document_field(field):
+            t = ns.add('type', field.type)
+            lines.append('        elif isinstance(v, dict):')
+            lines.append('            try:')
+            lines.append('                %s = %s.unwrap(v)' % (target, t))
+            lines.append('            except Exception:')
+            lines.append('                %s = %s.unwrap(v)' % (target, f))
+        elif _document_list(field):
+            t = ns.add('type', field.item_type.type)
+            checks = ['isinstance(v, (list, tuple))'] + \
+                    _bounds(ns, 'v', field, length=True) + \
+                    ['all(isinstance(_i, dict) for _i in v)']
+            lines.append('        elif %s:' % ' and '.join(checks))
+            lines.append('            try:')
+            lines.append('                %s = [%s.unwrap(_i) for _i in v]' % (target, t))
+            lines.append('            except Exception:')
+            lines.append('                %s = %s.unwrap(v)' % (target, f))
+        lines.append('        else:')
+        lines.append('            %s = %s.unwrap(v)' % (target, f))
+    lines.append('    if found != len(obj):')
+    lines.append('        return generic_unwrap(obj)')
+    if can_construct(cls, [field for _, field in fields]):
+        lines += ['    doc = new(cls)',
+                  '    doc.partial = False',
+                  '    doc.retrieved_fields = None',
+                  '    doc._dirty = {}',
+                  '    doc._field_values = values',
+                  '    doc._Document__extra_fields = {}']
+    else:
+        lines += ['    doc = cls(loading_from_db=True, **values)',
+                  '    doc._dirty.clear()']
+    lines.append('    return doc')
+
+    source = '\n'.join(lines) + '\n'
+    code = compile(source, '<codec for %s>' % cls.__name__, 'exec')
+    exec(code, ns)
+    return Codec(cls, ns['wrap'], ns['unwrap'], source)
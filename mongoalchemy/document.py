@@ -38,16 +38,90 @@ programmatically.  A document can have multiple indexes by adding extra
 
 
 '''
+import time
+import threading
 import pymongo
-from collections import defaultdict
-from mongoalchemy.options import config_property
-from mongoalchemy.util import classproperty, UNSET
+from types import MappingProxyType
+from collections import defaultdict, namedtuple
+from mongoalchemy.options import config_property, resolve_config, invalidate as invalidate_config
+from mongoalchemy.util import classproperty, UNSET, loading_method
 from mongoalchemy.query_expression import QueryField
-from mongoalchemy.fields import AnythingField, ObjectIdField, Field, BadValueException, SCALAR_MODIFIERS
+from mongoalchemy.fields import AnythingField, ObjectIdField, Field, BadValueException, SCALAR_MODIFIERS, trusted_unwrap, \
+        ListField
 from mongoalchemy.exceptions import DocumentException, MissingValueException, ExtraValueException, FieldNotRetrieved, BadFieldSpecification
+from mongoalchemy.codec import get_codec, can_construct, plain_get
+from mongoalchemy.raw import RawDocument, decoded, writable
+from mongoalchemy import metrics, cache
 
 document_type_registry = defaultdict(dict)
 
+ensured_index_registry = set()
+''' The indexes ensured by this process, as ``(collection full name, index
+    key)`` pairs.  :func:`Index.ensure` skips indexes which are in the
+    registry, so ``ensure_index`` is called at most once per index and
+    collection.  Use :func:`forget_ensured_indexes` when the indexes of a
+    collection are dropped out from under the process.
+'''
+_ensured_index_lock = threading.Lock()
+
+def forget_ensured_indexes(collection=None):
+    ''' Remove the indexes of ``collection`` from the
+        :data:`ensured_index_registry`, so that they are ensured again before
+        the next operation on it.  Call this after dropping the collection
+        or its indexes.
+
+        :param collection: a ``pymongo`` collection or its full name \
+            (``database.collection``).  If it is ``None`` the whole registry \
+            is cleared.
+    '''
+    with _ensured_index_lock:
+        if collection is None:
+            ensured_index_registry.clear()
+            return
+        if not isinstance(collection, str):
+            collection = collection.full_name
+        for key in [key for key in ensured_index_registry if key[0] == collection]:
+            ensured_index_registry.discard(key)
+
+# Index is defined at the end of the module.  No attribute of Document itself,
+# which is created before that, is an index
+Index = None
+
+
+class DocumentSchema(namedtuple('DocumentSchema', ['fields', 'db_fields',
+        'names', 'indexes', 'precommit', 'collection_name'])):
+    ''' The immutable description of a :class:`Document` subclass which is
+        built once by :class:`DocumentMeta`, so that wrapping, unwrapping and
+        constructing documents don't need to inspect the class.
+
+        * fields: ``(name, field)`` pairs, ordered by name
+        * db_fields: maps field names to their ``db_field``
+        * names: maps each ``db_field`` to a field name
+        * indexes: the class's :class:`Index` instances
+        * precommit: ``(name, hook)`` pairs for fields with precommit hooks
+        * collection_name: the name of the class's collection
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, document_class):
+        fields = sorted(document_class._fields.items())
+        names = {}
+        for name, field in fields:
+            names[field.db_field] = name
+        if hasattr(document_class, 'config_collection_name'):
+            collection_name = document_class.config_collection_name
+        else:
+            collection_name = document_class.__name__
+        return cls(
+            fields=tuple(fields),
+            db_fields=MappingProxyType(dict((name, field.db_field)
+                for name, field in fields)),
+            names=MappingProxyType(names),
+            indexes=tuple(document_class._indexes),
+            precommit=tuple(sorted(document_class._precommit.items())),
+            collection_name=collection_name)
+
 
 class DocumentMeta(type):
     def __new__(mcs, classname, bases, class_dict):
@@ -106,8 +180,11 @@ class DocumentMeta(type):
         # 2.5 Register precommit hooks for fields.
         new_class._fields = {}
         new_class._precommit = {}
+        new_class._indexes = []
         for name in dir(new_class):
             field = getattr(new_class, name)
+            if Index is not None and isinstance(field, Index):
+                new_class._indexes.append(field)
             if not isinstance(field, QueryField):
                 continue
             field_type = field.get_type()
@@ -116,6 +193,14 @@ class DocumentMeta(type):
             if precommit:
                 new_class._precommit[name] = precommit
 
+        # 2.75 Compile the schema used by the (un)wrapping code
+        new_class._schema = DocumentSchema.compile(new_class)
+
+        # 2.9 Freeze the configuration of the class and its fields
+        resolve_config(new_class)
+        for field in new_class._fields.values():
+            resolve_config(field)
+
         # 3. register type
         if new_class.config_namespace != None:
             name = new_class.config_full_name
@@ -125,8 +210,32 @@ class DocumentMeta(type):
 
         return new_class
 
+    def __setattr__(cls, name, value):
+        type.__setattr__(cls, name, value)
+        # The fields and schemas of this class (and subclasses) may have
+        # resolved the old value
+        if name.startswith('config_'):
+            invalidate_config()
+            cls.__recompile_schemas()
+
+    def __delattr__(cls, name):
+        type.__delattr__(cls, name)
+        if name.startswith('config_'):
+            invalidate_config()
+            cls.__recompile_schemas()
+
+    def __recompile_schemas(cls):
+        classes = [cls]
+        while classes:
+            current = classes.pop()
+            current._schema = DocumentSchema.compile(current)
+            classes.extend(current.__subclasses__())
+
 
 class Document(object, metaclass=DocumentMeta):
+    # The RawDocument the document was unwrapped from, if any
+    _raw = None
+
     mongo_id = UNSET
     ''' Default field for the mongo object ID (``_id`` in the database). This field
         is automatically set on objects when they are saved into the database.
@@ -179,6 +288,24 @@ class Document(object, metaclass=DocumentMeta):
     ''' The counter collection name to use with this Document. This only
         applies to :class:`~fields.AutoIncrement` fields. '''
 
+    config_auto_ensure_indexes = config_property('auto_ensure_indexes')
+    ''' Controls whether the indexes of this document are ensured before
+        database operations on its collection.  Each index is still only
+        ensured once per process.  If this is False the indexes must be
+        created with :func:`~mongoalchemy.session.Session.ensure_indexes`.
+        The default value is True. '''
+
+    config_compiled_codec = config_property('compiled_codec')
+    ''' Controls whether this document is wrapped and unwrapped by functions
+        generated for it by :mod:`mongoalchemy.codec` instead of the generic
+        field-by-field code.  The default value is False. '''
+
+    config_trusted_unwrap = config_property('trusted_unwrap')
+    ''' Controls whether :func:`~Document.unwrap` trusts its input and skips
+        the ``validate_unwrap`` step of every field.  Queries can override
+        this with :func:`~mongoalchemy.query.Query.trusted`.  The default
+        value is False. '''
+
     def __init__(self, retrieved_fields=None, loading_from_db=False, **kwargs):
         ''' :param retrieved_fields: The names of the fields returned when loading \
                 a partial object.  This argument should not be explicitly set \
@@ -196,15 +323,13 @@ class Document(object, metaclass=DocumentMeta):
         self._field_values = {}
         self.__extra_fields = {}
 
-        cls = self.__class__
-
         fields = self.get_fields()
-        for name, field in fields.items():
+        for name, field in self._schema.fields:
             if self.partial and field.db_field not in self.retrieved_fields:
                 continue
 
             if name in kwargs:
-                getattr(cls, name).set_value(self, kwargs[name], from_db=loading_from_db)
+                field.set_value(self, kwargs[name], from_db=loading_from_db)
                 continue
 
         for k in kwargs:
@@ -264,20 +389,25 @@ class Document(object, metaclass=DocumentMeta):
     def get_collection_name(cls):
         ''' Returns the collection name used by the class.  If the ``config_collection_name``
             attribute is set it is used, otherwise the name of the class is used.'''
-        if not hasattr(cls, 'config_collection_name'):
-            return cls.__name__
-        return cls.config_collection_name
+        return cls._schema.collection_name
 
     @classmethod
     def get_indexes(cls):
         ''' Returns all of the :class:`~mongoalchemy.document.Index` instances
             for the current class.'''
-        ret = []
-        for name in dir(cls):
-            field = getattr(cls, name)
-            if isinstance(field, Index):
-                ret.append(field)
-        return ret
+        return cls._schema.indexes
+
+    @classmethod
+    def ensure_indexes(cls, collection, force=False):
+        ''' Ensure all of the indexes for the current class on ``collection``.
+
+            :param collection: the ``pymongo`` collection to ensure the \
+                    indexes on
+            :param force: ensure indexes which are already in the \
+                    :data:`ensured_index_registry` as well
+        '''
+        for index in cls._schema.indexes:
+            index.ensure(collection, force=force)
 
     @classmethod
     def __normalize(cls, fields):
@@ -302,35 +432,88 @@ class Document(object, metaclass=DocumentMeta):
 
     def precommit(self, db):
         ''' Called before actually saving. Used internally. '''
-        for name in self._precommit:
+        for name, precommit in self._schema.precommit:
             value = getattr(self, name, None)
-            self._precommit[name](db, self, value)
+            precommit(db, self, value)
 
     def commit(self, db, safe=True):
         ''' Save this object to the database and set the ``_id`` field of this
             document to the returned id.
 
-            :param db: The pymongo database to write to
+            :param db: The pymongo database (or \
+                :class:`~mongoalchemy.backend.Backend`) to write to
+
+            The saved document is written through to the
+            :class:`~mongoalchemy.cache.DocumentCache`, if it is enabled.
         '''
         collection = db[self.get_collection_name()]
-        for index in self.get_indexes():
-            index.ensure(collection)
+        if self.config_auto_ensure_indexes:
+            self.ensure_indexes(collection)
         self.precommit(db)
-        id = collection.save(self.wrap(), safe=safe)
+        value = self.wrap()
+        id = collection.save(writable(collection, value), safe=safe)
         self.mongo_id = id
+        if cache.document_cache is not None:
+            if not isinstance(value, RawDocument):
+                value['_id'] = id
+            cache.document_cache.put((db.name, collection.name), value)
 
     def wrap(self):
         ''' Returns a transformation of this document into a form suitable to
             be saved into a mongo database.  This is done by using the ``wrap()``
-            methods of the underlying fields to set values.'''
+            methods of the underlying fields to set values.
+
+            A document unwrapped from a :class:`~mongoalchemy.raw.RawDocument`
+            which has not been modified returns that document, so that its
+            original BSON is saved.'''
+        recorder = metrics.active
+        if recorder is None:
+            return self.__wrap()
+        try:
+            value = self.__wrap()
+        except (BadValueException, MissingValueException):
+            recorder.validation_failed(type(self), 'wrap')
+            raise
+        recorder.wrapped(type(self), value)
+        return value
+
+    def __wrap(self):
+        if self._raw is not None:
+            raw = self.__unmodified_raw()
+            if raw is not None:
+                return raw
+        if self.config_compiled_codec:
+            return get_codec(type(self)).wrap(self)
+        return self._wrap()
+
+    def __unmodified_raw(self):
+        # The RawDocument the document was unwrapped from, if the values
+        # read from it are unchanged.  Values which were never read are
+        # still in their raw form
+        raw = self._raw
+        if self._dirty or self.partial:
+            return None
+        fields = self.get_fields()
+        values = self._field_values
+        for name in dict.keys(values):
+            field = fields[name]
+            value = dict.__getitem__(values, name)
+            if field.db_field not in raw:
+                if value is None and field._allow_none:
+                    continue
+                return None
+            if field.wrap(value) != raw[field.db_field]:
+                return None
+        for k, v in self.__extra_fields.items():
+            if k not in raw or raw[k] != v:
+                return None
+        return raw
+
+    def _wrap(self):
         res = {}
         for k, v in self.__extra_fields.items():
             res[k] = v
-        cls = self.__class__
-        for name in dir(cls):
-            field = getattr(cls, name)
-            if not isinstance(field, QueryField):
-                continue
+        for name, field in self._schema.fields:
             try:
                 value = getattr(self, name)
                 # Ensure we don't insert a bunch of nulls if we have allow_none
@@ -355,7 +538,7 @@ class Document(object, metaclass=DocumentMeta):
             raise BadValueException('Document', obj, 'Exception validating document', cause=e)
 
     @classmethod
-    def unwrap(cls, obj, fields=None):
+    def unwrap(cls, obj, fields=None, trusted=None, field_times=None, lazy=False):
         ''' Returns an instance of this document class based on the mongo object
             ``obj``.  This is done by using the ``unwrap()`` methods of the
             underlying fields to set values.
@@ -364,26 +547,105 @@ class Document(object, metaclass=DocumentMeta):
             :param fields: A list of :class:`mongoalchemy.query.QueryField` objects \
                     for the fields to load.  If ``None`` is passed all fields  \
                     are loaded
+            :param trusted: Skip validating the values in ``obj``.  If \
+                    ``None`` is passed :attr:`config_trusted_unwrap` is used
+            :param field_times: A dictionary to add the time spent unwrapping \
+                    each field to, by field class name.  Timed documents are \
+                    never unwrapped with a compiled codec
+            :param lazy: Keep the values of the fields in their SON form \
+                    and only unwrap (and validate) each one when it is first \
+                    read.  ``ListField`` values become :class:`~mongoalchemy.fields.LazyList` \
+                    instances, unwrapped element by element.  Fields are \
+                    not timed.  Classes with their own ``__init__`` are \
+                    always unwrapped eagerly.
             '''
+        if trusted is None:
+            trusted = cls.config_trusted_unwrap
+        load = cls.__unwrap_lazy if lazy else cls.__unwrap_trusted
+        recorder = metrics.active
+        if recorder is None:
+            value = load(obj, fields, trusted, field_times)
+        else:
+            try:
+                value = load(obj, fields, trusted, field_times)
+            except BadValueException:
+                recorder.validation_failed(cls, 'unwrap')
+                raise
+            recorder.unwrapped(cls)
+        if type(obj) is RawDocument and fields is None:
+            value._raw = obj
+        return value
 
-        # Get reverse name mapping
-        name_reverse = {}
-        for name, field in cls.get_fields().items():
-            name_reverse[field.db_field] = name
+    @classmethod
+    def __unwrap_trusted(cls, obj, fields, trusted, field_times):
+        if trusted:
+            with trusted_unwrap():
+                return cls.__unwrap(obj, fields, field_times)
+        return cls.__unwrap(obj, fields, field_times)
+
+    @classmethod
+    def __unwrap_lazy(cls, obj, fields, trusted, field_times):
+        schema = cls._schema
+        if not can_construct(cls, [field for _, field in schema.fields]):
+            return cls.__unwrap_trusted(obj, fields, trusted, None)
+        name_reverse = schema.names
+        cls_fields = cls._fields
+        values = _LazyValues(trusted)
+        eager = {}
+        # The values of a RawDocument aren't even decoded until they are read
+        items = obj.elements() if type(obj) is RawDocument else obj.items()
+        for k, v in items:
+            field = cls_fields.get(name_reverse.get(k, k))
+            # Extra fields, computed fields and partially loaded
+            # sub-documents are unwrapped right away
+            if field is None or not plain_get(field) or \
+                    (fields is not None and isinstance(field, DocumentField)):
+                eager[k] = decoded(v)
+            else:
+                values.raw[field._name] = (field, v)
+        if eager:
+            doc = cls.__unwrap_trusted(eager, fields, trusted, None)
+        else:
+            doc = cls(loading_from_db=True, retrieved_fields=fields)
+        dict.update(values, doc._field_values)
+        doc._field_values = values
+        doc.__mark_clean()
+        return doc
+
+    @classmethod
+    def __unwrap(cls, obj, fields, field_times):
+        if fields is None and field_times is None and cls.config_compiled_codec:
+            return get_codec(cls).unwrap(obj)
+        return cls._unwrap(obj, fields=fields, field_times=field_times)
+
+    @classmethod
+    def _unwrap(cls, obj, fields=None, field_times=None):
+        schema = cls._schema
+        name_reverse = schema.names
+        cls_fields = cls._fields
+        if fields != None:
+            normalized_fields = cls.__normalize(fields)
 
         # Unwrap
         params = {}
         for k, v in obj.items():
             k = name_reverse.get(k, k)
-            if not hasattr(cls, k) and cls.config_extra_fields:
-                params[str(k)] = v
-                continue
-            field = getattr(cls, k)
-            if fields != None and isinstance(field.get_type(), DocumentField):
-                normalized_fields = cls.__normalize(fields)
+            field = cls_fields.get(k)
+            if field is None:
+                if not hasattr(cls, k) and cls.config_extra_fields:
+                    params[str(k)] = v
+                    continue
+                field = getattr(cls, k).get_type()
+            if field_times is not None:
+                start = time.perf_counter()
+            if fields != None and isinstance(field, DocumentField):
                 unwrapped = field.unwrap(v, fields=normalized_fields.get(k))
             else:
                 unwrapped = field.unwrap(v)
+            if field_times is not None:
+                name = type(field).__name__
+                field_times[name] = field_times.get(name, 0.0) + \
+                    time.perf_counter() - start
             params[str(k)] = unwrapped
 
         if fields != None:
@@ -396,6 +658,56 @@ class Document(object, metaclass=DocumentMeta):
         self._dirty.clear()
 
 
+class _LazyValues(dict):
+    # The field values of a lazily unwrapped document.  The SON values (or
+    # RawElements) in raw are unwrapped when they are first read.  Reading
+    # every value (items(), etc.) unwraps them all first
+    def __init__(self, trusted):
+        self.raw = {}
+        self.trusted = trusted
+
+    def __missing__(self, name):
+        field, value = self.raw.pop(name)
+        value = decoded(value)
+        if self.trusted:
+            with trusted_unwrap():
+                value = self.__unwrap(field, value)
+        else:
+            value = self.__unwrap(field, value)
+        dict.__setitem__(self, name, value)
+        return value
+
+    def __unwrap(self, field, value):
+        if type(field) is ListField:
+            return field.lazy_unwrap(value)
+        return field.unwrap(value)
+
+    def _load(self):
+        for name in list(self.raw):
+            self[name]
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self.raw
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    def __setitem__(self, name, value):
+        self.raw.pop(name, None)
+        dict.__setitem__(self, name, value)
+
+    def __delitem__(self, name):
+        if self.raw.pop(name, UNSET) is UNSET:
+            dict.__delitem__(self, name)
+
+for _name in ('__iter__', '__len__', '__eq__', '__ne__', '__repr__', 'keys',
+        'values', 'items', 'pop', 'popitem', 'setdefault', 'update', 'copy',
+        '__reduce_ex__'):
+    setattr(_LazyValues, _name, loading_method(dict, _name))
+
+
 class DictDoc(object):
     ''' Adds a mapping interface to a document.  Supports ``__getitem__`` and
         ``__contains__``.  Both methods will only retrieve values assigned to
@@ -506,18 +818,28 @@ class DocumentField(Field):
         return self.type.wrap(value)
 
     def unwrap(self, value, fields=None):
-        ''' Validate ``value`` and then use the document's class to unwrap the
-            value'''
-        self.validate_unwrap(value, fields=fields)
-        return self.type.unwrap(value, fields=fields)
+        ''' Use the document's class to unwrap the value.  The fields of the
+            document validate their values while being unwrapped, so ``value``
+            is only converted once.'''
+        custom = self._custom_validate_unwrap
+        if custom:
+            self.validate_unwrap(value, fields=fields)
+        try:
+            ret = self.type.unwrap(value, fields=fields)
+        except Exception as e:
+            bve = BadValueException('Document', value, 'Exception validating document', cause=e)
+            self._fail_validation(value, 'Bad value for DocumentField field', cause=bve)
+        if not custom:
+            self._run_validators(value, 'unwrap')
+        return ret
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         ''' Checks that ``value`` is an instance of ``DocumentField.type``.
             if it is, then validation on its fields has already been done and
             no further validation is needed.
         '''
         if value.__class__ != self.type:
-            self._fail_validation_type(value, self.type)
+            return self._failure_type(value, self.type)
 
     def validate_unwrap(self, value, fields=None):
         ''' Validates every field in the underlying document type.  If ``fields``
@@ -600,13 +922,25 @@ class Index(object):
         self.__drop_dups = drop_dups
         return self
 
-    def ensure(self, collection):
-        ''' Call the pymongo method ``ensure_index`` on the passed collection.
+    def ensure(self, collection, force=False):
+        ''' Call the pymongo method ``ensure_index`` on the passed collection,
+            unless this index was already ensured on it by this process.
 
             :param collection: the ``pymongo`` collection to ensure this index \
                     is on
+            :param force: call ``ensure_index`` even if the index is in the \
+                    :data:`ensured_index_registry`
         '''
+        key = (collection.full_name, (tuple(self.components), self.__unique,
+            self.__drop_dups, self.__sparse))
+        if not force:
+            with _ensured_index_lock:
+                if key in ensured_index_registry:
+                    return self
         collection.ensure_index(self.components, unique=self.__unique,
             drop_dups=self.__drop_dups, sparse=self.__sparse)
+        with _ensured_index_lock:
+            ensured_index_registry.add(key)
+        if metrics.active is not None:
+            metrics.active.index_ensured(collection)
         return self
-
@@ -12,16 +12,25 @@ class MongoAlchemyException(Exception):
 
 class BadValueException(MongoAlchemyException):
     ''' An exception which is raised when there is something wrong with a
-        value'''
+        value.  The message is only built when the exception is converted to
+        a string, since it includes the (possibly large) value'''
     def __init__(self, name, value, reason, cause=None):
         self.name = name
         self.value = value
+        self.reason = reason
         self.cause = cause
+        super(BadValueException, self).__init__(name, value, reason, cause)
+
+    @property
+    def message(self):
         message = 'Bad value for field of type "%s".  Reason: "%s".' % \
-                (name, reason)
-        if cause != None:
-            message = '%s Cause: %s' % (message, cause)
-        super(BadValueException, self).__init__(message)
+                (self.name, self.reason)
+        if self.cause != None:
+            message = '%s Cause: %s' % (message, self.cause)
+        return message
+
+    def __str__(self):
+        return self.message
 
 
 class InvalidConfigException(MongoAlchemyException):
@@ -97,3 +106,9 @@ class ConflictingModifierException(UpdateException):
     ''' Exception raised if conflicting modifiers are being used in the
         update expression '''
     pass
+
+
+class SessionPoolTimeout(MongoAlchemyException):
+    ''' Raised when no session could be checked out of a
+        :class:`~mongoalchemy.pool.SessionPool` before its timeout '''
+    pass
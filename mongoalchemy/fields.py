@@ -47,6 +47,20 @@ To just check whether something is valid for wrapping or unwrapping, each field
 their respective validation function, returning True if a
 :class:`BadValueException` is not raised.
 
+Fields can instead implement ``_check_wrap`` and ``_check_unwrap``, which return
+a :class:`ValidationFailure` (or ``None`` if the value is valid) rather than
+raising.  ``validate_wrap`` and ``validate_unwrap`` are then generated from them,
+and :func:`Field.check_wrap`, :func:`Field.check_unwrap` and
+:func:`Field.is_valid_wrap` don't need to raise and catch an exception for every
+invalid value.
+
+Container fields such as :class:`ListField` and :class:`DictField` don't call
+their own ``validate_wrap`` and ``validate_unwrap`` when converting a value.
+Each child is validated by its own field while it is converted, so nested values
+are only checked once.  A subclass of a container field which overrides
+``validate_wrap`` or ``validate_unwrap`` (but not ``wrap`` or ``unwrap``) has
+its validation function called on the whole value before it is converted.
+
 
 The documentation for each :class:`Field` class will largely just be giving the input and
 output types for :func:`~Field.wrap` and :func:`~Field.unwrap`.
@@ -56,14 +70,15 @@ output types for :func:`~Field.wrap` and :func:`~Field.unwrap`.
 
 
 import itertools
+import threading
 from datetime import datetime
 from pymongo.objectid import ObjectId
 from pymongo.binary import Binary
 import functools
 from copy import deepcopy
 
-from mongoalchemy.util import UNSET
-from mongoalchemy.options import config_property
+from mongoalchemy.util import UNSET, loading_method
+from mongoalchemy.options import config_property, invalidate as invalidate_config
 from mongoalchemy.query_expression import QueryField
 from mongoalchemy.exceptions import BadValueException, FieldNotRetrieved, InvalidConfigException, BadFieldSpecification, MissingValueException
 import collections
@@ -75,6 +90,84 @@ LIST_MODIFIERS = SCALAR_MODIFIERS | set(['$push', '$addToSet', '$pull', '$pushAl
 ANY_MODIFIER = LIST_MODIFIERS | NUMBER_MODIFIERS
 
 
+class _UnwrapState(threading.local):
+    trusted = False
+
+unwrap_state = _UnwrapState()
+
+
+class trusted_unwrap(object):
+    ''' Context manager which turns off ``validate_unwrap`` for every field
+        in the current thread, so that data which is known to be valid (for
+        example because it was written by the application) is unwrapped
+        without being checked.  Used by :func:`Document.unwrap` when
+        ``trusted`` is set.
+
+        ``unwrap`` still converts values and fails on values it cannot
+        convert.
+    '''
+    def __enter__(self):
+        self.previous = unwrap_state.trusted
+        unwrap_state.trusted = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        unwrap_state.trusted = self.previous
+        return False
+
+
+class ValidationFailure(object):
+    ''' Describes why a value failed validation.  Returned by
+        :func:`Field.check_wrap` and :func:`Field.check_unwrap` instead of
+        raising; :func:`exception` creates the corresponding
+        :class:`BadValueException`.
+    '''
+    __slots__ = ('name', 'value', 'reason', 'cause')
+
+    def __init__(self, name, value, reason, cause=None):
+        self.name = name
+        self.value = value
+        self.reason = reason
+        self.cause = cause
+
+    @classmethod
+    def from_exception(cls, bve):
+        ''' Create a failure from a raised :class:`BadValueException` '''
+        return cls(bve.name, bve.value, bve.reason, cause=bve.cause)
+
+    def exception(self):
+        ''' The :class:`BadValueException` to raise for this failure '''
+        return BadValueException(self.name, self.value, self.reason, cause=self.cause)
+
+    def __str__(self):
+        return str(self.exception())
+
+    def __repr__(self):
+        return 'ValidationFailure(%r, %s)' % (self.name, self.reason)
+
+
+class _TypeMismatch(object):
+    # A reason which builds its message (and the repr of the value) only
+    # when it is needed
+    __slots__ = ('types', 'value')
+
+    def __init__(self, types, value):
+        self.types = types
+        self.value = value
+
+    def __str__(self):
+        types = '\n'.join([str(t) for t in self.types])
+        got = self.value.__class__.__name__
+        return 'Value is not an instance of %s (got: %s (%s))' % (types, got, self.value.__repr__())
+
+
+def _validating_wrap(self, value):
+    # _wrap_unchecked wraps a value which check_wrap has accepted without
+    # validating it again.  Fields which have no such version of wrap use
+    # this one
+    return self.wrap(value)
+
+
 class FieldMeta(type):
     def __new__(mcs, classname, bases, class_dict):
 
@@ -96,6 +189,10 @@ class FieldMeta(type):
 
         def validation_wrapper(fun, kind):
             def wrapped(self, value, *args, **kwds):
+                # Trusted data is not validated when unwrapping
+                if kind == 'unwrap' and unwrap_state.trusted:
+                    return
+
                 # Handle None
                 if self._allow_none and value == None:
                     return
@@ -110,32 +207,53 @@ class FieldMeta(type):
                 # Standard Field validation
                 fun(self, value, *args, **kwds)
 
-                # Universal user-supplied validator
-                if self.validator:
-                    if self.validator(value) == False:
-                        self._fail_validation(value, 'user-supplied validator failed')
-
-                if kind == 'unwrap' and self.unwrap_validator:
-                    if self.unwrap_validator(value) == False:
-                        self._fail_validation(value, 'user-supplied unwrap_validator failed')
-
-                elif kind == 'wrap' and self.wrap_validator:
-                    if self.wrap_validator(value) == False:
-                        self._fail_validation(value, 'user-supplied wrap_validator failed')
+                # User-supplied validators
+                self._run_validators(value, kind)
 
             functools.update_wrapper(wrapped, fun, ('__name__', '__doc__'))
             return wrapped
 
+        def raising_validator(check):
+            def validate(self, value):
+                failure = check(self, value)
+                if failure is not None:
+                    raise failure.exception()
+            functools.update_wrapper(validate, check, ('__doc__',))
+            return validate
+
         if 'wrap' in class_dict:
             class_dict['wrap'] = wrap_unwrap_wrapper(class_dict['wrap'])
+        if '_wrap_unchecked' in class_dict:
+            class_dict['_wrap_unchecked'] = wrap_unwrap_wrapper(class_dict['_wrap_unchecked'])
+        elif 'wrap' in class_dict:
+            # An inherited _wrap_unchecked would ignore the new wrap function
+            class_dict['_wrap_unchecked'] = _validating_wrap
         if 'unwrap' in class_dict:
             class_dict['unwrap'] = wrap_unwrap_wrapper(class_dict['unwrap'])
 
-        if 'validate_wrap' in class_dict:
-            class_dict['validate_wrap'] = validation_wrapper(class_dict['validate_wrap'], 'wrap')
-
-        if 'validate_unwrap' in class_dict:
-            class_dict['validate_unwrap'] = validation_wrapper(class_dict['validate_unwrap'], 'unwrap')
+        for kind in ('wrap', 'unwrap'):
+            check = '_check_' + kind
+            validate = 'validate_' + kind
+            if check in class_dict and validate not in class_dict:
+                class_dict[validate] = raising_validator(class_dict[check])
+            elif validate in class_dict and check not in class_dict:
+                # An inherited check would ignore the new validation function
+                class_dict[check] = None
+
+            # The unwrapped version is kept so that validation functions can use
+            # each other without running the user-supplied validators again
+            if validate in class_dict:
+                class_dict['_raw_' + validate] = class_dict[validate]
+                class_dict[validate] = validation_wrapper(class_dict[validate], kind)
+
+            # Container fields validate their children while converting them
+            # instead of calling their own validate_wrap/validate_unwrap.  A
+            # subclass which only overrides the validation function has it
+            # called before converting.
+            if kind in class_dict:
+                class_dict['_custom_validate_' + kind] = False
+            elif validate in class_dict:
+                class_dict['_custom_validate_' + kind] = True
 
         # Create Class
         return type.__new__(mcs, classname, bases, class_dict)
@@ -273,6 +391,7 @@ class Field(object, metaclass=FieldMeta):
 
     def _set_parent(self, parent):
         self.parent = parent
+        invalidate_config(self)
         self.set_parent_on_subtypes(parent)
 
     def set_parent_on_subtypes(self, parent):
@@ -327,15 +446,109 @@ class Field(object, metaclass=FieldMeta):
             :param value: The value to check
         '''
 
-        self.validate_wrap(value)
+        self._raw_validate_wrap(value)
+
+    def _check_unwrap(self, value):
+        # Like validate_unwrap, use the wrap validation
+        return self.__check_raw(value, self._check_wrap, self._raw_validate_wrap)
+
+    def check_wrap(self, value):
+        ''' Does the same validation as :func:`~Field.validate_wrap`, but
+            returns a :class:`ValidationFailure` instead of raising a
+            :class:`BadValueException`.  Returns ``None`` if ``value`` is valid.
+
+            :param value: The value to check
+        '''
+        return self.__check(value, 'wrap')
+
+    def check_unwrap(self, value):
+        ''' Does the same validation as :func:`~Field.validate_unwrap`, but
+            returns a :class:`ValidationFailure` instead of raising a
+            :class:`BadValueException`.  Returns ``None`` if ``value`` is valid.
+
+            :param value: The value to check
+        '''
+        return self.__check(value, 'unwrap')
+
+    def check_wrap_value(self, value):
+        ''' Returns a :class:`ValidationFailure` if :func:`~Field.wrap_value`
+            would fail for ``value``, ``None`` otherwise '''
+        return self.check_wrap(value)
+
+    def __check(self, value, kind):
+        # The non-raising equivalent of the validation wrapper in FieldMeta
+        if kind == 'unwrap' and unwrap_state.trusted:
+            return None
+
+        if self._allow_none and value == None:
+            return None
+
+        if not self._strict:
+            try:
+                value = self.coerce_value(value)
+            except:
+                pass
+
+        if kind == 'wrap':
+            failure = self.__check_raw(value, self._check_wrap, self._raw_validate_wrap)
+        else:
+            failure = self.__check_raw(value, self._check_unwrap, self._raw_validate_unwrap)
+        if failure is None:
+            failure = self._validator_failure(value, kind)
+        return failure
+
+    def __check_raw(self, value, check, validate):
+        if check is not None:
+            return check(value)
+        # The field only has a raising validation function
+        try:
+            validate(value)
+        except BadValueException as bve:
+            return ValidationFailure.from_exception(bve)
+        return None
+
+    def _validator_failure(self, value, kind):
+        ''' Runs the user-supplied ``validator`` and the ``wrap_validator`` or
+            ``unwrap_validator`` (depending on ``kind``) on ``value``, returning
+            a :class:`ValidationFailure` if one of them fails.
+        '''
+        if kind == 'unwrap' and unwrap_state.trusted:
+            return None
+
+        if self.validator:
+            if self.validator(value) == False:
+                return self._failure(value, 'user-supplied validator failed')
+
+        if kind == 'unwrap' and self.unwrap_validator:
+            if self.unwrap_validator(value) == False:
+                return self._failure(value, 'user-supplied unwrap_validator failed')
+
+        elif kind == 'wrap' and self.wrap_validator:
+            if self.wrap_validator(value) == False:
+                return self._failure(value, 'user-supplied wrap_validator failed')
+        return None
+
+    def _run_validators(self, value, kind):
+        ''' Raising version of :func:`~Field._validator_failure`.  Fields
+            which wrap or unwrap their children themselves instead of calling
+            their own ``validate_wrap`` or ``validate_unwrap`` call this
+            after converting ``value``.
+        '''
+        failure = self._validator_failure(value, kind)
+        if failure is not None:
+            raise failure.exception()
+
+    def _failure(self, value, reason='', cause=None):
+        return ValidationFailure(self._name, value, reason, cause=cause)
+
+    def _failure_type(self, value, *type):
+        return ValidationFailure(self._name, value, _TypeMismatch(type, value))
 
     def _fail_validation(self, value, reason='', cause=None):
         raise BadValueException(self._name, value, reason, cause=cause)
 
     def _fail_validation_type(self, value, *type):
-        types = '\n'.join([str(t) for t in type])
-        got = value.__class__.__name__
-        raise BadValueException(self._name, value, 'Value is not an instance of %s (got: %s (%s))' % (types, got, value.__repr__()))
+        raise BadValueException(self._name, value, _TypeMismatch(type, value))
 
     def is_valid_wrap(self, value):
         ''' Returns whether ``value`` is a valid value to wrap.
@@ -343,11 +556,7 @@ class Field(object, metaclass=FieldMeta):
 
             :param value: The value to check
         '''
-        try:
-            self.validate_wrap(value)
-        except BadValueException:
-            return False
-        return True
+        return self.check_wrap(value) is None
 
     def is_valid_unwrap(self, value):
         ''' Returns whether ``value`` is a valid value to unwrap.
@@ -355,11 +564,7 @@ class Field(object, metaclass=FieldMeta):
 
             :param value: The value to check
         '''
-        try:
-            self.validate_unwrap(value)
-        except BadValueException:
-            return False
-        return True
+        return self.check_unwrap(value) is None
 
 class PrimitiveField(Field):
     ''' Primitive fields are fields where a single constructor can be used
@@ -374,6 +579,8 @@ class PrimitiveField(Field):
     def wrap(self, value):
         self.validate_wrap(value)
         return self.constructor(value)
+    def _wrap_unchecked(self, value):
+        return self.constructor(value)
     def unwrap(self, value):
         self.validate_unwrap(value)
         return self.constructor(value)
@@ -394,22 +601,22 @@ class StringField(PrimitiveField):
         ''' Attempts to convert ``value`` to a string. '''
         return str(value)
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         ''' Validates the type and length of ``value`` '''
         if not isinstance(value, str):
-            self._fail_validation_type(value, str)
+            return self._failure_type(value, str)
         if self.max != None and len(value) > self.max:
-            self._fail_validation(value, 'Value too long')
+            return self._failure(value, 'Value too long')
         if self.min != None and len(value) < self.min:
-            self._fail_validation(value, 'Value too short')
+            return self._failure(value, 'Value too short')
 
 class BinaryField(PrimitiveField):
     def __init__(self, **kwargs):
         super(BinaryField, self).__init__(constructor=Binary, **kwargs)
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         if not isinstance(value, bytes) and not isinstance(value, Binary):
-            self._fail_validation_type(value, str, Binary)
+            return self._failure_type(value, str, Binary)
 
 class BoolField(PrimitiveField):
     ''' ``True`` or ``False``.'''
@@ -421,9 +628,9 @@ class BoolField(PrimitiveField):
             value = bool(value)
         return value
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         if not isinstance(value, bool):
-            self._fail_validation_type(value, bool)
+            return self._failure_type(value, bool)
 
 class NumberField(PrimitiveField):
     ''' Base class for numeric fields '''
@@ -443,14 +650,19 @@ class NumberField(PrimitiveField):
         ''' Coerces value to the ``self.constructor`` type. '''
         return self.constructor(value)
 
-    def validate_wrap(self, value, type):
-        ''' Validates the type and value of ``value`` '''
+    def _check_number(self, value, type):
         if not isinstance(value, type):
-            self._fail_validation_type(value, type)
+            return self._failure_type(value, type)
         if self.min != None and value < self.min:
-            self._fail_validation(value, 'Value too small')
+            return self._failure(value, 'Value too small')
         if self.max != None and value > self.max:
-            self._fail_validation(value, 'Value too large')
+            return self._failure(value, 'Value too large')
+
+    def validate_wrap(self, value, type):
+        ''' Validates the type and value of ``value`` '''
+        failure = self._check_number(value, type)
+        if failure is not None:
+            raise failure.exception()
 
 class IntField(NumberField):
     ''' Subclass of :class:`~NumberField` for ``int``'''
@@ -461,9 +673,9 @@ class IntField(NumberField):
         '''
         super(IntField, self).__init__(constructor=int, **kwargs)
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         ''' Validates the type and value of ``value`` '''
-        NumberField.validate_wrap(self, value, (int, int))
+        return self._check_number(value, int)
 
 class AutoIncrementField(IntField):
     ''' Auto-incrementing IntField. '''
@@ -507,9 +719,9 @@ class FloatField(NumberField):
             :param kwargs: arguments for :class:`Field`
         '''
         super(FloatField, self).__init__(constructor=float, **kwargs)
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         ''' Validates the type and value of ``value`` '''
-        return NumberField.validate_wrap(self, value, float)
+        return self._check_number(value, float)
 
 class DateTimeField(PrimitiveField):
     ''' Field for datetime objects. '''
@@ -522,15 +734,15 @@ class DateTimeField(PrimitiveField):
         self.min = min_date
         self.max = max_date
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         ''' Validates the value's type as well as it being in the valid
             date range'''
         if not isinstance(value, datetime):
-            self._fail_validation_type(value, datetime)
+            return self._failure_type(value, datetime)
         if self.min != None and value < self.min:
-            self._fail_validation(value, 'DateTime too old')
+            return self._failure(value, 'DateTime too old')
         if self.max != None and value > self.max:
-            self._fail_validation(value, 'DateTime too new')
+            return self._failure(value, 'DateTime too new')
 
 class TupleField(Field):
     ''' Represents a field which is a tuple of a fixed size with specific
@@ -555,12 +767,15 @@ class TupleField(Field):
         for type in self.types:
             type._set_parent(parent)
 
+    def _validate_type(self, value):
+        if not isinstance(value, list) and not isinstance(value, tuple):
+            self._fail_validation_type(value, tuple, list)
+
     def validate_wrap(self, value):
         ''' Checks that the correct number of elements are in ``value`` and that
             each element validates agains the associated Field class
         '''
-        if not isinstance(value, list) and not isinstance(value, tuple):
-            self._fail_validation_type(value, tuple, list)
+        self._validate_type(value)
 
         for field, value in zip(self.types, list(value)):
             field.validate_wrap(value)
@@ -569,32 +784,45 @@ class TupleField(Field):
         ''' Checks that the correct number of elements are in ``value`` and that
             each element validates agains the associated Field class
         '''
-        if not isinstance(value, list) and not isinstance(value, tuple):
-            self._fail_validation_type(value, tuple, list)
+        self._validate_type(value)
 
         for field, value in zip(self.types, value):
             field.validate_unwrap(value)
 
     def wrap(self, value):
-        ''' Validate and then wrap ``value`` for insertion.
+        ''' Validate and then wrap ``value`` for insertion.  Each element is
+            validated by the ``wrap`` of its Field class.
 
             :param value: the tuple (or list) to wrap
         '''
-        self.validate_wrap(value)
+        custom = self._custom_validate_wrap
+        if custom:
+            self.validate_wrap(value)
+        else:
+            self._validate_type(value)
         ret = []
-        for field, value in zip(self.types, value):
-            ret.append(field.wrap(value))
+        for field, item in zip(self.types, value):
+            ret.append(field.wrap(item))
+        if not custom:
+            self._run_validators(value, 'wrap')
         return ret
 
     def unwrap(self, value):
-        ''' Validate and then unwrap ``value`` for object creation.
+        ''' Validate and then unwrap ``value`` for object creation.  Each
+            element is validated by the ``unwrap`` of its Field class.
 
             :param value: list returned from the database.
         '''
-        self.validate_unwrap(value)
+        custom = self._custom_validate_unwrap
+        if custom:
+            self.validate_unwrap(value)
+        elif not unwrap_state.trusted:
+            self._validate_type(value)
         ret = []
-        for field, value in zip(self.types, value):
-            ret.append(field.unwrap(value))
+        for field, item in zip(self.types, value):
+            ret.append(field.unwrap(item))
+        if not custom:
+            self._run_validators(value, 'unwrap')
         return tuple(ret)
 
 class EnumField(Field):
@@ -626,40 +854,55 @@ class EnumField(Field):
     def set_parent_on_subtypes(self, parent):
         self.item_type._set_parent(parent)
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         ''' Checks that value is valid for `EnumField.item_type` and that
             value is one of the values specified when the EnumField was
             constructed '''
-        self.item_type.validate_wrap(value)
+        failure = self.item_type.check_wrap(value)
+        if failure is not None:
+            return failure
 
         if value not in self.values:
-            self._fail_validation(value, 'Value was not in the enum values')
+            return self._failure(value, 'Value was not in the enum values')
 
-    def validate_unwrap(self, value):
+    def _check_unwrap(self, value):
         ''' Checks that value is valid for `EnumField.item_type`.
 
             .. note ::
                 Since checking the value itself is not possible until is is
                 actually unwrapped, that check is done in :func:`EnumField.unwrap`'''
-        self.item_type.validate_unwrap(value)
+        return self.item_type.check_unwrap(value)
 
     def wrap(self, value):
         ''' Validate and wrap value using the wrapping function from
             ``EnumField.item_type``
         '''
-        self.validate_wrap(value)
-        return self.item_type.wrap(value)
+        if self._custom_validate_wrap:
+            self.validate_wrap(value)
+            return self.item_type.wrap(value)
+        wrapped = self.item_type.wrap(value)
+        if value not in self.values:
+            self._fail_validation(value, 'Value was not in the enum values')
+        self._run_validators(value, 'wrap')
+        return wrapped
+
+    def _wrap_unchecked(self, value):
+        return self.item_type._wrap_unchecked(value)
 
     def unwrap(self, value):
         ''' Unwrap value using the unwrap function from ``EnumField.item_type``.
             Since unwrap validation could not happen in is_valid_wrap, it
             happens in this function.'''
-        self.validate_unwrap(value)
-        value = self.item_type.unwrap(value)
+        if self._custom_validate_unwrap:
+            self.validate_unwrap(value)
+            unwrapped = self.item_type.unwrap(value)
+        else:
+            unwrapped = self.item_type.unwrap(value)
+            self._run_validators(value, 'unwrap')
         for val in self.values:
-            if val == value:
+            if val == unwrapped:
                 return val
-        self._fail_validation(value, 'Value was not in the enum values')
+        self._fail_validation(unwrapped, 'Value was not in the enum values')
 
 
 class SequenceField(Field):
@@ -697,16 +940,24 @@ class SequenceField(Field):
         ''' A function used to wrap a value used in a comparison.  It will
             first try to wrap as the sequence's sub-type, and then as the
             sequence itself'''
-        try:
-            return self.item_type.wrap_value(value)
-        except BadValueException:
-            pass
-        try:
-            return self.wrap(value)
-        except BadValueException:
-            pass
+        # The checks validate value completely, so it isn't validated again
+        # while it is wrapped
+        item_type = self.item_type
+        if item_type.check_wrap_value(value) is None:
+            if type(item_type).wrap_value is Field.wrap_value:
+                return item_type._wrap_unchecked(value)
+            return item_type.wrap_value(value)
+        if self.check_wrap(value) is None:
+            return self._wrap_unchecked(value)
         self._fail_validation(value, 'Could not wrap value as the correct type.  Tried %s and %s' % (self.item_type, self))
 
+    def check_wrap_value(self, value):
+        ''' Returns a :class:`ValidationFailure` if neither the sequence's
+            sub-type nor the sequence itself can wrap ``value`` '''
+        if self.item_type.check_wrap_value(value) is None:
+            return None
+        return self.check_wrap(value)
+
     def child_type(self):
         ''' Returns the :class:`Field` instance used for items in the sequence'''
         return self.item_type
@@ -723,11 +974,19 @@ class SequenceField(Field):
         if self.max != None and len(value) > self.max:
             self._fail_validation(value, 'Value has too many elements')
 
+    def _validate_shallow_wrap(self, value):
+        self._validate_wrap_type(value)
+        self._length_valid(value)
+
+    def _validate_shallow_unwrap(self, value):
+        if not unwrap_state.trusted:
+            self._validate_unwrap_type(value)
+            self._length_valid(value)
+
     def validate_wrap(self, value):
         ''' Checks that the type of ``value`` is correct as well as validating
             the elements of value'''
-        self._validate_wrap_type(value)
-        self._length_valid(value)
+        self._validate_shallow_wrap(value)
         for v in value:
             self._validate_child_wrap(v)
 
@@ -751,13 +1010,101 @@ class ListField(SequenceField):
     def wrap(self, value):
         ''' Wraps the elements of ``value`` using ``ListField.item_type`` and
             returns them in a list'''
-        self.validate_wrap(value)
-        return [self.item_type.wrap(v) for v in value]
+        custom = self._custom_validate_wrap
+        if custom:
+            self.validate_wrap(value)
+        else:
+            self._validate_shallow_wrap(value)
+        ret = [self.item_type.wrap(v) for v in value]
+        if not custom:
+            self._run_validators(value, 'wrap')
+        return ret
+    def _wrap_unchecked(self, value):
+        return [self.item_type._wrap_unchecked(v) for v in value]
     def unwrap(self, value):
         ''' Unwraps the elements of ``value`` using ``ListField.item_type`` and
             returns them in a list'''
-        self.validate_unwrap(value)
-        return [self.item_type.unwrap(v) for v in value]
+        custom = self._custom_validate_unwrap
+        if custom:
+            self.validate_unwrap(value)
+        else:
+            self._validate_shallow_unwrap(value)
+        ret = [self.item_type.unwrap(v) for v in value]
+        if not custom:
+            self._run_validators(value, 'unwrap')
+        return ret
+
+    def lazy_unwrap(self, value):
+        ''' Like :func:`unwrap`, but returns a :class:`LazyList` which
+            unwraps each element of ``value`` when it is first read'''
+        if self._allow_none and value == None:
+            return None
+        if self._custom_validate_unwrap:
+            self.validate_unwrap(value)
+        else:
+            self._validate_shallow_unwrap(value)
+            self._run_validators(value, 'unwrap')
+        return LazyList(value, self.item_type, unwrap_state.trusted)
+
+class LazyList(list):
+    ''' The value of a :class:`ListField` of a lazily loaded document (see
+        :func:`~mongoalchemy.query.Query.lazy`): a list whose elements are
+        unwrapped with ``item_type`` when they are first read.  Indexing,
+        iterating and ``len`` only unwrap what they return; anything else,
+        like changing, comparing or searching the list, unwraps all of the
+        elements first.  Code reading the list's storage directly (e.g. the
+        C ``json`` encoder) should be given ``list(value)`` instead.
+        Copies are plain lists.'''
+    def __init__(self, value, item_type, trusted=False):
+        list.__init__(self, value)
+        self.item_type = item_type
+        self.trusted = trusted
+        self.__pending = bytearray(b'\x01') * len(value)
+        self.__left = len(value)
+
+    def __item(self, index):
+        value = list.__getitem__(self, index)
+        if not self.__left:
+            return value
+        if index < 0:
+            index += len(self)
+        if not self.__pending[index]:
+            return value
+        if self.trusted:
+            with trusted_unwrap():
+                value = self.item_type.unwrap(value)
+        else:
+            value = self.item_type.unwrap(value)
+        list.__setitem__(self, index, value)
+        self.__pending[index] = 0
+        self.__left -= 1
+        return value
+
+    def _load(self):
+        if self.__left:
+            for index in range(len(self)):
+                self.__item(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.__item(i) for i in range(*index.indices(len(self)))]
+        return self.__item(index)
+
+    def __iter__(self):
+        index = 0
+        while index < len(self):
+            yield self.__item(index)
+            index += 1
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
+
+for _name in ('__contains__', '__eq__', '__ne__', '__lt__', '__le__', '__gt__',
+        '__ge__', '__repr__', '__setitem__', '__delitem__', '__add__',
+        '__iadd__', '__mul__', '__rmul__', '__imul__', '__reversed__',
+        'append', 'extend', 'insert', 'pop', 'remove', 'clear', 'reverse',
+        'sort', 'index', 'count', 'copy'):
+    setattr(LazyList, _name, loading_method(list, _name))
 
 class SetField(SequenceField):
     ''' Field representing a python set.
@@ -775,14 +1122,31 @@ class SetField(SequenceField):
         ''' Unwraps the elements of ``value`` using ``SetField.item_type`` and
             returns them in a set
             '''
-        self.validate_wrap(value)
-        return [self.item_type.wrap(v) for v in value]
+        custom = self._custom_validate_wrap
+        if custom:
+            self.validate_wrap(value)
+        else:
+            self._validate_shallow_wrap(value)
+        ret = [self.item_type.wrap(v) for v in value]
+        if not custom:
+            self._run_validators(value, 'wrap')
+        return ret
+
+    def _wrap_unchecked(self, value):
+        return [self.item_type._wrap_unchecked(v) for v in value]
 
     def unwrap(self, value):
         ''' Unwraps the elements of ``value`` using ``SetField.item_type`` and
             returns them in a set'''
-        self.validate_unwrap(value)
-        return set([self.item_type.unwrap(v) for v in value])
+        custom = self._custom_validate_unwrap
+        if custom:
+            self.validate_unwrap(value)
+        else:
+            self._validate_shallow_unwrap(value)
+        ret = set([self.item_type.unwrap(v) for v in value])
+        if not custom:
+            self._run_validators(value, 'unwrap')
+        return ret
 
 class AnythingField(Field):
     ''' A field that passes through whatever is set with no validation.  Useful
@@ -814,15 +1178,15 @@ class ObjectIdField(Field):
     def __init__(self, **kwargs):
         super(ObjectIdField, self).__init__(**kwargs)
 
-    def validate_wrap(self, value):
+    def _check_wrap(self, value):
         ''' Checks that ``value`` is a pymongo ``ObjectId`` or a string
             representation of one'''
         if not isinstance(value, ObjectId) and not isinstance(value, str):
-            self._fail_validation_type(value, ObjectId)
+            return self._failure_type(value, ObjectId)
         if isinstance(value, ObjectId):
-            return
+            return None
         if len(value) != 24:
-            self._fail_validation(value, 'hex object ID is the wrong length')
+            return self._failure(value, 'hex object ID is the wrong length')
 
     def wrap(self, value):
         ''' Validates that ``value`` is an ObjectId (or hex representation
@@ -832,6 +1196,11 @@ class ObjectIdField(Field):
             return ObjectId(value)
         return value
 
+    def _wrap_unchecked(self, value):
+        if isinstance(value, str):
+            return ObjectId(value)
+        return value
+
     def unwrap(self, value):
         ''' Validates that ``value`` is an ObjectId, then returns it '''
         self.validate_unwrap(value)
@@ -897,20 +1266,43 @@ class DictField(Field):
         ''' Validates ``value`` and then returns a dictionary with each key in
             ``value`` mapped to its value wrapped with ``DictField.value_type``
         '''
-        self.validate_wrap(value)
+        custom = self._custom_validate_wrap
+        if custom:
+            self.validate_wrap(value)
+        elif not isinstance(value, dict):
+            self._fail_validation_type(value, dict)
         ret = {}
         for k, v in value.items():
-            ret[k] = self.value_type.wrap(v)
+            if not custom:
+                self._validate_key_wrap(k)
+            try:
+                ret[k] = self.value_type.wrap(v)
+            except BadValueException as bve:
+                self._fail_validation(value, 'Bad value for key %s' % k, cause=bve)
+        if not custom:
+            self._run_validators(value, 'wrap')
         return ret
 
     def unwrap(self, value):
         ''' Validates ``value`` and then returns a dictionary with each key in
             ``value`` mapped to its value unwrapped using ``DictField.value_type``
         '''
-        self.validate_unwrap(value)
+        custom = self._custom_validate_unwrap
+        if custom:
+            self.validate_unwrap(value)
+        trusted = custom or unwrap_state.trusted
+        if not trusted and not isinstance(value, dict):
+            self._fail_validation_type(value, dict)
         ret = {}
         for k, v in value.items():
-            ret[k] = self.value_type.unwrap(v)
+            if not trusted:
+                self._validate_key_unwrap(k)
+            try:
+                ret[k] = self.value_type.unwrap(v)
+            except BadValueException as bve:
+                self._fail_validation(value, 'Bad value for key %s' % k, cause=bve)
+        if not custom:
+            self._run_validators(value, 'unwrap')
         return ret
 
 class KVField(DictField):
@@ -988,12 +1380,24 @@ class KVField(DictField):
             the dictionary is transformed into a list of dictionaries with ``k`` and ``v``
             fields set to the keys and values from the original dictionary.
         '''
-        self.validate_wrap(value)
+        custom = self._custom_validate_wrap
+        if custom:
+            self.validate_wrap(value)
+        elif not isinstance(value, dict):
+            self._fail_validation_type(value, dict)
         ret = []
         for k, v in value.items():
-            k = self.key_type.wrap(k)
-            v = self.value_type.wrap(v)
-            ret.append( { 'k' : k, 'v' : v })
+            try:
+                wrapped_k = self.key_type.wrap(k)
+            except BadValueException as bve:
+                self._fail_validation(k, 'Bad value for key', cause=bve)
+            try:
+                wrapped_v = self.value_type.wrap(v)
+            except BadValueException as bve:
+                self._fail_validation(value, 'Bad value for key %s' % k, cause=bve)
+            ret.append( { 'k' : wrapped_k, 'v' : wrapped_v })
+        if not custom:
+            self._run_validators(value, 'wrap')
         return ret
 
     def unwrap(self, value):
@@ -1002,12 +1406,32 @@ class KVField(DictField):
             dictionary should have.  Validates the input and then constructs the
             dictionary from the list.
         '''
-        self.validate_unwrap(value)
+        custom = self._custom_validate_unwrap
+        if custom:
+            self.validate_unwrap(value)
+        trusted = custom or unwrap_state.trusted
+        if not trusted and not isinstance(value, list):
+            self._fail_validation_type(value, list)
         ret = {}
         for value_dict in value:
+            if not trusted:
+                if not isinstance(value_dict, dict):
+                    cause = BadValueException('', value_dict, 'Values in a KVField list must be dicts')
+                    self._fail_validation(value, 'Values in a KVField list must be dicts', cause=cause)
+                if value_dict.get('k') == None:
+                    self._fail_validation(value, 'Value had None for a key')
             k = value_dict['k']
-            v = value_dict['v']
-            ret[self.key_type.unwrap(k)] = self.value_type.unwrap(v)
+            v = value_dict.get('v')
+            try:
+                k = self.key_type.unwrap(k)
+            except BadValueException as bve:
+                self._fail_validation(value, 'Bad value for KVField key %s' % k, cause=bve)
+            try:
+                ret[k] = self.value_type.unwrap(v)
+            except BadValueException as bve:
+                self._fail_validation(value, 'Bad value for KFVield value %s' % k, cause=bve)
+        if not custom:
+            self._run_validators(value, 'unwrap')
         return ret
 
 class ComputedField(Field):
@@ -1104,6 +1528,9 @@ class ComputedField(Field):
             sequence itself'''
         return self.computed_type.wrap_value(value)
 
+    def check_wrap_value(self, value):
+        return self.computed_type.check_wrap_value(value)
+
     def validate_wrap(self, value):
         ''' Check that ``value`` is valid for unwrapping with ``ComputedField.computed_type``'''
         try:
@@ -1120,13 +1547,29 @@ class ComputedField(Field):
 
     def wrap(self, value):
         ''' Validates ``value`` and wraps it with ``ComputedField.computed_type``'''
-        self.validate_wrap(value)
-        return self.computed_type.wrap(value)
+        custom = self._custom_validate_wrap
+        if custom:
+            self.validate_wrap(value)
+        try:
+            ret = self.computed_type.wrap(value)
+        except BadValueException as bve:
+            self._fail_validation(value, 'Bad value for computed field', cause=bve)
+        if not custom:
+            self._run_validators(value, 'wrap')
+        return ret
 
     def unwrap(self, value):
         ''' Validates ``value`` and unwraps it with ``ComputedField.computed_type``'''
-        self.validate_unwrap(value)
-        return self.computed_type.unwrap(value)
+        custom = self._custom_validate_unwrap
+        if custom:
+            self.validate_unwrap(value)
+        try:
+            ret = self.computed_type.unwrap(value)
+        except BadValueException as bve:
+            self._fail_validation(value, 'Bad value for computed field', cause=bve)
+        if not custom:
+            self._run_validators(value, 'unwrap')
+        return ret
 
 class computed_field(object):
     def __init__(self, computed_type, deps=None, **kwargs):
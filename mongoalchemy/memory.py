@@ -0,0 +1,1031 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+'''
+
+A pure-python :class:`~mongoalchemy.backend.Backend` which keeps every
+collection in memory.  It understands the query and update documents produced
+by MongoAlchemy:
+
+* query operators: equality (including matching array elements), regular
+  expressions, ``$in``, ``$nin``, ``$lt``, ``$lte``, ``$gt``, ``$gte``,
+  ``$ne``, ``$exists``, ``$all``, ``$size``, ``$elemMatch``, ``$mod``,
+  ``$regex``, ``$not``, ``$and``, ``$or`` and ``$nor`` on dotted paths
+* update operators: ``$set``, ``$unset``, ``$inc``, ``$push``, ``$pushAll``,
+  ``$addToSet``, ``$pull``, ``$pullAll`` and ``$pop``, including the ``$``
+  positional operator, as well as replacement updates and upserts
+* sorting, skip, limit, field selection, ``count``, ``distinct``,
+  ``find_and_modify`` and unique indexes
+
+Values are compared using MongoDB's ordering of types.  Every write is done
+as if ``safe`` was set, so errors (``OperationFailure``,
+``DuplicateKeyError``) are always raised.  Documents are copied when they are
+stored and when they are returned.
+
+'''
+
+import functools
+import itertools
+import re
+import threading
+import time
+from datetime import datetime
+from pymongo.objectid import ObjectId
+from pymongo.binary import Binary
+from pymongo.errors import OperationFailure, DuplicateKeyError
+
+from mongoalchemy.backend import Backend, BackendCollection, BackendCursor
+from mongoalchemy.raw import RawDocument
+from mongoalchemy.document import forget_ensured_indexes
+
+
+RE_TYPE = type(re.compile(''))
+
+_backend_numbers = itertools.count(1)
+
+
+class MemoryBackend(Backend):
+    ''' An in-memory database.  Collections are created when they are first
+        used.  All of the collections share a lock, so the backend can be
+        used by several threads.
+
+        :param name: the database name.  Since indexes are only ensured once \
+            per ``database.collection`` name and process (see \
+            :data:`~mongoalchemy.document.ensured_index_registry`), each \
+            backend gets a unique name by default.
+    '''
+
+    def __init__(self, name=None):
+        if name is None:
+            name = 'memory%d' % next(_backend_numbers)
+        self.name = name
+        self.lock = threading.RLock()
+        self.__collections = {}
+
+    def __getitem__(self, name):
+        with self.lock:
+            collection = self.__collections.get(name)
+            if collection is None:
+                collection = MemoryCollection(self, name)
+                self.__collections[name] = collection
+            return collection
+
+    def collection_names(self):
+        return sorted(self.__collections)
+
+    def drop_collection(self, name):
+        with self.lock:
+            self.__collections.pop(name, None)
+        forget_ensured_indexes('%s.%s' % (self.name, name))
+
+
+class MemoryCollection(BackendCollection):
+    ''' A collection of a :class:`MemoryBackend` '''
+
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+        self.full_name = '%s.%s' % (backend.name, name)
+        self.lock = backend.lock
+        self.__docs = {}
+        self.__indexes = {}
+
+    def __len__(self):
+        return len(self.__docs)
+
+    def documents(self, spec=None):
+        ''' The stored documents, in insertion order.  These are not copies
+            and must not be modified.  If the query ``spec`` is given, only
+            documents which may match it are returned.'''
+        with self.lock:
+            if spec:
+                key = _id_key(spec)
+                if key is not None:
+                    doc = self.__docs.get(key)
+                    return [] if doc is None else [doc]
+            return list(self.__docs.values())
+
+    def __candidates(self, spec):
+        # (key, document) pairs which may match spec
+        key = _id_key(spec)
+        if key is not None:
+            doc = self.__docs.get(key)
+            return [] if doc is None else [(key, doc)]
+        return list(self.__docs.items())
+
+    # Reads
+
+    def find(self, spec=None, fields=None):
+        return MemoryCursor(self, spec or {}, fields)
+
+    def find_one(self, spec_or_id=None, fields=None):
+        for doc in self.find(_spec(spec_or_id), fields).limit(-1):
+            return doc
+        return None
+
+    def index_information(self):
+        info = {'_id_' : {'key' : [('_id', 1)]}}
+        for name, index in self.__indexes.items():
+            info[name] = index.information()
+        return info
+
+    # Writes
+
+    def insert(self, doc_or_docs, safe=False):
+        docs = doc_or_docs if isinstance(doc_or_docs, list) else [doc_or_docs]
+        ids = []
+        with self.lock:
+            for doc in docs:
+                if '_id' not in doc:
+                    doc['_id'] = ObjectId()
+                if _hashable(doc['_id']) in self.__docs:
+                    raise DuplicateKeyError('E11000 duplicate key error index: '
+                        '%s.$_id_  dup key: { : %r }' % (self.full_name, doc['_id']))
+                self.__store(_copy(doc))
+                ids.append(doc['_id'])
+        if isinstance(doc_or_docs, list):
+            return ids
+        return ids[0]
+
+    def save(self, to_save, safe=False):
+        if '_id' not in to_save:
+            return self.insert(to_save, safe=safe)
+        with self.lock:
+            self.__replace(_hashable(to_save['_id']), _copy(to_save))
+        return to_save['_id']
+
+    def update(self, spec, document, upsert=False, multi=False, safe=False):
+        n = 0
+        with self.lock:
+            for key, doc in self.__candidates(spec):
+                if not matches(doc, spec):
+                    continue
+                self.__replace(key, apply_update(doc, document, spec))
+                n += 1
+                if not multi:
+                    break
+            upserted = None
+            if n == 0 and upsert:
+                new_doc = upsert_document(spec, document)
+                self.__store(new_doc)
+                upserted = new_doc['_id']
+                n = 1
+        if not safe:
+            return None
+        status = {'ok' : 1.0, 'err' : None, 'n' : n,
+            'updatedExisting' : upserted is None and n > 0}
+        if upserted is not None:
+            status['upserted'] = upserted
+        return status
+
+    def remove(self, spec_or_id=None, safe=False):
+        spec = _spec(spec_or_id) or {}
+        n = 0
+        with self.lock:
+            for key, doc in self.__candidates(spec):
+                if matches(doc, spec):
+                    self.__delete(key)
+                    n += 1
+        if not safe:
+            return None
+        return {'ok' : 1.0, 'err' : None, 'n' : n}
+
+    def find_and_modify(self, query={}, update=None, upsert=False, sort=None,
+            fields=None, new=False, remove=False):
+        if remove and (update or upsert or new):
+            raise OperationFailure('remove and update can\'t be used together')
+        if not remove and update is None:
+            raise OperationFailure('need remove or update')
+        with self.lock:
+            cursor = self.find(query)
+            if sort:
+                cursor.sort(list(sort.items()) if isinstance(sort, dict) else sort)
+            key = cursor._first_key()
+            if key is None:
+                if not upsert:
+                    return None
+                doc = upsert_document(query, update)
+                self.__store(doc)
+                return project(doc, fields) if new else {}
+            old = self.__docs[key]
+            if remove:
+                self.__delete(key)
+                return project(old, fields)
+            doc = apply_update(old, update, query)
+            self.__replace(key, doc)
+            return project(doc if new else old, fields)
+
+    def ensure_index(self, key_or_list, unique=False, drop_dups=False,
+            sparse=False, **kwargs):
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, 1)]
+        components = [(str(k), d) for k, d in key_or_list]
+        name = '_'.join('%s_%s' % (k, d) for k, d in components)
+        with self.lock:
+            if name in self.__indexes:
+                return name
+            index = _Index(name, components, unique, sparse, drop_dups)
+            for key, doc in list(self.__docs.items()):
+                try:
+                    index.add(doc)
+                except DuplicateKeyError:
+                    if not drop_dups:
+                        raise
+                    self.__delete(key)
+            self.__indexes[name] = index
+        return name
+
+    def drop(self):
+        ''' Drop the collection '''
+        self.backend.drop_collection(self.name)
+
+    def drop_indexes(self):
+        with self.lock:
+            self.__indexes.clear()
+        forget_ensured_indexes(self)
+
+    def __store(self, doc):
+        for index in self.__indexes.values():
+            index.check(doc)
+        for index in self.__indexes.values():
+            index.add(doc)
+        self.__docs[_hashable(doc['_id'])] = doc
+
+    def __delete(self, key):
+        doc = self.__docs.pop(key)
+        for index in self.__indexes.values():
+            index.discard(doc)
+
+    def __replace(self, key, doc):
+        # Replaced documents keep their position in the collection
+        old = self.__docs.get(key)
+        if old is None:
+            self.__store(doc)
+            return
+        for index in self.__indexes.values():
+            index.discard(old)
+        try:
+            for index in self.__indexes.values():
+                index.check(doc)
+        except DuplicateKeyError:
+            for index in self.__indexes.values():
+                index.add(old)
+            raise
+        for index in self.__indexes.values():
+            index.add(doc)
+        self.__docs[key] = doc
+
+
+class MemoryCursor(BackendCursor):
+    ''' The cursor returned by :func:`MemoryCollection.find`.  The matching
+        documents are collected (and copied) when the cursor is first read.'''
+
+    def __init__(self, collection, spec, fields):
+        self.collection = collection
+        self.spec = spec
+        self.fields = fields
+        self.__sort = None
+        self.__limit = 0
+        self.__skip = 0
+        self.__hint = None
+        self.__batch_size = 0
+        self.__results = None
+        self.__position = 0
+
+    def __check_not_started(self):
+        if self.__results is not None:
+            raise OperationFailure('cannot set options after executing query')
+
+    def sort(self, key_or_list, direction=None):
+        self.__check_not_started()
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, direction or 1)]
+        self.__sort = list(key_or_list)
+        return self
+
+    def hint(self, index):
+        self.__check_not_started()
+        self.__hint = index
+        return self
+
+    def limit(self, limit):
+        self.__check_not_started()
+        self.__limit = limit
+        return self
+
+    def skip(self, skip):
+        self.__check_not_started()
+        self.__skip = skip
+        return self
+
+    def batch_size(self, batch_size):
+        ''' Sets the size of the batches :func:`buffered` reports.  The
+            results are all found at once, whatever the batch size.'''
+        self.__batch_size = batch_size
+        return self
+
+    def __matching(self):
+        # The (uncopied) matching documents in sort order
+        docs = [doc for doc in self.collection.documents(self.spec)
+            if matches(doc, self.spec)]
+        if self.__sort:
+            docs.sort(key=functools.cmp_to_key(_sort_cmp(self.__sort)))
+        return docs
+
+    def __window(self, docs):
+        docs = docs[self.__skip:]
+        if self.__limit:
+            docs = docs[:abs(self.__limit)]
+        return docs
+
+    def _first_key(self):
+        docs = self.__matching()
+        if not docs:
+            return None
+        return _hashable(docs[0]['_id'])
+
+    def __results_list(self):
+        if self.__results is None:
+            self.__results = [project(doc, self.fields)
+                for doc in self.__window(self.__matching())]
+        return self.__results
+
+    def __next__(self):
+        results = self.__results_list()
+        if self.__position >= len(results):
+            raise StopIteration
+        self.__position += 1
+        return results[self.__position - 1]
+
+    def buffered(self):
+        ''' The number of results which have been fetched but not returned '''
+        if self.__results is None:
+            return 0
+        remaining = len(self.__results) - self.__position
+        if self.__batch_size:
+            remaining = min(remaining, -self.__position % self.__batch_size)
+        return remaining
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None:
+                raise IndexError('Cursor instances do not support slice steps')
+            cursor = self.clone()
+            start = index.start or 0
+            cursor.skip(self.__skip + start)
+            if index.stop is not None:
+                limit = index.stop - start
+                if limit <= 0:
+                    raise IndexError('stop index must be greater than start index for slice %r' % index)
+                cursor.limit(limit)
+            return cursor
+        if index < 0:
+            raise IndexError('Cursor instances do not support negative indices')
+        if self.__limit and index >= abs(self.__limit):
+            raise IndexError('no such item for Cursor instance')
+        for doc in self.clone().skip(self.__skip + index).limit(-1):
+            return doc
+        raise IndexError('no such item for Cursor instance')
+
+    def count(self, with_limit_and_skip=False):
+        docs = self.__matching()
+        if with_limit_and_skip:
+            docs = self.__window(docs)
+        return len(docs)
+
+    def distinct(self, key):
+        values = []
+        for doc in self.__matching():
+            for value in _expand(lookup(doc, key), include_arrays=False):
+                if not any(_cmp(value, v) == 0 for v in values):
+                    values.append(value)
+        return [_copy(v) for v in values]
+
+    def explain(self):
+        start = time.time()
+        scanned = len(self.collection)
+        n = len(self.__window(self.__matching()))
+        return {
+            'cursor' : 'BasicCursor',
+            'n' : n,
+            'nscanned' : scanned,
+            'nscannedObjects' : scanned,
+            'millis' : int((time.time() - start) * 1000),
+            'indexBounds' : {},
+        }
+
+    def rewind(self):
+        self.__results = None
+        self.__position = 0
+        return self
+
+    def clone(self):
+        cursor = MemoryCursor(self.collection, self.spec, self.fields)
+        cursor.__sort = self.__sort
+        cursor.__limit = self.__limit
+        cursor.__skip = self.__skip
+        cursor.__hint = self.__hint
+        cursor.__batch_size = self.__batch_size
+        return cursor
+
+
+class _Index(object):
+    def __init__(self, name, components, unique, sparse, drop_dups):
+        self.name = name
+        self.components = components
+        self.unique = unique
+        self.sparse = sparse
+        self.drop_dups = drop_dups
+        self.keys = {}
+
+    def information(self):
+        info = {'key' : list(self.components), 'dropDups' : self.drop_dups}
+        if self.unique:
+            info['unique'] = True
+        if self.sparse:
+            info['sparse'] = True
+        return info
+
+    def __key(self, doc):
+        values = []
+        for name, _ in self.components:
+            found = lookup(doc, name)
+            if not found and self.sparse:
+                return None
+            values.append(_hashable(found[0] if found else None))
+        return tuple(values)
+
+    def check(self, doc):
+        if not self.unique:
+            return
+        key = self.__key(doc)
+        if key is not None and self.keys.get(key, doc['_id']) != doc['_id']:
+            raise DuplicateKeyError('E11000 duplicate key error index: %s  dup key: %r'
+                % (self.name, key))
+
+    def add(self, doc):
+        self.check(doc)
+        key = self.__key(doc)
+        if self.unique and key is not None:
+            self.keys[key] = doc['_id']
+
+    def discard(self, doc):
+        key = self.__key(doc)
+        if self.unique and key is not None and self.keys.get(key) == doc['_id']:
+            del self.keys[key]
+
+
+#
+# Values
+#
+
+def _copy(value):
+    # Documents only contain dicts, lists and immutable values
+    if isinstance(value, RawDocument):
+        return value.decode()
+    if isinstance(value, dict):
+        return dict((k, _copy(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return ('$dict', tuple((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ('$list', tuple(_hashable(v) for v in value))
+    return value
+
+
+def _id_key(spec):
+    # The stored key of the only document spec can match, if it matches
+    # on a plain _id value
+    if '_id' not in spec:
+        return None
+    value = spec['_id']
+    if isinstance(value, (dict, RE_TYPE)):
+        return None
+    key = _hashable(value)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _spec(spec_or_id):
+    if spec_or_id is None or isinstance(spec_or_id, dict):
+        return spec_or_id
+    return {'_id' : spec_or_id}
+
+
+def _type_order(value):
+    # MongoDB's sort order of BSON types
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, (bytes, Binary)):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    if isinstance(value, RE_TYPE):
+        return 11
+    return 12
+
+
+def _cmp(a, b):
+    ''' Compares two values the way MongoDB does '''
+    ta, tb = _type_order(a), _type_order(b)
+    if ta != tb:
+        return -1 if ta < tb else 1
+    if ta == 4:
+        a, b = list(a.items()), list(b.items())
+        for (ka, va), (kb, vb) in zip(a, b):
+            if ka != kb:
+                return -1 if ka < kb else 1
+            c = _cmp(va, vb)
+            if c:
+                return c
+        return _cmp(len(a), len(b))
+    if ta == 5:
+        for va, vb in zip(a, b):
+            c = _cmp(va, vb)
+            if c:
+                return c
+        return _cmp(len(a), len(b))
+    if ta == 11:
+        a, b = (a.pattern, a.flags), (b.pattern, b.flags)
+    elif ta == 12:
+        if a == b:
+            return 0
+        a, b = repr(a), repr(b)
+    if a == b:
+        return 0
+    return -1 if a < b else 1
+
+
+def _sort_cmp(sort):
+    def compare(a, b):
+        for key, direction in sort:
+            c = _cmp(_sort_value(a, key, direction), _sort_value(b, key, direction))
+            if c:
+                return c if direction >= 0 else -c
+        return 0
+    return compare
+
+
+def _sort_value(doc, key, direction):
+    # Arrays sort by their smallest (or largest, descending) element
+    values = lookup(doc, key)
+    if not values:
+        return None
+    values = list(_expand(values, include_arrays=False)) or values
+    values.sort(key=functools.cmp_to_key(_cmp))
+    return values[0] if direction >= 0 else values[-1]
+
+
+#
+# Queries
+#
+
+def lookup(doc, path):
+    ''' Returns the values at the dotted ``path`` in ``doc``.  Arrays of
+        documents are descended into, so there may be more than one value.'''
+    return _lookup(doc, path.split('.'))
+
+
+def _lookup(value, parts):
+    if not parts:
+        return [value]
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        if head in value:
+            return _lookup(value[head], rest)
+        return []
+    if isinstance(value, list):
+        ret = []
+        if head.isdigit() and int(head) < len(value):
+            ret.extend(_lookup(value[int(head)], rest))
+        for item in value:
+            if isinstance(item, dict):
+                ret.extend(_lookup(item, parts))
+        return ret
+    return []
+
+
+def _expand(values, include_arrays=True):
+    # An array matches a condition if the array itself or any of its
+    # elements does
+    for value in values:
+        if isinstance(value, list):
+            if include_arrays:
+                yield value
+            for item in value:
+                yield item
+        else:
+            yield value
+
+
+def _is_operator_dict(cond):
+    return isinstance(cond, dict) and len(cond) > 0 and \
+            all(str(k).startswith('$') for k in cond)
+
+
+def matches(doc, spec):
+    ''' Returns whether the document ``doc`` matches the query ``spec`` '''
+    for key, cond in spec.items():
+        if key == '$or':
+            if not any(matches(doc, s) for s in cond):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, s) for s in cond):
+                return False
+        elif key == '$nor':
+            if any(matches(doc, s) for s in cond):
+                return False
+        elif key.startswith('$'):
+            raise OperationFailure('invalid operator: %s' % key)
+        elif not match_values(lookup(doc, key), cond):
+            return False
+    return True
+
+
+def match_values(values, cond):
+    ''' Returns whether ``values`` (the values found at a path) match the
+        condition ``cond``, which is either a value, a regular expression or
+        a dict of operators'''
+    if _is_operator_dict(cond):
+        for op, arg in cond.items():
+            if op == '$options':
+                continue
+            if not _match_operator(values, op, arg, cond):
+                return False
+        return True
+    return _match_equal(values, cond)
+
+
+def _match_equal(values, target):
+    if target is None and not values:
+        return True
+    if isinstance(target, RE_TYPE):
+        return any(_regex_match(target, v) for v in _expand(values))
+    return any(_cmp(v, target) == 0 for v in _expand(values))
+
+
+def _regex_match(regex, value):
+    if isinstance(value, RE_TYPE):
+        return value.pattern == regex.pattern
+    return isinstance(value, str) and regex.search(value) is not None
+
+
+def _compare(values, arg, test):
+    order = _type_order(arg)
+    for value in _expand(values):
+        if _type_order(value) == order and test(_cmp(value, arg)):
+            return True
+    return False
+
+
+def _match_operator(values, op, arg, cond):
+    if op == '$eq':
+        return _match_equal(values, arg)
+    if op == '$ne':
+        return not _match_equal(values, arg)
+    if op == '$in':
+        return any(_match_equal(values, a) for a in arg)
+    if op == '$nin':
+        return not any(_match_equal(values, a) for a in arg)
+    if op == '$lt':
+        return _compare(values, arg, lambda c: c < 0)
+    if op == '$lte':
+        return _compare(values, arg, lambda c: c <= 0)
+    if op == '$gt':
+        return _compare(values, arg, lambda c: c > 0)
+    if op == '$gte':
+        return _compare(values, arg, lambda c: c >= 0)
+    if op == '$exists':
+        return bool(values) == bool(arg)
+    if op == '$size':
+        return any(isinstance(v, list) and len(v) == arg for v in values)
+    if op == '$all':
+        return len(arg) > 0 and all(_match_equal(values, a) for a in arg)
+    if op == '$elemMatch':
+        for value in values:
+            if not isinstance(value, list):
+                continue
+            for item in value:
+                if _is_operator_dict(arg):
+                    if match_values([item], arg):
+                        return True
+                elif isinstance(item, dict) and matches(item, arg):
+                    return True
+        return False
+    if op == '$mod':
+        divisor, remainder = arg
+        return any(isinstance(v, (int, float)) and not isinstance(v, bool)
+            and v % divisor == remainder for v in _expand(values))
+    if op == '$regex':
+        flags = 0
+        for option in cond.get('$options', ''):
+            flags |= {'i' : re.I, 'm' : re.M, 's' : re.S, 'x' : re.X}.get(option, 0)
+        regex = arg if isinstance(arg, RE_TYPE) else re.compile(arg, flags)
+        return any(_regex_match(regex, v) for v in _expand(values))
+    if op == '$not':
+        if isinstance(arg, RE_TYPE):
+            return not any(_regex_match(arg, v) for v in _expand(values))
+        if not _is_operator_dict(arg):
+            raise OperationFailure('invalid use of $not')
+        return not match_values(values, arg)
+    raise OperationFailure('invalid operator: %s' % op)
+
+
+def project(doc, fields):
+    ''' Returns a copy of ``doc`` with only the fields selected by ``fields``
+        (a list of paths or a dict of paths to booleans) '''
+    if fields is None:
+        return _copy(doc)
+    if not isinstance(fields, dict):
+        fields = dict((f, True) for f in fields)
+    include_id = fields.get('_id', True)
+    selected = [k for k, v in fields.items() if k != '_id']
+    if any(fields[k] for k in selected) or not selected:
+        ret = {}
+        if include_id and '_id' in doc:
+            ret['_id'] = _copy(doc['_id'])
+        for path in selected:
+            if fields[path]:
+                _include(doc, path.split('.'), ret)
+        return ret
+    ret = _copy(doc)
+    if not include_id:
+        ret.pop('_id', None)
+    for path in selected:
+        _exclude(ret, path.split('.'))
+    return ret
+
+
+def _include(src, parts, dst):
+    head, rest = parts[0], parts[1:]
+    if head not in src:
+        return
+    value = src[head]
+    if not rest:
+        dst[head] = _copy(value)
+    elif isinstance(value, dict):
+        _include(value, rest, dst.setdefault(head, {}))
+    elif isinstance(value, list):
+        items = dst.setdefault(head, [{} for _ in value])
+        for item, sub in zip(value, items):
+            if isinstance(item, dict):
+                _include(item, rest, sub)
+
+
+def _exclude(doc, parts):
+    head, rest = parts[0], parts[1:]
+    if isinstance(doc, list):
+        for item in doc:
+            _exclude(item, parts)
+    elif isinstance(doc, dict) and head in doc:
+        if rest:
+            _exclude(doc[head], rest)
+        else:
+            del doc[head]
+
+
+#
+# Updates
+#
+
+def upsert_document(spec, document):
+    ''' Returns the document inserted by an upsert of ``document`` which
+        didn't match any document with ``spec`` '''
+    doc = {}
+    if not any(k.startswith('$') for k in document):
+        doc = _copy(document)
+        if '_id' in spec and not isinstance(spec['_id'], dict):
+            doc.setdefault('_id', _copy(spec['_id']))
+    else:
+        for key, cond in spec.items():
+            if key.startswith('$') or _is_operator_dict(cond) or \
+                    isinstance(cond, RE_TYPE):
+                continue
+            _set(doc, key.split('.'), _copy(cond))
+        doc = apply_update(doc, document, spec, upsert=True)
+    if '_id' not in doc:
+        doc['_id'] = ObjectId()
+    return doc
+
+
+def apply_update(doc, document, spec, upsert=False):
+    ''' Returns a copy of ``doc`` with the update ``document`` applied.
+        ``spec`` is the query which matched ``doc``, used for ``$``
+        positional updates.'''
+    if not any(k.startswith('$') for k in document):
+        new_doc = _copy(document)
+        if '_id' in doc:
+            if '_id' in new_doc and _cmp(new_doc['_id'], doc['_id']) != 0:
+                raise OperationFailure('cannot change _id of a document')
+            new_doc['_id'] = doc['_id']
+        return new_doc
+
+    doc = _copy(doc)
+    for op, values in document.items():
+        for path, arg in values.items():
+            parts = _resolve_positional(doc, path, spec, upsert)
+            if parts[0] == '_id' and not upsert:
+                raise OperationFailure('Mod on _id not allowed')
+            _apply_operator(doc, op, parts, _copy(arg))
+    return doc
+
+
+def _resolve_positional(doc, path, spec, upsert):
+    parts = path.split('.')
+    if '$' not in parts:
+        return parts
+    if upsert:
+        raise OperationFailure('cannot use the part (%s) to traverse the element' % path)
+    i = parts.index('$')
+    prefix = '.'.join(parts[:i])
+    array = _get(doc, parts[:i])
+    if isinstance(array, list):
+        for index, item in enumerate(array):
+            if _element_matches(item, prefix, spec):
+                return parts[:i] + [str(index)] + parts[i+1:]
+    raise OperationFailure('The positional operator did not find the match '
+        'needed from the query.')
+
+
+def _element_matches(item, prefix, spec):
+    # Whether the array element ``item`` at ``prefix`` satisfies the parts
+    # of the query about that array
+    relevant = False
+    for key, cond in spec.items():
+        if key == prefix:
+            relevant = True
+            if not match_values([item], cond):
+                return False
+        elif key.startswith(prefix + '.'):
+            relevant = True
+            if not isinstance(item, dict):
+                return False
+            if not match_values(lookup(item, key[len(prefix) + 1:]), cond):
+                return False
+    return relevant
+
+
+def _get(doc, parts):
+    value = doc
+    for part in parts:
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+    return value
+
+
+def _container(doc, parts, create):
+    # The container holding the last element of ``parts`` and the key of
+    # the element in it
+    value = doc
+    for part in parts[:-1]:
+        if isinstance(value, dict):
+            if part not in value:
+                if not create:
+                    return None, None
+                value[part] = {}
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit():
+            index = int(part)
+            if index >= len(value):
+                if not create:
+                    return None, None
+                value.extend([None] * (index + 1 - len(value)))
+            if value[index] is None and create:
+                value[index] = {}
+            value = value[index]
+        else:
+            raise OperationFailure('cannot use the part (%s) to traverse the '
+                'element' % part)
+    key = parts[-1]
+    if isinstance(value, list):
+        if not key.isdigit():
+            raise OperationFailure('cannot use the part (%s) to traverse the '
+                'element' % key)
+        key = int(key)
+        if key >= len(value) and create:
+            value.extend([None] * (key + 1 - len(value)))
+    elif not isinstance(value, dict):
+        raise OperationFailure('cannot use the part (%s) to traverse the '
+            'element' % key)
+    return value, key
+
+
+def _set(doc, parts, value):
+    container, key = _container(doc, parts, True)
+    container[key] = value
+
+
+def _current(container, key):
+    if isinstance(container, list):
+        return container[key] if key < len(container) else None
+    return container.get(key)
+
+
+def _array(container, key, op):
+    value = _current(container, key)
+    if value is None:
+        value = []
+        container[key] = value
+    if not isinstance(value, list):
+        raise OperationFailure('Cannot apply %s modifier to non-array' % op)
+    return value
+
+
+def _apply_operator(doc, op, parts, arg):
+    if op == '$unset':
+        container, key = _container(doc, parts, False)
+        if isinstance(container, dict):
+            container.pop(key, None)
+        elif isinstance(container, list) and key < len(container):
+            container[key] = None
+        return
+
+    container, key = _container(doc, parts, True)
+    if op == '$set':
+        container[key] = arg
+    elif op == '$inc':
+        current = _current(container, key)
+        if current is None:
+            current = 0
+        if isinstance(current, bool) or not isinstance(current, (int, float)) \
+                or isinstance(arg, bool) or not isinstance(arg, (int, float)):
+            raise OperationFailure('Cannot apply $inc modifier to non-number')
+        container[key] = current + arg
+    elif op == '$push':
+        if isinstance(arg, dict) and '$each' in arg:
+            _array(container, key, op).extend(arg['$each'])
+        else:
+            _array(container, key, op).append(arg)
+    elif op == '$pushAll':
+        _array(container, key, op).extend(arg)
+    elif op == '$addToSet':
+        array = _array(container, key, op)
+        items = arg['$each'] if isinstance(arg, dict) and '$each' in arg else [arg]
+        for item in items:
+            if not any(_cmp(item, v) == 0 for v in array):
+                array.append(item)
+    elif op == '$pull':
+        array = _array(container, key, op)
+        array[:] = [v for v in array if not _pull_matches(v, arg)]
+    elif op == '$pullAll':
+        array = _array(container, key, op)
+        array[:] = [v for v in array if not any(_cmp(v, a) == 0 for a in arg)]
+    elif op == '$pop':
+        array = _array(container, key, op)
+        if array:
+            if arg >= 0:
+                array.pop()
+            else:
+                array.pop(0)
+    else:
+        raise OperationFailure('Invalid modifier specified %s' % op)
+
+
+def _pull_matches(value, cond):
+    if _is_operator_dict(cond):
+        return match_values([value], cond)
+    if isinstance(cond, dict) and isinstance(value, dict):
+        return matches(value, cond)
+    return _cmp(value, cond) == 0
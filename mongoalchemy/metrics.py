@@ -0,0 +1,319 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Counters and histograms of what MongoAlchemy does, per document class and
+    operation, in the Prometheus text exposition format.  Metrics are off
+    until :func:`enable` is called::
+
+        from mongoalchemy import metrics
+        registry = metrics.enable()
+        ...
+        registry.write('/var/lib/node_exporter/mongoalchemy.prom')
+        # or, in an HTTP handler
+        body = registry.render()
+
+    The metrics are:
+
+        * ``mongoalchemy_operations_total{class, operation}``: queries, \
+            updates, find and modifies and removes run by sessions
+        * ``mongoalchemy_operation_seconds{class, operation}``: a histogram \
+            of their durations.  Queries are timed until their results have \
+            been read to the end
+        * ``mongoalchemy_operation_documents_total{class, operation}``: the \
+            documents returned or affected (for safe writes)
+        * ``mongoalchemy_documents_wrapped_total{class}`` and \
+            ``mongoalchemy_documents_unwrapped_total{class}``, including \
+            embedded documents
+        * ``mongoalchemy_bytes_encoded_total{class}``: the BSON size of the \
+            wrapped documents.  Only measured with ``measure_bytes``, since \
+            it encodes each document an extra time
+        * ``mongoalchemy_flush_documents{class}``: a histogram of the number \
+            of documents written by each session flush
+        * ``mongoalchemy_index_ensures_total{collection}``: ``ensure_index`` \
+            calls sent to the database
+        * ``mongoalchemy_validation_failures_total{class, operation}``: \
+            documents which failed to wrap or unwrap
+
+    Each thread counts into its own dictionaries without taking a lock; they
+    are only merged when the metrics are rendered.
+'''
+
+import os
+import threading
+from bisect import bisect_left
+
+#: The registry metrics are being recorded in, or ``None`` when they are off
+active = None
+
+#: The default upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0)
+
+#: The upper bounds of the flush size histogram buckets
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# name: (type, help, label names)
+METRICS = {
+    'operations_total' : ('counter', 'Database operations run by sessions',
+        ('class', 'operation')),
+    'operation_seconds' : ('histogram', 'Duration of database operations',
+        ('class', 'operation')),
+    'operation_documents_total' : ('counter',
+        'Documents returned or affected by database operations',
+        ('class', 'operation')),
+    'documents_wrapped_total' : ('counter', 'Documents wrapped', ('class',)),
+    'documents_unwrapped_total' : ('counter', 'Documents unwrapped', ('class',)),
+    'bytes_encoded_total' : ('counter', 'BSON bytes of the wrapped documents',
+        ('class',)),
+    'flush_documents' : ('histogram', 'Documents written by a session flush',
+        ('class',)),
+    'index_ensures_total' : ('counter', 'ensure_index calls', ('collection',)),
+    'validation_failures_total' : ('counter',
+        'Documents which failed to wrap or unwrap', ('class', 'operation')),
+}
+
+
+class _Shard(object):
+    # The metrics recorded by one thread
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry(object):
+    ''' Collects the metrics.  Counters and histograms are kept per thread and
+        merged by :func:`collect`.
+    '''
+    def __init__(self, prefix='mongoalchemy_', latency_buckets=LATENCY_BUCKETS,
+            size_buckets=SIZE_BUCKETS, measure_bytes=False):
+        '''
+        :param prefix: the prefix of the metric names
+        :param latency_buckets: the upper bounds of the duration buckets
+        :param size_buckets: the upper bounds of the flush size buckets
+        :param measure_bytes: whether to BSON encode wrapped documents to \
+            count the bytes
+        '''
+        self.prefix = prefix
+        self.measure_bytes = measure_bytes
+        self.buckets = {
+            'operation_seconds' : tuple(latency_buckets),
+            'flush_documents' : tuple(size_buckets),
+        }
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__shards = []
+        self.__retired = _Shard(None)
+
+    def __shard(self):
+        try:
+            return self.__local.shard
+        except AttributeError:
+            shard = self.__local.shard = _Shard(threading.current_thread())
+            with self.__lock:
+                self.__shards.append(shard)
+            return shard
+
+    def inc(self, name, labels, amount=1):
+        ''' Add ``amount`` to the counter ``name`` with the ``labels`` tuple '''
+        counters = self.__shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        ''' Record ``value`` in the histogram ``name`` with the ``labels``
+            tuple '''
+        histograms = self.__shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        buckets = self.buckets[name]
+        if histogram is None:
+            # A count per bucket, then +Inf, then the sum
+            histogram = histograms[key] = [0] * (len(buckets) + 2)
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    # Recording
+
+    def wrapped(self, cls, value):
+        name = cls.__name__
+        self.inc('documents_wrapped_total', (name,))
+        if self.measure_bytes:
+            from bson import BSON
+            try:
+                self.inc('bytes_encoded_total', (name,), len(BSON.encode(value)))
+            except Exception:
+                pass
+
+    def unwrapped(self, cls):
+        # Called for every document loaded, so it is inlined
+        try:
+            counters = self.__local.shard.counters
+        except AttributeError:
+            counters = self.__shard().counters
+        key = ('documents_unwrapped_total', (cls.__name__,))
+        counters[key] = counters.get(key, 0) + 1
+
+    def validation_failed(self, cls, operation):
+        self.inc('validation_failures_total', (cls.__name__, operation))
+
+    def index_ensured(self, collection):
+        self.inc('index_ensures_total', (collection.name,))
+
+    def flushed(self, items):
+        counts = {}
+        for item in items:
+            name = type(item).__name__
+            counts[name] = counts.get(name, 0) + 1
+        for name, count in counts.items():
+            self.observe('flush_documents', (name,), count)
+
+    def after_operation(self, event):
+        ''' The session listener recording queries and writes '''
+        labels = (_class_name(event.type), event.operation)
+        self.inc('operations_total', labels)
+        self.observe('operation_seconds', labels, event.duration)
+        if event.count:
+            self.inc('operation_documents_total', labels, event.count)
+
+    # Reporting
+
+    def collect(self):
+        ''' Returns ``(counters, histograms)``, the metrics of all threads
+            merged into dictionaries keyed by ``(name, labels)`` '''
+        with self.__lock:
+            live = []
+            for shard in self.__shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    # Fold the metrics of finished threads together
+                    _merge(self.__retired, dict(shard.counters),
+                        dict(shard.histograms))
+            self.__shards = live
+            total = _Shard(None)
+            _merge(total, self.__retired.counters, self.__retired.histograms)
+            for shard in live:
+                _merge(total, dict(shard.counters), dict(shard.histograms))
+        return total.counters, total.histograms
+
+    def render(self):
+        ''' Returns the metrics in the Prometheus text exposition format '''
+        counters, histograms = self.collect()
+        lines = []
+        for name in sorted(METRICS):
+            kind, help, label_names = METRICS[name]
+            values = counters if kind == 'counter' else histograms
+            keys = sorted(key for key in values if key[0] == name)
+            if not keys:
+                continue
+            full_name = self.prefix + name
+            lines.append('# HELP %s %s' % (full_name, help))
+            lines.append('# TYPE %s %s' % (full_name, kind))
+            for key in keys:
+                labels = list(zip(label_names, key[1]))
+                if kind == 'counter':
+                    lines.append('%s%s %s' % (full_name, _labels(labels),
+                        _number(values[key])))
+                    continue
+                histogram = values[key]
+                cumulative = 0
+                bounds = [_number(b) for b in self.buckets[name]] + ['+Inf']
+                for bound, count in zip(bounds, histogram):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (full_name,
+                        _labels(labels + [('le', bound)]), cumulative))
+                lines.append('%s_sum%s %s' % (full_name, _labels(labels),
+                    _number(histogram[-1])))
+                lines.append('%s_count%s %d' % (full_name, _labels(labels),
+                    cumulative))
+        if not lines:
+            return ''
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        ''' Write the rendered metrics to ``path``, replacing it atomically,
+            e.g. for the node exporter's textfile collector '''
+        temp = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp, 'w') as f:
+            f.write(self.render())
+        os.replace(temp, path)
+
+    def reset(self):
+        ''' Forget all of the recorded metrics '''
+        with self.__lock:
+            for shard in self.__shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+            self.__retired = _Shard(None)
+
+
+def _class_name(type):
+    # Raw queries have a FreeFormDoc instead of a class
+    return getattr(type, '__name__', None) or type.get_collection_name()
+
+def _merge(total, counters, histograms):
+    for key, value in counters.items():
+        total.counters[key] = total.counters.get(key, 0) + value
+    for key, histogram in histograms.items():
+        current = total.histograms.get(key)
+        if current is None:
+            total.histograms[key] = list(histogram)
+        else:
+            for i, value in enumerate(histogram):
+                current[i] += value
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\')
+        .replace('"', '\\"').replace('\n', '\\n')) for name, value in labels)
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def enable(registry=None):
+    ''' Start recording metrics in ``registry`` (by default a new
+        :class:`MetricsRegistry`) and return it '''
+    from mongoalchemy.session import add_global_listener
+    global active
+    disable()
+    if registry is None:
+        registry = MetricsRegistry()
+    add_global_listener(after_query=registry.after_operation,
+        after_write=registry.after_operation)
+    active = registry
+    return registry
+
+def disable():
+    ''' Stop recording metrics '''
+    from mongoalchemy.session import remove_global_listener
+    global active
+    if active is not None:
+        remove_global_listener(after_query=active.after_operation,
+            after_write=active.after_operation)
+    active = None
@@ -6,7 +6,7 @@ Module level configuration for Mongo Alchemy
 from mongoalchemy.util import UNSET, classproperty
 
 
-__all__ = ['configure']
+__all__ = ['configure', 'invalidate']
 
 
 # This is pre-populated with our defaults
@@ -18,8 +18,16 @@ CONFIG = {
     'allow_none':False,
     'required':True,
     'counter_collection':'_counters',
+    'auto_ensure_indexes':True,
+    'compiled_codec':False,
+    'trusted_unwrap':False,
     }
 
+# Config values resolved by a ConfigProperty are cached on the object they
+# were read from together with the generation they were resolved in.
+# Incrementing the generation discards all of them.
+_generation = 0
+
 
 def configure(*args, **kwargs):
     """
@@ -33,6 +41,12 @@ def configure(*args, **kwargs):
     :param bool allow_none: whether to allow None as a value for fields
     :param bool required: whether a fields must be present on a document
     :param str counter_collection: name of the counter collection to use
+    :param bool auto_ensure_indexes: whether to ensure a document's indexes \
+            before the first database operation on its collection
+    :param bool compiled_codec: whether documents are (un)wrapped with \
+            generated per-class functions
+    :param bool trusted_unwrap: whether documents loaded from the database \
+            are unwrapped without validation
 
     """
     if len(args) > 1:
@@ -50,6 +64,23 @@ def configure(*args, **kwargs):
         raise ValueError("Got invalid option keys: %s" % invalid)
 
     CONFIG.update(options)
+    invalidate()
+
+
+def invalidate(obj=None):
+    """
+    Discards resolved configuration values, so that they are looked up again
+    the next time they are read.  :func:`configure` and setting a ``config_*``
+    attribute on a document class do this automatically.
+
+    :param obj: the field, document or class whose values should be \
+            discarded.  If ``None`` the values of every object are discarded.
+    """
+    global _generation
+    if obj is None:
+        _generation += 1
+    else:
+        obj.__dict__.pop('_resolved_config', None)
 
 
 def config_property(name):
@@ -67,29 +98,50 @@ class ConfigProperty(object):
         otherwise returns the value set on `self.parent`, if set, and if
         neither of those, returns the value stored in :data:`CONFIG`.
 
+        The resolved value is cached on the object (or, for objects without
+        their own configuration or parent, on their class) until
+        :func:`invalidate` is called.
+
     """
     def __init__(self, name):
         self.cls_name = 'config_' + name
         self.name = name
 
     def __get__(self, instance, owner):
-        cls_name = self.cls_name
+        target = owner
+        if instance is not None:
+            attrs = instance.__dict__
+            if '_config' in attrs or 'parent' in attrs:
+                target = instance
+
+        resolved = target.__dict__.get('_resolved_config')
+        if resolved is not None and resolved[0] == _generation:
+            try:
+                return resolved[1][self.name]
+            except KeyError:
+                pass
+        return self.resolve(target)
+
+    def resolve(self, target):
+        """ Looks up the value of this property for ``target`` and caches it """
         name = self.name
-        if instance:
-            self = instance
+        config = getattr(target, '_config', None)
+        if config and name in config:
+            value = config[name]
         else:
-            self = owner
-
-        if hasattr(self, '_config') and name in self._config:
-            return self._config[name]
-
-        parent = getattr(self, 'parent', None)
-        if parent:
-            val = getattr(parent, cls_name, UNSET)
-            if val != UNSET:
-                return val
-
-        return CONFIG[name]
+            value = UNSET
+            parent = getattr(target, 'parent', None)
+            if parent:
+                value = getattr(parent, self.cls_name, UNSET)
+            if value == UNSET:
+                value = CONFIG[name]
+
+        resolved = target.__dict__.get('_resolved_config')
+        if resolved is None or resolved[0] != _generation:
+            resolved = (_generation, {})
+            setattr(target, '_resolved_config', resolved)
+        resolved[1][name] = value
+        return value
 
     def __set__(self, instance, value):
         name = self.name
@@ -98,4 +150,16 @@ class ConfigProperty(object):
             if not hasattr(instance, '_config'):
                 instance._config = {}
             instance._config[name] = value
+            invalidate(instance)
+
+
+def resolve_config(obj):
+    """ Resolves every config property of ``obj`` (a field or a document
+        class) so that reading them later is a single lookup.
+    """
+    cls = obj if isinstance(obj, type) else type(obj)
+    for klass in cls.__mro__:
+        for attr, value in vars(klass).items():
+            if isinstance(value, ConfigProperty):
+                getattr(obj, attr)
 
@@ -0,0 +1,382 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+'''
+Parallel scans of large queries.  :func:`partition` splits a query into
+queries for ranges of the values of an indexed field (``_id`` by default),
+with boundaries taken from the values at evenly spaced positions of the
+results, and :func:`parallel_scan` runs the partitions at the same time,
+each in its own thread with its own :class:`~mongoalchemy.session.Session`,
+so fetching and unwrapping the results isn't limited to one cursor::
+
+    >>> for event in session.query(Event).filter(Event.day == day).parallel_scan(workers=8):
+    ...     totals[event.kind] += event.amount
+
+The field must be set, and have values of a single type, in every document
+matched by the query, otherwise some of them won't be in any partition.
+
+Unwrapping documents is CPU bound, so threads only help as far as the
+database is the bottleneck.  :func:`process_map` reads the results of a
+single cursor in the calling process and unwraps them, and applies a
+transform, in a pool of processes::
+
+    >>> for row in session.query(Order).batch_size(1000).process_map(to_row, workers=8):
+    ...     writer.writerow(row)
+
+'''
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from mongoalchemy.query_expression import BadQueryException
+from mongoalchemy.query import QueryResult, ResultPipeline, _prefetch, _END, \
+    _Failure
+from mongoalchemy.cache import _encode, _decode
+
+
+def partition(query, partitions, field=None):
+    ''' Returns up to ``partitions`` clones of ``query`` which together
+        match the same documents, each filtered on a range of ``field``.
+        Fewer queries are returned when there are fewer distinct
+        boundaries than partitions.
+
+        :param query: the :class:`~mongoalchemy.query.Query` to split.  It \
+            can't have a limit or skip
+        :param partitions: the number of queries to split it into
+        :param field: the field (or its name) to split on, which should be \
+            indexed.  The default is the ``_id`` of the document
+    '''
+    if partitions < 1:
+        raise BadQueryException('A query needs at least one partition')
+    if query.get_limit() is not None or query.get_skip() is not None:
+        raise BadQueryException("Queries with a limit or skip can't be partitioned")
+    qfield = query.type.mongo_id if field is None else query.resolve_name(field)
+    bounds = partition_bounds(query, qfield, partitions)
+    ranges = zip([None] + bounds, bounds + [None])
+    queries = []
+    for low, high in ranges:
+        part = query.clone()
+        spec = {}
+        if low is not None:
+            spec['$gte'] = low
+        if high is not None:
+            spec['$lt'] = high
+        if spec:
+            # The values come from the database, so they are not wrapped again
+            part.filter({qfield : spec})
+        queries.append(part)
+    return queries
+
+def partition_bounds(query, qfield, partitions):
+    ''' Returns the distinct values of ``qfield`` at ``partitions - 1``
+        evenly spaced positions of the results of ``query``, in order.
+        Values equal to the lowest one are left out, since nothing would
+        be below them '''
+    count = query.count()
+    name = str(qfield)
+    values = []
+    for k in range(partitions):
+        sample = query.clone().raw_output()
+        sample.sort = []
+        sample.ascending(qfield).skip(count * k // partitions).limit(1).fields(qfield)
+        for document in sample:
+            value = _lookup(document, name)
+            if not values or values[-1] != value:
+                values.append(value)
+    return values[1:]
+
+def _lookup(document, name):
+    for part in name.split('.'):
+        document = document[part]
+    return document
+
+def _worker_session(session):
+    # Sessions aren't thread safe, so each partition gets its own
+    from mongoalchemy.session import Session
+    return Session(session.db, safe=session.safe, autoflush=session.autoflush,
+        identity_map=session.identity_map is not None, cache=session.cache)
+
+def parallel_scan(query, workers=4, field=None, callback=None, depth=2):
+    ''' Run ``query`` as ``workers`` partitions (see :func:`partition`) at
+        the same time.  Without ``callback`` a :class:`ParallelScanResult`
+        of all of the results is returned.  With ``callback``, it is called
+        with the result of each partition in that partition's thread and a
+        list of its return values, in partition order, is returned.  An
+        exception raised by ``callback`` is raised once all of the
+        partitions have finished.
+
+        :param query: the :class:`~mongoalchemy.query.Query` to run
+        :param workers: the number of partitions and threads
+        :param field: the field to partition on (``_id`` by default)
+        :param callback: the function to pass each partition's results to
+        :param depth: the number of batches each thread reads ahead of a \
+            :class:`ParallelScanResult`
+    '''
+    query.session.flush()
+    queries = partition(query, workers, field=field)
+    for part in queries:
+        part.session = _worker_session(query.session)
+        part._prefetch = None
+    if callback is None:
+        return ParallelScanResult(queries, depth)
+    with ThreadPoolExecutor(max_workers=len(queries),
+            thread_name_prefix='mongoalchemy-scan') as executor:
+        futures = [executor.submit(_run_callback, part, callback) for part in queries]
+    return [future.result() for future in futures]
+
+def _run_callback(query, callback):
+    try:
+        result = iter(query)
+        try:
+            return callback(result)
+        finally:
+            result.close()
+    finally:
+        query.session.end()
+
+def _scan(query, batches, stop):
+    # The thread of one partition of a ParallelScanResult
+    try:
+        result = iter(query)
+    except Exception as e:
+        batches.put(_Failure(e))
+        return
+    try:
+        _prefetch(result, batches, stop)
+    finally:
+        result.close()
+        query.session.end()
+
+
+class ParallelScanResult(object):
+    ''' The merged results of the partitions of a :func:`parallel_scan`.
+        When it is first read a thread starts for each partition, reading
+        its batches into a shared queue which holds ``depth`` batches per
+        partition.  Results come in the order the batches are read, so the
+        results of different partitions are interleaved and a sort only
+        applies within a partition.  An error in a partition stops the
+        other threads and is raised by the read which reaches it.
+
+        Closing the result (or leaving a ``with`` block, or dropping the
+        result) stops the threads after the batches they are reading.
+    '''
+    def __init__(self, queries, depth=2):
+        self.queries = queries
+        self.depth = depth
+        self.__batches = queue.Queue(depth * len(queries))
+        self.__stop = threading.Event()
+        self.__threads = None
+        self.__running = 0
+        self.__current = deque()
+        self.__finished = False
+
+    def __start(self):
+        self.__threads = []
+        for i, part in enumerate(self.queries):
+            thread = threading.Thread(target=_scan,
+                args=(part, self.__batches, self.__stop),
+                name='mongoalchemy-scan-%d' % i)
+            thread.daemon = True
+            self.__threads.append(thread)
+        self.__running = len(self.__threads)
+        for thread in self.__threads:
+            thread.start()
+
+    def __next_batch(self):
+        while not self.__finished:
+            if self.__threads is None:
+                self.__start()
+            batch = self.__batches.get()
+            if isinstance(batch, _Failure):
+                self.close()
+                raise batch.error
+            if batch is _END:
+                self.__running -= 1
+                if self.__running == 0:
+                    self.__finished = True
+                    self.__join()
+                continue
+            if batch:
+                return batch
+        return None
+
+    def __join(self):
+        for thread in self.__threads:
+            thread.join()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.__current:
+            batch = self.__next_batch()
+            if not batch:
+                raise StopIteration
+            self.__current.extend(batch)
+        return self.__current.popleft()
+
+    def iter_batches(self):
+        ''' Returns a :class:`~mongoalchemy.query.ResultPipeline` of the
+            batches as they were read by the threads.  Each batch comes
+            from a single partition '''
+        return ResultPipeline(self.__batch_iterator())
+
+    def __batch_iterator(self):
+        if self.__current:
+            batch, self.__current = list(self.__current), deque()
+            yield batch
+        while True:
+            batch = self.__next_batch()
+            if not batch:
+                return
+            yield batch
+
+    def map(self, fun):
+        ''' Refer to: :func:`~mongoalchemy.query.ResultPipeline.map` '''
+        return ResultPipeline(self).map(fun)
+
+    def filter(self, fun):
+        ''' Refer to: :func:`~mongoalchemy.query.ResultPipeline.filter` '''
+        return ResultPipeline(self).filter(fun)
+
+    def chunk(self, size):
+        ''' Refer to: :func:`~mongoalchemy.query.ResultPipeline.chunk` '''
+        return ResultPipeline(self).chunk(size)
+
+    def close(self):
+        ''' Stop the threads and wait for them to finish '''
+        if self.__threads is None or self.__finished:
+            self.__finished = True
+            return
+        self.__finished = True
+        self.__stop.set()
+        # Make room for the batches the threads may be blocked on
+        while any(thread.is_alive() for thread in self.__threads):
+            try:
+                self.__batches.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        self.__join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def process_map(result, transform=None, workers=None, window=None,
+        size=None, executor=None):
+    ''' Unwrap the results of ``result`` and apply ``transform`` to them in
+        a pool of processes.  Returns a
+        :class:`~mongoalchemy.query.ResultPipeline` of the transformed
+        values, in the order of the results.
+
+        The raw documents are read from the cursor in this process, in the
+        batches of :func:`~mongoalchemy.query.QueryResult.iter_batches`,
+        and each batch is sent to a worker as BSON.  The BSON of the
+        results of a :func:`~mongoalchemy.query.Query.raw_bson` query (as
+        used by :func:`~mongoalchemy.query.Query.process_map`) is sent as
+        it is, so if the driver returns undecoded documents this process
+        doesn't decode or encode them.  At most ``window``
+        batches are sent ahead of the one being returned, so a slow
+        consumer doesn't cause the results to pile up in memory.  The
+        document class, ``transform`` and the values it returns must be
+        picklable, so they should be defined at the top level of a module.
+        Documents unwrapped by the workers are not added to the session's
+        identity map, and rows of a ``values_only`` query are returned as
+        plain tuples when there is no ``transform``.
+
+        :param result: the :class:`~mongoalchemy.query.QueryResult` to \
+            process.  It is read to the end and can't be used otherwise
+        :param transform: a function applied to each unwrapped result in \
+            the worker.  ``None`` returns the results themselves
+        :param workers: the number of processes of the pool, by default \
+            the number of CPUs.  Not used with ``executor``
+        :param window: the number of batches sent to the workers and not \
+            returned yet, by default twice ``workers`` (or the number of CPUs)
+        :param size: the number of results per batch, as in \
+            :func:`~mongoalchemy.query.QueryResult.iter_batches`
+        :param executor: a ``concurrent.futures`` executor to use instead of \
+            a new ``ProcessPoolExecutor``.  It is not shut down
+    '''
+    if window is None:
+        window = 2 * (workers or os.cpu_count() or 1)
+    if window < 1:
+        raise ValueError('The window must hold at least one batch')
+    return ResultPipeline(_process_map(result, transform, workers, window,
+        size, executor))
+
+def _process_map(result, transform, workers, window, size, executor):
+    settings = (result.type, result.raw_output, result.fields,
+        result.field_order, result.values_only, result.trusted, transform)
+    # The workers do the unwrapping, so the result (and any listeners or
+    # profile of it) only sees the documents
+    result.raw_output = True
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for batch in result.iter_batches(size):
+            # The BSON of RawDocuments is used as it is
+            pending.append(executor.submit(_unwrap_batch, settings,
+                [_encode(document) or document for document in batch]))
+            while len(pending) >= window:
+                for value in pending.popleft().result():
+                    yield value
+        while pending:
+            for value in pending.popleft().result():
+                yield value
+    finally:
+        for future in pending:
+            future.cancel()
+        result.close()
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def _unwrap_batch(settings, documents):
+    # Runs in a worker process
+    (type, raw_output, fields, field_order, values_only, trusted,
+        transform) = settings
+    documents = [_decode(document) if isinstance(document, bytes) else document
+        for document in documents]
+    result = QueryResult(iter(documents), type, raw_output=raw_output,
+        fields=fields, field_order=field_order, values_only=values_only,
+        trusted=trusted)
+    values = []
+    for value in result:
+        if transform is not None:
+            value = transform(value)
+        elif values_only:
+            # The named tuple class only exists in this process
+            value = tuple(value)
+        values.append(value)
+    return values
@@ -0,0 +1,242 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Pooled sessions for multi-threaded applications, like WSGI servers.
+
+    :func:`scoped_session` creates a :class:`ScopedSession`, which gives each
+    thread its own :class:`~mongoalchemy.session.Session`.  The sessions are
+    taken from a bounded :class:`SessionPool` and share one connection, so an
+    application uses at most ``pool_size`` sessions (and sockets) however many
+    requests it is serving::
+
+        DBSession = scoped_session('mydb', pool_size=10, host='db1')
+
+        def handle(request):
+            with DBSession as s:
+                return s.query(User).filter(User.name == request.user).one()
+
+    Leaving the ``with`` block (or calling :func:`ScopedSession.remove`) ends
+    the session and puts it back in the pool.  A session which is never
+    removed stays checked out.
+'''
+
+import threading
+import time
+from collections import namedtuple
+from mongoalchemy.session import Session, get_connection
+from mongoalchemy.exceptions import SessionPoolTimeout
+
+#: A snapshot of the state of a :class:`SessionPool`.  ``in_use`` sessions are
+#: checked out, ``idle`` ones are waiting in the pool, ``waiting`` threads are
+#: blocked in :func:`SessionPool.checkout`.  ``waits`` is the number of
+#: checkouts which had to wait, ``wait_time`` and ``max_wait_time`` are the
+#: total and longest time they waited, in seconds.
+PoolStats = namedtuple('PoolStats', ('size', 'in_use', 'idle', 'waiting',
+    'checkouts', 'waits', 'wait_time', 'max_wait_time'))
+
+
+class SessionPool(object):
+    ''' A bounded pool of sessions.  At most ``size`` sessions are created
+        (lazily, with ``factory``); :func:`checkout` blocks until one is free.
+    '''
+    def __init__(self, factory, size=10, timeout=None):
+        '''
+        :param factory: a function returning a new :class:`~mongoalchemy.session.Session`
+        :param size: the maximum number of sessions
+        :param timeout: how long :func:`checkout` waits for a session, in \
+            seconds, before raising :class:`~mongoalchemy.exceptions.SessionPoolTimeout`. \
+            ``None`` waits forever.
+        '''
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.__condition = threading.Condition()
+        self.__idle = []
+        self.__created = 0
+        self.__in_use = 0
+        self.__waiting = 0
+        self.__checkouts = 0
+        self.__waits = 0
+        self.__wait_time = 0.0
+        self.__max_wait_time = 0.0
+
+    def checkout(self):
+        ''' Take a session from the pool, creating one if none is idle and
+            there are less than ``size`` '''
+        with self.__condition:
+            if not self.__idle and self.__created >= self.size:
+                self.__wait()
+            self.__in_use += 1
+            self.__checkouts += 1
+            if self.__idle:
+                return self.__idle.pop()
+            self.__created += 1
+        try:
+            return self.factory()
+        except:
+            with self.__condition:
+                self.__created -= 1
+                self.__in_use -= 1
+                self.__condition.notify()
+            raise
+
+    def __wait(self):
+        start = time.time()
+        deadline = None if self.timeout is None else start + self.timeout
+        self.__waiting += 1
+        try:
+            while not self.__idle and self.__created >= self.size:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise SessionPoolTimeout('No session available after %ss' % self.timeout)
+                self.__condition.wait(remaining)
+        finally:
+            self.__waiting -= 1
+            waited = time.time() - start
+            self.__waits += 1
+            self.__wait_time += waited
+            self.__max_wait_time = max(self.__max_wait_time, waited)
+
+    def checkin(self, session):
+        ''' End ``session`` (flushing it and ending its request) and return
+            it to the pool '''
+        try:
+            session.end()
+        finally:
+            with self.__condition:
+                self.__idle.append(session)
+                self.__in_use -= 1
+                self.__condition.notify()
+
+    def stats(self):
+        ''' Returns the current :data:`PoolStats` '''
+        with self.__condition:
+            return PoolStats(self.size, self.__in_use, len(self.__idle),
+                self.__waiting, self.__checkouts, self.__waits,
+                self.__wait_time, self.__max_wait_time)
+
+
+class ScopedSession(object):
+    ''' Hands each scope (by default, each thread) its own session from a
+        :class:`SessionPool`.  Calling the scoped session returns the current
+        scope's session, checking one out the first time.  Other attributes
+        are looked up on the current session, so ``DBSession.query(User)``
+        works as well as ``DBSession().query(User)``.
+    '''
+    def __init__(self, pool, scopefunc=None):
+        '''
+        :param pool: the :class:`SessionPool` to take sessions from
+        :param scopefunc: a function returning a hashable key for the \
+            current scope, e.g. ``asyncio.current_task``.  By default \
+            sessions are thread-local.
+        '''
+        self.pool = pool
+        self.scopefunc = scopefunc
+        self.__local = threading.local()
+        self.__scoped = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self):
+        session = self.__get()
+        if session is None:
+            session = self.pool.checkout()
+            self.__set(session)
+        return session
+
+    def has_session(self):
+        ''' Whether the current scope has a session checked out '''
+        return self.__get() is not None
+
+    def remove(self):
+        ''' End the current scope's session, if it has one, and return it to
+            the pool '''
+        session = self.__pop()
+        if session is not None:
+            self.pool.checkin(session)
+
+    def stats(self):
+        ''' Returns the :data:`PoolStats` of the pool '''
+        return self.pool.stats()
+
+    def __get(self):
+        if self.scopefunc is None:
+            return getattr(self.__local, 'session', None)
+        with self.__lock:
+            return self.__scoped.get(self.scopefunc())
+
+    def __set(self, session):
+        if self.scopefunc is None:
+            self.__local.session = session
+        else:
+            with self.__lock:
+                self.__scoped[self.scopefunc()] = session
+
+    def __pop(self):
+        if self.scopefunc is None:
+            session = getattr(self.__local, 'session', None)
+            self.__local.session = None
+            return session
+        with self.__lock:
+            return self.__scoped.pop(self.scopefunc(), None)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self(), name)
+
+    def __enter__(self):
+        return self()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.remove()
+        return False
+
+
+def scoped_session(database, pool_size=10, timeout=None, scopefunc=None,
+        *args, **kwds):
+    ''' Create a :class:`ScopedSession` with a pool of at most ``pool_size``
+        sessions.
+
+        :param database: the database name.  The connection comes from \
+            :func:`~mongoalchemy.session.get_connection`, with \
+            ``max_pool_size`` defaulting to ``pool_size``.  May also be a \
+            pymongo database or a :class:`~mongoalchemy.backend.Backend`, \
+            which is then used by all of the sessions
+        :param pool_size: the maximum number of sessions
+        :param timeout: how long to wait for a session, see :class:`SessionPool`
+        :param scopefunc: the scope of a session, see :class:`ScopedSession`
+        :param args: arguments for :class:`pymongo.connection.Connection`
+        :param kwds: keyword arguments for :class:`pymongo.connection.Connection`. \
+            ``safe``, ``autoflush``, ``insert_batch_size`` and \
+            ``identity_map`` are removed and passed to the Session init \
+            function instead
+    '''
+    session_kwds = {}
+    for key in ('safe', 'autoflush', 'insert_batch_size', 'identity_map'):
+        if key in kwds:
+            session_kwds[key] = kwds.pop(key)
+    if isinstance(database, str):
+        kwds.setdefault('max_pool_size', pool_size)
+        database = get_connection(*args, **kwds)[database]
+    pool = SessionPool(lambda: Session(database, **session_kwds),
+        size=pool_size, timeout=timeout)
+    return ScopedSession(pool, scopefunc=scopefunc)
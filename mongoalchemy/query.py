@@ -20,15 +20,38 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import queue
+import threading
 from functools import wraps
-from collections import namedtuple
+from collections import namedtuple, deque
 from pymongo import ASCENDING, DESCENDING
 from copy import copy, deepcopy
+from time import perf_counter
 
-from mongoalchemy.query_expression import QueryExpression, BadQueryException, flatten
+from mongoalchemy.query_expression import QueryExpression, BadQueryException, \
+        BoundValue, flatten, RE_TYPE
 from mongoalchemy.update_expression import UpdateExpression, FindAndModifyExpression
 from mongoalchemy.exceptions import NoResultFound, MultipleResultsFound, \
         BadValueException, BadResultException
+from mongoalchemy.fields import trusted_unwrap
+from mongoalchemy.util import run_in_executor
+
+
+def _compile_step(fun):
+    # Adds the time spent in fun to the compile time of profiled queries.
+    # Steps called by other steps are not timed again
+    @wraps(fun)
+    def timed(self, *args, **kwargs):
+        if self._compiling or not self.is_profiled():
+            return fun(self, *args, **kwargs)
+        self._compiling = True
+        start = perf_counter()
+        try:
+            return fun(self, *args, **kwargs)
+        finally:
+            self._compiling = False
+            self._compile_time += perf_counter() - start
+    return timed
 
 
 class Query(object):
@@ -53,11 +76,35 @@ class Query(object):
         self.hints = []
         self._limit = None
         self._skip = None
+        self._batch_size = None
+        self._prefetch = None
         self._raw_output = False
+        self._trusted = None
+        self._lazy = False
+        self._raw_bson = False
+        self._profiled = None
+        self._cached = True
+        self._compile_time = 0.0
+        self._compiling = False
 
     def __iter__(self):
-        return self.__get_query_result()
+        result = self.__get_query_result()
+        if self._prefetch:
+            return PrefetchingResult(result, self._prefetch)
+        return result
+
+    def __aiter__(self):
+        return self.__async_results()
 
+    async def __async_results(self):
+        # Running the query may flush the session and ensure indexes, so it
+        # is done in the session's executor like the fetches
+        result = await run_in_executor(getattr(self.session, 'executor', None),
+            self.__get_query_result)
+        async for value in result:
+            yield value
+
+    @_compile_step
     def resolve_name(self, name):
         if not isinstance(name, str) or name[0] == '$':
             return name
@@ -77,6 +124,80 @@ class Query(object):
         self._raw_output = True
         return self
 
+    def trusted(self, trusted=True):
+        ''' Unwrap the results of this query without validating them (or,
+            with ``trusted=False``, always validate them), overriding the
+            ``config_trusted_unwrap`` option of the document class.
+
+            :param trusted: Whether the results are trusted
+        '''
+        self._trusted = trusted
+        return self
+
+    def get_trusted(self):
+        return self._trusted
+
+    def lazy(self, lazy=True):
+        ''' Unwrap the fields of the resulting documents only when they are
+            first read, so that fields which are never used cost nothing.
+            Validation errors are raised when a bad field is read.  See
+            the ``lazy`` argument of :func:`~mongoalchemy.document.Document.unwrap`.
+
+            :param lazy: Whether to load the results lazily
+        '''
+        self._lazy = lazy
+        return self
+
+    def is_lazy(self):
+        return self._lazy
+
+    def raw_bson(self, raw=True):
+        ''' Get the results as undecoded BSON.  With ``raw_output`` the
+            results are :class:`~mongoalchemy.raw.RawDocument` mappings,
+            which decode each value as it is read.  Documents are unwrapped
+            lazily from them (see :func:`lazy`) and, while unmodified, are
+            saved by sending their original bytes.  The query and document
+            caches are not used.
+
+            :param raw: Whether to get undecoded results
+        '''
+        self._raw_bson = raw
+        return self
+
+    def is_raw_bson(self):
+        return self._raw_bson
+
+    def profile(self, profiled=True):
+        ''' Time the stages of this query.  The :class:`QueryResult` gets a
+            :class:`QueryProfile` as its ``profile``, which is added to the
+            session's ``profile`` once the results have been read to the end.
+            Overrides the session's ``profile_queries`` option.
+
+            :param profiled: Whether to profile the query
+        '''
+        self._profiled = profiled
+        return self
+
+    def is_profiled(self):
+        ''' Whether this query is profiled '''
+        if self._profiled is not None:
+            return self._profiled
+        return getattr(self.session, 'profile_queries', False)
+
+    def cached(self, cached=True):
+        ''' Whether the results of this query can come from (and are stored
+            in) the session's :class:`~mongoalchemy.cache.QueryCache`, if it
+            has one.  Queries are cached by default.
+
+            :param cached: Whether to use the cache
+        '''
+        self._cached = cached
+        return self
+
+    def is_cached(self):
+        ''' Whether this query uses the session's cache '''
+        return self._cached
+
     def get_fields(self):
         return self._fields
 
@@ -86,6 +207,9 @@ class Query(object):
     def get_skip(self):
         return self._skip
 
+    def get_batch_size(self):
+        return self._batch_size
+
     def limit(self, limit):
         ''' Sets the limit on the number of documents returned
 
@@ -102,6 +226,75 @@ class Query(object):
         self._skip = skip
         return self
 
+    def prefetch(self, depth=2):
+        ''' Fetch and unwrap the results in a background thread while they
+            are being used, keeping up to ``depth`` batches ready.  Iterating
+            the query returns a :class:`PrefetchingResult`.
+
+            :param depth: the number of batches to fetch ahead, or ``None`` \
+                to stop prefetching
+        '''
+        self._prefetch = depth
+        return self
+
+    def get_prefetch(self):
+        return self._prefetch
+
+    def partition(self, partitions, field=None):
+        ''' Split the query into up to ``partitions`` queries for ranges of
+            ``field``.  Refer to: :func:`mongoalchemy.parallel.partition`
+        '''
+        from mongoalchemy.parallel import partition
+        return partition(self, partitions, field=field)
+
+    def parallel_scan(self, workers=4, field=None, callback=None, depth=2):
+        ''' Run the query as ``workers`` partitions at the same time, each
+            in its own thread.  Returns a
+            :class:`~mongoalchemy.parallel.ParallelScanResult` of all of the
+            results, or with ``callback`` a list of the values it returned
+            for the result of each partition.  Refer to:
+            :func:`mongoalchemy.parallel.parallel_scan`
+        '''
+        from mongoalchemy.parallel import parallel_scan
+        return parallel_scan(self, workers=workers, field=field,
+            callback=callback, depth=depth)
+
+    def process_map(self, transform=None, workers=None, window=None,
+            size=None, executor=None):
+        ''' Unwrap the results and apply ``transform`` to them in a pool of
+            processes, returning the values in order.  The results are read
+            as undecoded BSON (see :func:`raw_bson`) and sent to the
+            processes as they are.  Refer to:
+            :func:`mongoalchemy.parallel.process_map`
+        '''
+        results = iter(self.clone().raw_bson())
+        return results.process_map(transform=transform, workers=workers,
+            window=window, size=size, executor=executor)
+
+    def batch_size(self, batch_size):
+        ''' Sets the number of documents the server returns in each batch.
+            See :func:`QueryResult.iter_batches`.
+
+            :param batch_size: the number of documents per batch
+        '''
+        self._batch_size = batch_size
+        return self
+
+    def compile(self):
+        ''' Compile this query into a :class:`QueryTemplate`.  The values
+            of the query document given as :func:`~mongoalchemy.query_expression.bind`
+            placeholders are supplied each time the template is executed::
+
+                adults = session.query(User).filter(User.age > bind('age')).compile()
+                for user in adults.execute(age=21):
+                    ...
+
+            Resolving names, building and flattening the query document are
+            done once here; executing the template only wraps the bound
+            values.
+        '''
+        return QueryTemplate(self)
+
     def clone(self):
         ''' Creates a clone of the current query and all settings.  Further
             updates to the cloned object or the original object will not
@@ -113,10 +306,17 @@ class Query(object):
         qclone._fields = deepcopy(self._fields)
         qclone._field_order = copy(self._field_order)
         qclone._values_only = deepcopy(self._values_only)
-        qclone._hints = deepcopy(self.hints)
+        qclone.hints = deepcopy(self.hints)
         qclone._limit = deepcopy(self._limit)
         qclone._skip = deepcopy(self._skip)
+        qclone._batch_size = self._batch_size
+        qclone._prefetch = self._prefetch
         qclone._raw_output = deepcopy(self._raw_output)
+        qclone._trusted = self._trusted
+        qclone._lazy = self._lazy
+        qclone._raw_bson = self._raw_bson
+        qclone._profiled = self._profiled
+        qclone._cached = self._cached
         return qclone
 
     def one(self):
@@ -124,10 +324,14 @@ class Query(object):
             is returned, raises either ``MultipleResultsFound`` or
             ``NoResultFound`` as appropriate.
         '''
-        count = -1
-        for count, result in enumerate(self):
-            if count > 0:
-                raise MultipleResultsFound('Too many results for .one()')
+        results = iter(self)
+        try:
+            count = -1
+            for count, result in enumerate(results):
+                if count > 0:
+                    raise MultipleResultsFound('Too many results for .one()')
+        finally:
+            results.close()
         if count == -1:
             raise NoResultFound('Too few results for .one()')
         return result
@@ -137,12 +341,20 @@ class Query(object):
             there are multiple documents it simply returns the first one.  If
             there are no documents, first returns ``None``
         '''
-        for doc in iter(self):
-            return doc
-        return None
+        results = iter(self)
+        try:
+            for doc in results:
+                return doc
+            return None
+        finally:
+            results.close()
 
     def __getitem__(self, index):
-        return self.__get_query_result().__getitem__(index)
+        result = self.__get_query_result()
+        try:
+            return result.__getitem__(index)
+        finally:
+            result.close()
 
     def hint_asc(self, qfield):
         ''' Applies a hint for the query that it should use a
@@ -173,7 +385,11 @@ class Query(object):
         ''' Executes an explain operation on the database for the current
             query and returns the raw explain object returned.
         '''
-        return self.__get_query_result().cursor.explain()
+        result = self.__get_query_result()
+        try:
+            return result.cursor.explain()
+        finally:
+            result.close()
 
     def all(self):
         ''' Return all of the results of a query in a list'''
@@ -185,8 +401,13 @@ class Query(object):
 
             :param key: the instance of :class:`mongoalchemy.QueryField` to use as the distinct key.
         '''
-        return self.__get_query_result().cursor.distinct(str(key))
+        result = self.__get_query_result()
+        try:
+            return result.cursor.distinct(str(key))
+        finally:
+            result.close()
 
+    @_compile_step
     def filter(self, *query_expressions):
         ''' Apply the given query expressions to this query object
 
@@ -215,7 +436,11 @@ class Query(object):
 
             :param with_limit_and_skip: Include ``.limit()`` and ``.skip()`` arguments in the count?
         '''
-        return self.__get_query_result().cursor.count(with_limit_and_skip=with_limit_and_skip)
+        result = self.__get_query_result()
+        try:
+            return result.cursor.count(with_limit_and_skip=with_limit_and_skip)
+        finally:
+            result.close()
 
     def fields(self, *fields, **kwargs):
         ''' Only return the specified fields from the object.  Accessing a \
@@ -392,17 +617,218 @@ class Query(object):
         return UpdateExpression(self).pop_last(qfield)
 
 
+def _compile_document(value):
+    # Returns (static, value): value itself if it has no bound parameters,
+    # otherwise a function of the parameters which builds it.  Only the
+    # parts containing bound parameters are rebuilt when it is called
+    if isinstance(value, BoundValue):
+        return False, value.resolve
+    if isinstance(value, dict):
+        items = [(k,) + _compile_document(v) for k, v in value.items()]
+        if all(static for _, static, _ in items):
+            return True, value
+        def build_dict(params):
+            return dict((k, v if static else v(params)) for k, static, v in items)
+        return False, build_dict
+    if isinstance(value, list):
+        items = [_compile_document(v) for v in value]
+        if all(static for static, _ in items):
+            return True, value
+        def build_list(params):
+            return [v if static else v(params) for static, v in items]
+        return False, build_list
+    return True, value
+
+def _parameters(value):
+    # The names of the bound parameters in a query document
+    if isinstance(value, BoundValue):
+        return set([value.name])
+    names = set()
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        for v in value:
+            names.update(_parameters(v))
+    return names
+
+def _canonical(value):
+    # A hashable form of a query document, with placeholders for the bound
+    # parameters.  Scalars keep their type so that, e.g., 1 and True differ
+    if isinstance(value, BoundValue):
+        return ('?', value.name)
+    if isinstance(value, dict):
+        return ('{}',) + tuple((k, _canonical(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return ('[]',) + tuple(_canonical(v) for v in value)
+    if isinstance(value, RE_TYPE):
+        return ('re', value.pattern, value.flags)
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value).__name__, repr(value))
+    return (type(value).__name__, value)
+
+
+class QueryTemplate(object):
+    ''' A compiled query, created with :func:`Query.compile`.  Executing it
+        with values for its parameters runs the query with those values in
+        place of the :func:`~mongoalchemy.query_expression.bind` placeholders.
+
+        **Fields**:
+            * **type**: The document class being queried
+            * **session**: The session the template's queries are run in
+            * **parameters**: The names of the template's parameters
+            * **key**: A hashable key for the shape of the query, the same \
+                for all templates compiled from the same query
+    '''
+    def __init__(self, query):
+        ''' :param query: The :class:`Query` to compile '''
+        self.type = query.type
+        self.session = query.session
+        document = query.query
+        self.parameters = frozenset(_parameters(document))
+        self.__static, self.__document = _compile_document(document)
+        settings = dict(query.__dict__)
+        del settings['_Query__query']
+        del settings['session']
+        settings['_compile_time'] = 0.0
+        settings['_compiling'] = False
+        _copy_settings(settings)
+        self.__settings = settings
+        fields = query.get_fields()
+        self.key = (self.type.__module__, self.type.__name__,
+            self.type.get_collection_name(), _canonical(document),
+            tuple(query.sort), tuple(query.hints),
+            tuple(sorted(str(f) for f in fields)) if fields is not None else None,
+            tuple(str(f) for f in query._field_order), query._values_only,
+            query.get_limit(), query.get_skip(), query._raw_output,
+            query._trusted)
+
+    def with_session(self, session):
+        ''' A copy of this template which runs its queries in ``session``.
+            Templates can be compiled once and used in many sessions this way.
+
+            :param session: The :class:`~mongoalchemy.session.Session` to use
+        '''
+        template = copy(self)
+        template.session = session
+        return template
+
+    def bind(self, **params):
+        ''' A :class:`BoundQuery` with ``params`` as the values of the
+            template's parameters.  Raises ``BadQueryException`` if a
+            parameter is missing or unknown.
+
+            :param params: The values of the parameters, by name
+        '''
+        if not self.parameters.issuperset(params):
+            unknown = sorted(set(params) - self.parameters)
+            raise BadQueryException('Unknown parameters: %s' % ', '.join(unknown))
+        query = BoundQuery(self, self.session, self.__settings, params)
+        if query.is_profiled():
+            start = perf_counter()
+            query._document = self.__build(params)
+            query._compile_time = perf_counter() - start
+        else:
+            query._document = self.__build(params)
+        return query
+
+    def execute(self, **params):
+        ''' Run the query with ``params`` as the values of the template's
+            parameters and return its :class:`QueryResult`.
+
+            :param params: The values of the parameters, by name
+        '''
+        return iter(self.bind(**params))
+
+    def __build(self, params):
+        if self.__static:
+            return self.__document
+        return self.__document(params)
+
+    def __repr__(self):
+        return 'QueryTemplate(%s, %s)' % (self.type.__name__,
+            ', '.join(sorted(self.parameters)))
+
+
+def _copy_settings(settings):
+    # Copies the settings of a query which are changed in place
+    settings['sort'] = list(settings['sort'])
+    settings['hints'] = list(settings['hints'])
+    settings['_field_order'] = list(settings['_field_order'])
+    if settings['_fields'] is not None:
+        settings['_fields'] = set(settings['_fields'])
+
+
+class BoundQuery(Query):
+    ''' A query created by :func:`QueryTemplate.bind`.  It can be sorted,
+        limited, used for updates and so on like any other query, but its
+        query document can't be changed.
+
+        **Fields**:
+            * **template**: The :class:`QueryTemplate` it was bound from
+            * **params**: The values of the template's parameters
+    '''
+    def __init__(self, template, session, settings, params):
+        self.__dict__.update(settings)
+        _copy_settings(self.__dict__)
+        self.session = session
+        self.template = template
+        self.params = params
+        self._document = None
+
+    @property
+    def query(self):
+        return self._document
+
+    def _apply_dict(self, qe_dict):
+        raise BadQueryException('The query document of a bound query can\'t be changed')
+
+    def clone(self):
+        qclone = copy(self)
+        _copy_settings(qclone.__dict__)
+        return qclone
+
+
 class QueryResult(object):
+    #: The number of results fetched from the cursor (and unwrapped) in the
+    #: executor at a time by ``async for``
+    async_batch_size = 100
+
     def __init__(self, cursor, type, raw_output=False, fields=None,
-            field_order=tuple(), values_only=False):
+            field_order=tuple(), values_only=False, identity_map=None,
+            trusted=None, executor=None, lazy=False, batch_size=None):
         self.cursor = cursor
         self.type = type
         self.fields = fields
         self.field_order = field_order
         self.raw_output = raw_output
         self.values_only = values_only
+        self.identity_map = identity_map
+        self.trusted = trusted
+        self.executor = executor
+        self.lazy = lazy
+        self.batch_size = batch_size
+        self.__buffer = deque()
+        self.__error = None
+
+    def _unwrap(self, value, fields=None):
+        if self.identity_map is not None:
+            return self.identity_map.unwrap(self.type, value, fields=fields,
+                trusted=self.trusted, lazy=self.lazy)
+        return self.type.unwrap(value, fields=fields, trusted=self.trusted,
+            lazy=self.lazy)
 
     def _as_tuple(self, value):
+        trusted = self.trusted
+        if trusted is None:
+            trusted = self.type.config_trusted_unwrap
+        if trusted:
+            with trusted_unwrap():
+                return self.__make_tuple(value)
+        return self.__make_tuple(value)
+
+    def __make_tuple(self, value):
         return namedtuple(self.type.__name__, (field._name \
                 for field in self.field_order)) \
                 ._make(getattr(self.type, field._name) \
@@ -415,7 +841,7 @@ class QueryResult(object):
             if self.values_only:
                 value = self._as_tuple(value)
             else:
-                value = self.type.unwrap(value, fields=self.fields)
+                value = self._unwrap(value, fields=self.fields)
         return value
 
     def __getitem__(self, index):
@@ -424,20 +850,441 @@ class QueryResult(object):
             if self.values_only:
                 value = self._as_tuple(value)
             else:
-                value = self.type.unwrap(value)
+                value = self._unwrap(value)
         return value
 
     def rewind(self):
         return self.cursor.rewind()
 
+    def close(self):
+        ''' Stop reading the results.  Results which report to their session
+            (see :class:`~mongoalchemy.session.ObservedQueryResult`) do so
+            when they are read to the end or closed.  The query methods which
+            read part of the results, or none (``first``, ``count``, etc.),
+            close them.'''
+        pass
+
     def clone(self):
         return QueryResult(self.cursor.clone(), self.type,
             raw_output=self.raw_output, fields=self.fields,
-            field_order=self.field_order, values_only=self.values_only)
+            field_order=self.field_order, values_only=self.values_only,
+            identity_map=self.identity_map, trusted=self.trusted,
+            executor=self.executor, lazy=self.lazy, batch_size=self.batch_size)
 
     def __iter__(self):
         return self
 
+    def iter_batches(self, size=None):
+        ''' Returns a :class:`ResultPipeline` of lists of the (unwrapped)
+            results.  Without ``size`` the lists have the query's
+            :func:`Query.batch_size` results, so that each holds one batch
+            from the server when the results are read from the start, or
+            ``async_batch_size`` results if no batch size was set.  Only the
+            current list is kept in memory.
+
+            :param size: the number of results per list
+        '''
+        if size is None:
+            size = self.batch_size or self.async_batch_size
+        return ResultPipeline(self.__batches(size))
+
+    def __batches(self, size):
+        batch = []
+        try:
+            for value in self:
+                batch.append(value)
+                if len(batch) == size:
+                    yield batch
+                    batch = []
+        except Exception:
+            # The results read before the error come first
+            if batch:
+                yield batch
+            raise
+        if batch:
+            yield batch
+
+    def map(self, fun):
+        ''' Refer to: :func:`ResultPipeline.map` '''
+        return ResultPipeline(self).map(fun)
+
+    def filter(self, fun):
+        ''' Refer to: :func:`ResultPipeline.filter` '''
+        return ResultPipeline(self).filter(fun)
+
+    def chunk(self, size):
+        ''' Refer to: :func:`ResultPipeline.chunk` '''
+        return ResultPipeline(self).chunk(size)
+
+    def process_map(self, transform=None, workers=None, window=None,
+            size=None, executor=None):
+        ''' Unwrap the results and apply ``transform`` to them in a pool of
+            processes, returning the values in order.  Refer to:
+            :func:`mongoalchemy.parallel.process_map`
+        '''
+        from mongoalchemy.parallel import process_map
+        return process_map(self, transform=transform, workers=workers,
+            window=window, size=size, executor=executor)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        ''' Returns the next result.  Results are fetched and unwrapped
+            ``async_batch_size`` at a time in ``executor`` so that the event
+            loop is not blocked by the cursor'''
+        if not self.__buffer:
+            if self.__error is not None:
+                error, self.__error = self.__error, None
+                raise error
+            batch = await run_in_executor(self.executor, self.__next_batch)
+            if not batch:
+                raise StopAsyncIteration()
+            self.__buffer.extend(batch)
+        return self.__buffer.popleft()
+
+    def __next_batch(self):
+        batch = []
+        try:
+            while len(batch) < self.async_batch_size:
+                batch.append(next(self))
+        except StopIteration:
+            pass
+        except Exception as e:
+            # Return what was fetched and raise once it has been consumed
+            if not batch:
+                raise
+            self.__error = e
+        return batch
+
+
+# The end of the results of a PrefetchingResult
+_END = object()
+
+class _Failure(object):
+    # The exception raised by the query of a PrefetchingResult
+    def __init__(self, error):
+        self.error = error
+
+def _prefetch(result, batches, stop):
+    # The thread of a PrefetchingResult.  It must not refer to the
+    # PrefetchingResult, so that dropping the result stops the thread
+    try:
+        for batch in result.iter_batches():
+            batches.put(batch)
+            if stop.is_set():
+                return
+    except Exception as e:
+        batches.put(_Failure(e))
+        return
+    batches.put(_END)
+
+
+class PrefetchingResult(object):
+    ''' The results of a query with :func:`Query.prefetch`.  When it is
+        first read, a background thread starts reading the batches of
+        ``result`` (see :func:`QueryResult.iter_batches`) into a queue of
+        ``depth`` batches, and blocks while the queue is full.  Errors are
+        raised by the read which reaches them.
+
+        Closing the result (or leaving a ``with`` block, or dropping the
+        result) stops the thread after the batch it is reading.  Other
+        attributes are those of ``result``, whose cursor should not be used
+        while the thread is running.
+    '''
+    def __init__(self, result, depth=2):
+        self.result = result
+        self.depth = depth
+        self.__batches = queue.Queue(depth)
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__current = deque()
+        self.__finished = False
+
+    def __start(self):
+        self.__thread = threading.Thread(target=_prefetch,
+            args=(self.result, self.__batches, self.__stop),
+            name='mongoalchemy-prefetch')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __next_batch(self):
+        if self.__finished:
+            return None
+        if self.__thread is None:
+            self.__start()
+        batch = self.__batches.get()
+        if batch is _END or isinstance(batch, _Failure):
+            self.__finished = True
+            self.__thread.join()
+            if batch is not _END:
+                raise batch.error
+            return None
+        return batch
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.__current:
+            batch = self.__next_batch()
+            if not batch:
+                raise StopIteration
+            self.__current.extend(batch)
+        return self.__current.popleft()
+
+    def iter_batches(self):
+        ''' Returns a :class:`ResultPipeline` of the batches as they were
+            read by the thread '''
+        return ResultPipeline(self.__batch_iterator())
+
+    def __batch_iterator(self):
+        if self.__current:
+            batch, self.__current = list(self.__current), deque()
+            yield batch
+        while True:
+            batch = self.__next_batch()
+            if not batch:
+                return
+            yield batch
+
+    def map(self, fun):
+        ''' Refer to: :func:`ResultPipeline.map` '''
+        return ResultPipeline(self).map(fun)
+
+    def filter(self, fun):
+        ''' Refer to: :func:`ResultPipeline.filter` '''
+        return ResultPipeline(self).filter(fun)
+
+    def chunk(self, size):
+        ''' Refer to: :func:`ResultPipeline.chunk` '''
+        return ResultPipeline(self).chunk(size)
+
+    def close(self):
+        ''' Stop the background thread and wait for it to finish '''
+        if self.__thread is None or self.__finished:
+            self.__finished = True
+            self.result.close()
+            return
+        self.__finished = True
+        self.__stop.set()
+        # Make room for the batch the thread may be blocked on
+        while self.__thread.is_alive():
+            try:
+                self.__batches.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        self.__thread.join()
+        self.result.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.result, name)
+
+
+class ResultPipeline(object):
+    ''' Lazy processing of query results.  Each stage wraps the previous
+        one, so results are read, transformed and passed on one at a time
+        as the pipeline is iterated and no intermediate lists are built::
+
+            results = iter(session.query(Event).batch_size(1000))
+            for rows in results.map(to_row).filter(is_valid).chunk(500):
+                writer.writerows(rows)
+    '''
+    def __init__(self, source):
+        ''' :param source: the iterable to process '''
+        self.source = source
+
+    def __iter__(self):
+        return iter(self.source)
+
+    def map(self, fun):
+        ''' Apply ``fun`` to each value '''
+        return ResultPipeline(map(fun, self.source))
+
+    def filter(self, fun):
+        ''' Only pass on the values for which ``fun`` is true '''
+        return ResultPipeline(filter(fun, self.source))
+
+    def chunk(self, size):
+        ''' Group the values into lists of ``size`` (the last one can be
+            shorter) '''
+        return ResultPipeline(_chunks(self.source, size))
+
+def _chunks(values, size):
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class QueryProfile(object):
+    ''' The time spent (in seconds) in each stage of running one or more
+        queries.
+
+        **Fields**:
+            * queries: the number of queries profiled
+            * documents: the number of results
+            * compile: building the query document (``filter``, \
+                ``resolve_name`` and ``flatten``)
+            * ensure_indexes: ensuring the indexes of the document class
+            * batches: ``[seconds, documents]`` for each batch fetched from \
+                the server.  The time includes the round trip and decoding the \
+                BSON, which the driver does as it receives a batch.  If the \
+                cursor can't tell where batches start they are counted with \
+                the query's batch size, or without one all fetches are added \
+                to a single entry
+            * unwrap: turning the results into documents
+            * field_times: the unwrap time of the top level fields of the \
+                results, by field class name.  While a query is profiled its \
+                documents are unwrapped field by field rather than with a \
+                compiled codec
+    '''
+    __slots__ = ('queries', 'documents', 'compile', 'ensure_indexes',
+        'batches', 'unwrap', 'field_times')
+
+    def __init__(self, queries=1):
+        self.queries = queries
+        self.documents = 0
+        self.compile = 0.0
+        self.ensure_indexes = 0.0
+        self.batches = []
+        self.unwrap = 0.0
+        self.field_times = {}
+
+    @property
+    def fetch(self):
+        ''' The total time spent fetching batches '''
+        return sum(seconds for seconds, _ in self.batches)
+
+    @property
+    def total(self):
+        ''' The total time of all of the stages '''
+        return self.compile + self.ensure_indexes + self.fetch + self.unwrap
+
+    def add(self, other):
+        ''' Add the times of the profile ``other`` to this one '''
+        self.queries += other.queries
+        self.documents += other.documents
+        self.compile += other.compile
+        self.ensure_indexes += other.ensure_indexes
+        self.batches.extend([list(batch) for batch in other.batches])
+        self.unwrap += other.unwrap
+        for name, seconds in other.field_times.items():
+            self.field_times[name] = self.field_times.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        return {
+            'queries' : self.queries,
+            'documents' : self.documents,
+            'compile' : self.compile,
+            'ensure_indexes' : self.ensure_indexes,
+            'fetch' : self.fetch,
+            'batches' : len(self.batches),
+            'unwrap' : self.unwrap,
+            'field_times' : dict(self.field_times),
+            'total' : self.total,
+        }
+
+    def __repr__(self):
+        return 'QueryProfile(queries=%d, documents=%d, compile=%.6f, ' \
+            'ensure_indexes=%.6f, fetch=%.6f, batches=%d, unwrap=%.6f)' % (
+            self.queries, self.documents, self.compile, self.ensure_indexes,
+            self.fetch, len(self.batches), self.unwrap)
+
+
+class ProfiledQueryResult(QueryResult):
+    ''' The result of a profiled query.  Fills in ``profile`` as results
+        are read and adds it to the session's profile at the end.'''
+    profile = None
+    session = None
+
+    def __next__(self):
+        profile = self.profile
+        buffered = _buffered(self.cursor)
+        counted = buffered is None and bool(self.batch_size)
+        if counted:
+            # The cursor fetches batch_size results at a time
+            buffered = -profile.documents % self.batch_size
+        start = perf_counter()
+        try:
+            value = next(self.cursor)
+        except StopIteration:
+            if buffered == 0:
+                # The last, empty, batch
+                profile.batches.append([perf_counter() - start, 0])
+            self.__finish()
+            raise
+        fetched = perf_counter()
+        if buffered == 0:
+            size = 1 if counted else 1 + (_buffered(self.cursor) or 0)
+            profile.batches.append([fetched - start, size])
+        elif counted:
+            profile.batches[-1][1] += 1
+        elif buffered is None:
+            if not profile.batches:
+                profile.batches.append([0.0, 0])
+            profile.batches[0][0] += fetched - start
+            profile.batches[0][1] += 1
+
+        if not self.raw_output:
+            if self.values_only:
+                value = self._as_tuple(value)
+            else:
+                value = self._unwrap(value, fields=self.fields)
+        profile.unwrap += perf_counter() - fetched
+        profile.documents += 1
+        return value
+
+    def _unwrap(self, value, fields=None):
+        field_times = self.profile.field_times
+        if self.identity_map is not None:
+            return self.identity_map.unwrap(self.type, value, fields=fields,
+                trusted=self.trusted, field_times=field_times, lazy=self.lazy)
+        return self.type.unwrap(value, fields=fields, trusted=self.trusted,
+            field_times=field_times, lazy=self.lazy)
+
+    def close(self):
+        self.__finish()
+        super(ProfiledQueryResult, self).close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __finish(self):
+        session, self.session = self.session, None
+        if session is not None:
+            session._add_profile(self.profile)
+
+
+def _buffered(cursor):
+    # The number of fetched results the cursor hasn't returned, or None
+    buffered = getattr(cursor, 'buffered', None)
+    if buffered is not None:
+        return buffered()
+    return None
+
 
 class RemoveQuery(object):
     def __init__(self, type, session):
@@ -62,6 +62,42 @@ class FreeFormDoc(object):
 
 Q = FreeFormDoc('')
 
+class BindParameter(object):
+    ''' A placeholder for a value which is given when a compiled query
+        template is executed.  Created with :func:`bind`.'''
+    def __init__(self, name):
+        self.name = name
+    def __repr__(self):
+        return 'bind(%r)' % self.name
+
+def bind(name):
+    ''' A placeholder for the value of the parameter ``name`` of a query
+        template::
+
+            template = session.query(User).filter(User.age > bind('age')).compile()
+            template.execute(age=30)
+
+        .. seealso:: :func:`~mongoalchemy.query.Query.compile`
+    '''
+    return BindParameter(name)
+
+class BoundValue(object):
+    ''' A parameter in the query document of a query with
+        :class:`BindParameter` values.  ``wrap`` is the function which turns
+        the value given when the query is executed into its query form.'''
+    __slots__ = ('name', 'wrap')
+    def __init__(self, name, wrap):
+        self.name = name
+        self.wrap = wrap
+    def resolve(self, params):
+        try:
+            value = params[self.name]
+        except KeyError:
+            raise BadQueryException('No value given for parameter %s' % self.name)
+        return self.wrap(value)
+    def __repr__(self):
+        return 'BoundValue(%r)' % self.name
+
 class QueryField(object):
     def __init__(self, type, parent=None):
         self.__type = type
@@ -88,6 +124,21 @@ class QueryField(object):
         self.__matched_index = True
         return self
 
+    def __deepcopy__(self, memo):
+        # Fields are part of the schema, so copies of a query share them
+        return self
+
+    def __reduce__(self):
+        # Pickled as the attribute names leading to the field from its
+        # document class, which must be importable
+        names = []
+        current = self
+        while current is not None:
+            names.append((current.get_type()._name, current.__matched_index))
+            document_class = current.get_type().parent
+            current = current._get_parent()
+        return (_load_query_field, (document_class, list(reversed(names))))
+
     def __getattr__(self, name):
         if not self.__type.no_real_attributes and hasattr(self.__type, name):
             return getattr(self.__type, name)
@@ -116,7 +167,7 @@ class QueryField(object):
             in ``values``.  Produces a MongoDB ``$in`` expression.
         '''
         return QueryExpression({
-            self : { '$in' : [self.get_type().wrap_value(value) for value in values] }
+            self : { '$in' : self.__wrap_values(values) }
         })
 
     def like(self, value):
@@ -131,9 +182,16 @@ class QueryField(object):
             in ``values``.  Produces a MongoDB ``$nin`` expression.
         '''
         return QueryExpression({
-            self : { '$nin' : [self.get_type().wrap_value(value) for value in values] }
+            self : { '$nin' : self.__wrap_values(values) }
         })
 
+    def __wrap_values(self, values):
+        wrap_value = self.get_type().wrap_value
+        if len(values) == 1 and isinstance(values[0], BindParameter):
+            return BoundValue(values[0].name,
+                lambda values: [wrap_value(value) for value in values])
+        return [wrap_value(value) for value in values]
+
     def __str__(self):
         return self.get_absolute_name()
 
@@ -152,6 +210,8 @@ class QueryField(object):
         '''
         if isinstance(value, QueryField):
             return self.__cached_id == value.__cached_id
+        if isinstance(value, BindParameter):
+            return QueryExpression({ self : BoundValue(value.name, self.get_type().wrap_value) })
         return QueryExpression({ self : self.get_type().wrap_value(value) })
 
     def __lt__(self, value):
@@ -202,12 +262,25 @@ class QueryField(object):
         return self.__comparator('$gte', value)
 
     def __comparator(self, op, value):
+        if isinstance(value, BindParameter):
+            value = BoundValue(value.name, self.get_type().wrap)
+        else:
+            value = self.get_type().wrap(value)
         return QueryExpression({
             self : {
-                op : self.get_type().wrap(value)
+                op : value
             }
         })
 
+def _load_query_field(document_class, names):
+    # Unpickle a QueryField.  See QueryField.__reduce__
+    qfield = document_class
+    for name, matched_index in names:
+        qfield = getattr(qfield, name)
+        if matched_index:
+            qfield = qfield.matched_index()
+    return qfield
+
 
 class QueryExpression(object):
     ''' A QueryExpression wraps a dictionary representing a query to perform
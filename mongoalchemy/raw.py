@@ -0,0 +1,261 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+'''
+Undecoded BSON documents.  A query with
+:func:`~mongoalchemy.query.Query.raw_bson` returns each document as a
+:class:`RawDocument`, a read-only mapping over the document's BSON bytes.
+Looking up a key scans the element headers of the buffer (through
+``memoryview`` slices, without copying it) and decodes only that element,
+so code which reads a few fields of a large document, or just passes it on,
+never builds the rest of it::
+
+    >>> for event in session.query('events').raw_bson().raw_output():
+    ...     if event['tenant'] == tenant:
+    ...         forward(event.raw)
+
+Documents unwrapped from a :class:`RawDocument` unwrap each field when it is
+first read, and keep the original document.  As long as they are not
+modified, :func:`~mongoalchemy.document.Document.wrap` returns it, so saving
+them sends the original bytes back.
+
+When the driver can return undecoded documents (pymongo's
+``RawBSONDocument``) they are used as they are, otherwise the documents
+returned by the driver are encoded again.
+
+'''
+
+import struct
+from collections.abc import Mapping
+from bson import BSON
+from mongoalchemy.backend import BackendCollection
+
+try:
+    from bson.codec_options import CodecOptions
+    from bson.raw_bson import RawBSONDocument
+except ImportError:
+    # pymongo 2.x always decodes documents
+    RawBSONDocument = None
+
+_INT32 = struct.Struct('<i')
+_DOUBLE = struct.Struct('<d')
+
+# The sizes of the values of the fixed size element types
+_FIXED_SIZES = {
+    0x01 : 8,   # double
+    0x06 : 0,   # undefined
+    0x07 : 12,  # ObjectId
+    0x08 : 1,   # bool
+    0x09 : 8,   # datetime
+    0x0A : 0,   # null
+    0x10 : 4,   # int32
+    0x11 : 8,   # timestamp
+    0x12 : 8,   # int64
+    0x13 : 16,  # decimal128
+    0xFF : 0,   # min key
+    0x7F : 0,   # max key
+}
+# Values starting with their size, including the size itself
+_SIZED = frozenset([0x03, 0x04, 0x0F])
+# Values starting with the size of the string which follows
+_STRINGS = frozenset([0x02, 0x0D, 0x0E])
+
+
+class RawDocument(Mapping):
+    ''' A read-only mapping over the BSON document ``data``.  The offsets of
+        the elements are found the first time a key is looked up, and
+        values are decoded each time they are read.  Sub-documents and
+        arrays are decoded as a whole.
+
+        **Fields**:
+            * raw: the BSON bytes of the document
+    '''
+    def __init__(self, data):
+        self.raw = data
+        self.__view = memoryview(data)
+        self.__elements = None
+
+    def __offsets(self):
+        if self.__elements is None:
+            self.__elements = _scan(self.raw, self.__view)
+        return self.__elements
+
+    def __getitem__(self, name):
+        start, value, end = self.__offsets()[name]
+        return _decode_element(self.__view, start, value, end)
+
+    def __iter__(self):
+        return iter(self.__offsets())
+
+    def __len__(self):
+        return len(self.__offsets())
+
+    def __contains__(self, name):
+        return name in self.__offsets()
+
+    def elements(self):
+        ''' ``(key, element)`` pairs of the :class:`RawElement` of each
+            value, which is decoded with ``element.decode()`` '''
+        view = self.__view
+        for name, (start, value, end) in self.__offsets().items():
+            yield name, RawElement(view, start, value, end)
+
+    def decode(self):
+        ''' Returns the whole document as a ``dict`` '''
+        return BSON(bytes(self.raw)).decode()
+
+    def __deepcopy__(self, memo):
+        # Immutable
+        return self
+
+    def __reduce__(self):
+        return (RawDocument, (bytes(self.raw),))
+
+    def __repr__(self):
+        return 'RawDocument(%d bytes)' % len(self.raw)
+
+
+class RawElement(object):
+    ''' One element of a :class:`RawDocument`, a slice of its buffer '''
+    __slots__ = ('view', 'start', 'value', 'end')
+
+    def __init__(self, view, start, value, end):
+        self.view = view
+        self.start = start
+        self.value = value
+        self.end = end
+
+    def decode(self):
+        ''' Returns the value of the element '''
+        return _decode_element(self.view, self.start, self.value, self.end)
+
+
+def decoded(value):
+    ''' ``value``, decoded if it is a :class:`RawElement` '''
+    if isinstance(value, RawElement):
+        return value.decode()
+    return value
+
+def _scan(data, view):
+    # {name : (element start, value start, end)} of the elements of the
+    # document.  Names are found in data, as memoryviews can't be searched
+    elements = {}
+    position = 4
+    last = len(view) - 1
+    while position < last:
+        element_type = view[position]
+        name_end = data.index(b'\x00', position + 1)
+        name = str(view[position + 1:name_end], 'utf-8')
+        value = name_end + 1
+        end = value + _value_size(data, view, element_type, value)
+        elements[name] = (position, value, end)
+        position = end
+    return elements
+
+def _value_size(data, view, element_type, value):
+    size = _FIXED_SIZES.get(element_type)
+    if size is not None:
+        return size
+    if element_type in _SIZED:
+        return _INT32.unpack_from(view, value)[0]
+    if element_type in _STRINGS:
+        return 4 + _INT32.unpack_from(view, value)[0]
+    if element_type == 0x05:
+        # binary: size, subtype, data
+        return 5 + _INT32.unpack_from(view, value)[0]
+    if element_type == 0x0B:
+        # regex: pattern and options cstrings
+        options = data.index(b'\x00', value) + 1
+        return data.index(b'\x00', options) + 1 - value
+    if element_type == 0x0C:
+        # DBPointer: string and ObjectId
+        return 4 + _INT32.unpack_from(view, value)[0] + 12
+    raise ValueError('Unknown BSON element type 0x%02x' % element_type)
+
+def _decode_element(view, start, value, end):
+    element_type = view[start]
+    # The common scalar types are read directly from the buffer
+    if element_type == 0x02:
+        return str(view[value + 4:end - 1], 'utf-8')
+    if element_type == 0x10:
+        return _INT32.unpack_from(view, value)[0]
+    if element_type == 0x01:
+        return _DOUBLE.unpack_from(view, value)[0]
+    if element_type == 0x08:
+        return view[value] != 0
+    if element_type == 0x0A:
+        return None
+    # Anything else is decoded as a document of just this element
+    length = end - start + 5
+    document = b''.join([_INT32.pack(length), view[start:end], b'\x00'])
+    for item in BSON(document).decode().values():
+        return item
+
+def raw_collection(collection):
+    ''' ``collection`` configured to return undecoded documents if the
+        driver supports it, otherwise ``collection`` itself '''
+    if RawBSONDocument is None or not hasattr(collection, 'with_options'):
+        return collection
+    return collection.with_options(
+        codec_options=CodecOptions(document_class=RawBSONDocument))
+
+def raw_document(document):
+    ''' ``document``, returned by a driver, as a :class:`RawDocument` '''
+    if isinstance(document, RawDocument):
+        return document
+    raw = getattr(document, 'raw', None)
+    if isinstance(raw, bytes):
+        return RawDocument(raw)
+    return RawDocument(BSON.encode(document))
+
+
+def writable(collection, document):
+    ''' ``document`` in a form which ``collection`` can save.  Backends take
+        a :class:`RawDocument` as it is.  pymongo collections get a
+        ``RawBSONDocument``, whose bytes are sent as they are, or a ``dict``
+        with drivers which don't have it.'''
+    if type(document) is not RawDocument or isinstance(collection, BackendCollection):
+        return document
+    if RawBSONDocument is not None:
+        return RawBSONDocument(bytes(document.raw))
+    return document.decode()
+
+
+class RawCursor(object):
+    ''' Wraps a cursor, returning its documents as :class:`RawDocument`
+        objects.  Other methods are those of the cursor. '''
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return raw_document(next(self.cursor))
+
+    def __getitem__(self, index):
+        return raw_document(self.cursor[index])
+
+    def clone(self):
+        return RawCursor(self.cursor.clone())
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
@@ -42,61 +42,408 @@
 '''
 
 
+import threading
+import time
+import weakref
 from pymongo.connection import Connection
-from mongoalchemy.query import Query, QueryResult, RemoveQuery
-from mongoalchemy.document import FieldNotRetrieved
+from pymongo.objectid import ObjectId
+from mongoalchemy.query import Query, QueryResult, RemoveQuery, \
+        QueryProfile, ProfiledQueryResult
+from mongoalchemy.document import Document, FieldNotRetrieved
 from mongoalchemy.query_expression import FreeFormDoc
+from mongoalchemy.backend import get_backend
+from mongoalchemy import metrics, cache, raw
 from itertools import chain
 
+
+#: The connections made by :func:`get_connection`, keyed by their arguments
+connection_registry = {}
+_connection_lock = threading.Lock()
+
+def get_connection(*args, **kwds):
+    ''' Returns a :class:`pymongo.connection.Connection` created with ``args``
+        and ``kwds``.  Connections are kept in ``connection_registry``, so
+        calls with the same arguments share one connection (and its socket
+        pool) instead of connecting again.  Arguments which can't be hashed
+        always create a new connection.
+    '''
+    key = (args, tuple(sorted(kwds.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return Connection(*args, **kwds)
+    with _connection_lock:
+        conn = connection_registry.get(key)
+        if conn is None:
+            conn = connection_registry[key] = Connection(*args, **kwds)
+        return conn
+
+def disconnect_all():
+    ''' Disconnect and forget all of the connections in
+        ``connection_registry`` '''
+    with _connection_lock:
+        for conn in connection_registry.values():
+            conn.disconnect()
+        connection_registry.clear()
+
+
+class IdentityMap(object):
+    ''' Maps ``(collection name, _id)`` to the document instance loaded for
+        that key so that loading the same document twice returns the same
+        object without unwrapping it again.  Documents are only weakly
+        referenced, so an entry goes away as soon as the application stops
+        using the document.
+
+        The map is shared with the threads which unwrap results in the
+        background (see :func:`~mongoalchemy.query.Query.prefetch`), so
+        every access holds a lock.
+    '''
+    def __init__(self):
+        self.__map = weakref.WeakValueDictionary()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__map)
+
+    def __key(self, cls, mongo_id):
+        key = (cls.get_collection_name(), mongo_id)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def add(self, obj):
+        ''' Add the (fully loaded) document ``obj`` to the map '''
+        if obj.partial:
+            return
+        mongo_id = getattr(obj, 'mongo_id', None)
+        if mongo_id is None:
+            return
+        key = self.__key(type(obj), mongo_id)
+        if key is not None:
+            with self.__lock:
+                self.__map[key] = obj
+
+    def discard(self, obj):
+        ''' Remove ``obj`` from the map if it is in it '''
+        key = self.__key(type(obj), getattr(obj, 'mongo_id', None))
+        if key is None:
+            return
+        with self.__lock:
+            if self.__map.get(key) is obj:
+                del self.__map[key]
+
+    def expire(self, cls, mongo_id):
+        ''' Remove the entry for the document of class ``cls`` with the id
+            ``mongo_id``, whatever instance it maps to.  Used when the
+            document is changed in the database, so that it is loaded again.
+        '''
+        key = self.__key(cls, mongo_id)
+        if key is not None:
+            with self.__lock:
+                self.__map.pop(key, None)
+
+    def clear_collection(self, name):
+        ''' Remove all of the entries for the collection ``name`` '''
+        with self.__lock:
+            for key in list(self.__map.keys()):
+                if key[0] == name:
+                    self.__map.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__map.clear()
+
+    def unwrap(self, cls, value, fields=None, trusted=None, field_times=None,
+            lazy=False):
+        ''' Return the mapped instance for the SON object ``value`` or unwrap
+            it with ``cls`` and add the result to the map.  Partial loads
+            (``fields`` is not ``None``) are never mapped.
+        '''
+        if fields is not None or not isinstance(cls, type) or \
+                not issubclass(cls, Document) or '_id' not in value:
+            return cls.unwrap(value, fields=fields, trusted=trusted,
+                field_times=field_times, lazy=lazy)
+        key = self.__key(cls, value['_id'])
+        if key is None:
+            return cls.unwrap(value, trusted=trusted, field_times=field_times,
+                lazy=lazy)
+        with self.__lock:
+            obj = self.__map.get(key)
+        if obj is not None and type(obj) is cls:
+            return obj
+        obj = cls.unwrap(value, trusted=trusted, field_times=field_times,
+            lazy=lazy)
+        with self.__lock:
+            # Another thread may have loaded the same document meanwhile
+            mapped = self.__map.get(key)
+            if mapped is not None and type(mapped) is cls:
+                return mapped
+            self.__map[key] = obj
+        return obj
+
+
+#: The names of the listeners which can be passed to :func:`Session.add_listener`
+LISTENER_NAMES = ('before_query', 'after_query', 'before_write', 'after_write',
+    'before_flush', 'after_flush')
+
+
+# Listeners for every session, see add_global_listener
+_global_listeners = None
+
+def _merge_listeners(current, listeners):
+    for name in listeners:
+        if name not in LISTENER_NAMES:
+            raise TypeError('Unknown session listener: %s' % name)
+    merged = dict(current or {})
+    for name, listener in listeners.items():
+        merged[name] = merged.get(name, ()) + (listener,)
+    return merged
+
+def _remove_listeners(current, listeners):
+    remaining = dict(current or {})
+    for name, listener in listeners.items():
+        kept = tuple(l for l in remaining.get(name, ()) if l != listener)
+        if kept:
+            remaining[name] = kept
+        else:
+            remaining.pop(name, None)
+    return remaining or None
+
+def add_global_listener(**listeners):
+    ''' Register listeners, as with :func:`Session.add_listener`, for the
+        operations of every session.  They are called after the session's
+        own listeners.'''
+    global _global_listeners
+    _global_listeners = _merge_listeners(_global_listeners, listeners)
+
+def remove_global_listener(**listeners):
+    ''' Unregister listeners registered with :func:`add_global_listener` '''
+    global _global_listeners
+    _global_listeners = _remove_listeners(_global_listeners, listeners)
+
+
+class SessionEvent(object):
+    ''' The details of a database operation, passed to session listeners.
+
+        **Fields**:
+            * session: the :class:`Session` running the operation
+            * operation: one of ``'query'``, ``'update'``, ``'remove'``, \
+                ``'find_and_modify'`` or ``'flush'``
+            * type: the document class of the operation, or ``None`` for a \
+                flush
+            * collection: the name of the collection, or ``None`` for a flush
+            * spec: the query document, if there is one
+            * document: the update document, if there is one
+            * query: the :class:`~mongoalchemy.query.Query` of a query, \
+                update or find and modify expression, if there is one
+            * count: the number of documents returned (queries), affected \
+                (writes, only known when ``safe`` is set, otherwise \
+                ``None``) or flushed.  ``None`` in ``before_*`` listeners
+            * started: the wall clock time the operation started at
+            * duration: the number of seconds the operation took.  ``None`` \
+                in ``before_*`` listeners
+            * error: the exception raised by the operation, if any
+    '''
+    __slots__ = ('session', 'operation', 'type', 'collection', 'spec', 'document',
+        'query', 'count', 'started', 'duration', 'error', '_start')
+
+    def __init__(self, session, operation, type, spec=None, document=None,
+            query=None):
+        self.session = session
+        self.operation = operation
+        self.type = type
+        self.collection = None if type is None else type.get_collection_name()
+        self.spec = spec
+        self.document = document
+        self.query = query
+        self.count = None
+        self.started = time.time()
+        self.duration = None
+        self.error = None
+
+    def __repr__(self):
+        return 'SessionEvent(%s, %s, count=%r, duration=%r)' % (
+            self.operation, self.collection, self.count, self.duration)
+
+
 class Session(object):
 
-    def __init__(self, database, safe=False):
+    def __init__(self, database, safe=False, autoflush=True, insert_batch_size=1000,
+            identity_map=False, profile_queries=False, cache=None):
         '''
         Create a session connecting to `database`.
 
         :param database: the database to connect to.  Should be an instance of \
-            :class:`pymongo.database.Database`
+            :class:`pymongo.database.Database` or of a \
+            :class:`~mongoalchemy.backend.Backend`, such as the in-memory \
+            :class:`~mongoalchemy.memory.MemoryBackend`
         :param safe: Whether the "safe" option should be used on mongo writes, \
             blocking to make sure there are no errors.
+        :param autoflush: Whether :func:`insert` flushes immediately.  If \
+            ``False`` inserts are queued until the next :func:`flush` (or \
+            any other database operation) and then sent to the database as \
+            multi-document inserts.
+        :param insert_batch_size: The maximum number of documents sent in \
+            a single insert when flushing a deferred queue.
+        :param identity_map: Whether to keep an :class:`IdentityMap` so that \
+            loading a document which is already loaded in this session \
+            returns the existing instance.  Update, remove and find and \
+            modify expressions drop the entries for their collection.
+        :param profile_queries: Whether to time the stages of every query, \
+            as :func:`~mongoalchemy.query.Query.profile` does
+        :param cache: A :class:`~mongoalchemy.cache.QueryCache` to answer \
+            queries from (unless they are run with \
+            :func:`~mongoalchemy.query.Query.cached` ``(False)``).  The \
+            session's writes invalidate it
 
         **Fields**:
-            * db: the underlying pymongo database object
-            * queue: the queue of unflushed database commands (currently useless \
-                since there aren't any operations which defer flushing)
+            * db: the underlying pymongo database object (or backend)
+            * backend: the :class:`~mongoalchemy.backend.Backend` all \
+                operations are sent to
+            * queue: the queue of unflushed database commands.  It is only \
+                non-empty between flushes when ``autoflush`` is ``False``
+            * identity_map: the session's :class:`IdentityMap`, or ``None``
+            * profile: the :class:`~mongoalchemy.query.QueryProfile` \
+                summing the profiles of the queries run by this session which \
+                were read to the end, or ``None`` if there were none
+            * executor: the executor ``async for`` over this session's \
+                queries runs blocking database calls in.  ``None`` (the \
+                default) uses the event loop's default executor.  See \
+                :class:`~mongoalchemy.async_session.AsyncSession`
+            * cache: the session's :class:`~mongoalchemy.cache.QueryCache`, \
+                or ``None``
         '''
         self.db = database
+        self.backend = get_backend(database)
         self.queue = []
+        self.__new_items = {}
         self.safe = safe
+        self.autoflush = autoflush
+        self.insert_batch_size = insert_batch_size
+        self.identity_map = IdentityMap() if identity_map else None
+        self.executor = None
+        self.profile_queries = profile_queries
+        self.profile = None
+        self.cache = cache
+        self.__listeners = None
+        if cache is not None:
+            cache.attach(self)
 
     @classmethod
     def connect(self, database, safe=False, *args, **kwds):
-        ''' `connect` is a thin wrapper around __init__ which creates the
-            database connection that the session will use.
+        ''' `connect` is a thin wrapper around __init__ which gets the
+            database connection that the session will use from
+            :func:`get_connection`, so sessions connecting with the same
+            arguments share a connection.
 
             :param database: the database name to use.  Should be an instance of \
                     :class:`basestring`
             :param safe: The value for the "safe" parameter of the Session \
                 init function
             :param args: arguments for :class:`pymongo.connection.Connection`
-            :param kwds: keyword arguments for :class:`pymongo.connection.Connection`
+            :param kwds: keyword arguments for :class:`pymongo.connection.Connection`. \
+                ``autoflush``, ``insert_batch_size``, ``identity_map`` and \
+                ``cache`` are removed and passed to the Session init function instead
         '''
-        conn = Connection(*args, **kwds)
+        session_kwds = {}
+        for key in ('autoflush', 'insert_batch_size', 'identity_map', 'cache'):
+            if key in kwds:
+                session_kwds[key] = kwds.pop(key)
+        conn = get_connection(*args, **kwds)
         db = conn[database]
-        return Session(db, safe=safe)
+        return Session(db, safe=safe, **session_kwds)
+
+    def add_listener(self, **listeners):
+        ''' Register functions to be called with a :class:`SessionEvent`
+            before and after the session's database operations::
+
+                session.add_listener(after_query=log_query, after_write=log_write)
+
+            ``*_query`` listeners are called for :func:`execute_query`,
+            ``*_write`` listeners for updates, removes and find and modify
+            and ``*_flush`` listeners for flushes of a non-empty queue.
+            ``after_query`` is called once the results have been read to
+            the end, so its ``count`` and ``duration`` include fetching them.
+            ``after_*`` listeners are also called when the operation raises,
+            with the event's ``error`` set.  When no listeners are registered
+            no events are created and no timing is done.
+
+            :param listeners: functions for any of the names in \
+                ``LISTENER_NAMES``: ``before_query``, ``after_query``, \
+                ``before_write``, ``after_write``, ``before_flush``, \
+                ``after_flush``
+        '''
+        self.__listeners = _merge_listeners(self.__listeners, listeners)
+
+    def remove_listener(self, **listeners):
+        ''' Unregister listeners registered with :func:`add_listener` '''
+        self.__listeners = _remove_listeners(self.__listeners, listeners)
+
+    def __observed(self):
+        return self.__listeners is not None or _global_listeners is not None
+
+    def __listeners_for(self, name):
+        own = (self.__listeners or {}).get(name, ())
+        return own + (_global_listeners or {}).get(name, ())
+
+    def _begin_event(self, kind, operation, type, spec=None, document=None,
+            query=None):
+        event = SessionEvent(self, operation, type, spec, document, query)
+        for listener in self.__listeners_for('before_' + kind):
+            listener(event)
+        event._start = time.perf_counter()
+        return event
+
+    def _end_event(self, kind, event, count=None, error=None):
+        event.duration = time.perf_counter() - event._start
+        event.count = count
+        event.error = error
+        for listener in self.__listeners_for('after_' + kind):
+            listener(event)
+
+    def __observe(self, operation, type, spec, document, mongo_query,
+            count, fun, *args, **kwargs):
+        # Run fun(*args, **kwargs) as a write, calling the listeners if
+        # there are any.  count(result) is the number of documents affected
+        if self.__listeners is None and _global_listeners is None:
+            return fun(*args, **kwargs)
+        event = self._begin_event('write', operation, type, spec,
+            document, mongo_query)
+        try:
+            result = fun(*args, **kwargs)
+        except Exception as e:
+            self._end_event('write', event, error=e)
+            raise
+        self._end_event('write', event, count(result))
+        return result
 
     def end(self):
         ''' End the session.  Flush all pending operations and ending the
             *pymongo* request'''
         self.flush()
-        self.db.connection.end_request()
+        if self.identity_map is not None:
+            self.identity_map.clear()
+        self.backend.end_request()
 
     def insert(self, item, safe=None):
-        ''' Insert an item into the queue and flushes.  Later this function should be smart and delay
-            insertion until the _id field is actually accessed'''
+        ''' Insert an item into the queue.  If ``autoflush`` is set the queue
+            is flushed right away.  Otherwise the item's ``_id`` is set to a
+            new ``ObjectId`` (if it uses the default ``mongo_id`` field and
+            has no id yet) so that it can be referenced before the insert is
+            actually sent to the database.'''
         if safe is None:
             safe = self.safe
+        if not self.autoflush and not item._id_name and \
+                getattr(item, 'mongo_id', None) is None:
+            item.mongo_id = ObjectId()
+            # Only items which are known to be new can be batch inserted
+            self.__new_items[id(item)] = item
         self.queue.append(item)
-        self.flush(safe=safe)
+        if self.autoflush:
+            self.flush(safe=safe)
 
     def update(self, item, id_expression=None, upsert=False, update_ops={}, safe=None, **kwargs):
         ''' Update an item in the database.  Uses the on_update keyword to each
@@ -142,7 +489,15 @@ class Session(object):
         if safe is None:
             safe = self.safe
         self.flush(safe=safe)
-        self.db[item.get_collection_name()].update(db_key, dirty_ops, upsert=upsert, safe=safe)
+        # The update may change the document in ways the instance doesn't
+        # show (for example $inc), so it is loaded again next time
+        if id_expression:
+            self.__expire_collection(type(item))
+        elif self.identity_map is not None:
+            self.identity_map.expire(type(item), item.mongo_id)
+        return self.__observe('update', type(item), db_key, dirty_ops, None,
+            _affected, self.backend[item.get_collection_name()].update,
+            db_key, dirty_ops, upsert=upsert, safe=safe)
 
 
     def query(self, type):
@@ -161,27 +516,78 @@ class Session(object):
 
     def execute_query(self, query):
         ''' Get the results of ``query``.  This method will flush the queue '''
-        collection = self.db[query.type.get_collection_name()]
-        for index in query.type.get_indexes():
-            index.ensure(collection)
+        self.flush()
+        profile = None
+        if query.is_profiled():
+            profile = QueryProfile()
+            profile.compile = query._compile_time
+            start = time.perf_counter()
+        collection = self.backend[query.type.get_collection_name()]
+        self.__auto_ensure_indexes(query.type, collection)
+        if profile is not None:
+            profile.ensure_indexes = time.perf_counter() - start
+            start = time.perf_counter()
+        if query.is_raw_bson():
+            collection = raw.raw_collection(collection)
 
         kwargs = dict()
         if query.get_fields():
             kwargs['fields'] = [str(f) for f in query.get_fields()]
-
-        cursor = collection.find(query.query, **kwargs)
-
-        if query.sort:
-            cursor.sort(query.sort)
-        if query.hints:
-            cursor.hint(query.hints)
-        if query.get_limit() != None:
-            cursor.limit(query.get_limit())
-        if query.get_skip() != None:
-            cursor.skip(query.get_skip())
-        return QueryResult(cursor, query.type, raw_output=query._raw_output,
+        spec = query.query
+        if profile is not None:
+            profile.compile += time.perf_counter() - start
+
+        event = None
+        if self.__observed():
+            event = self._begin_event('query', 'query', query.type,
+                spec, query=query)
+
+        def find():
+            cursor = collection.find(spec, **kwargs)
+            if query.sort:
+                cursor.sort(query.sort)
+            if query.hints:
+                cursor.hint(query.hints)
+            if query.get_limit() != None:
+                cursor.limit(query.get_limit())
+            if query.get_skip() != None:
+                cursor.skip(query.get_skip())
+            if query.get_batch_size():
+                cursor.batch_size(query.get_batch_size())
+            return cursor
+
+        cursor = None
+        if query.is_cached() and not query.is_raw_bson():
+            fields = kwargs.get('fields')
+            if cache.document_cache is not None:
+                cursor = cache.document_cache.cursor(self, query, collection,
+                    spec, fields, find)
+            if cursor is None and self.cache is not None:
+                cursor = self.cache.cursor(self, query, collection, spec,
+                    fields, find)
+        if cursor is None:
+            cursor = find()
+        if query.is_raw_bson():
+            cursor = raw.RawCursor(cursor)
+        result_class = _result_classes[event is not None, profile is not None]
+        result = result_class(cursor, query.type, raw_output=query._raw_output,
                 fields=query.get_fields(), field_order=query._field_order,
-                values_only=query._values_only)
+                values_only=query._values_only, identity_map=self.identity_map,
+                trusted=query.get_trusted(), executor=self.executor,
+                lazy=query.is_lazy() or query.is_raw_bson(),
+                batch_size=query.get_batch_size())
+        if event is not None:
+            result.event = event
+        if profile is not None:
+            result.profile = profile
+            result.session = self
+        return result
+
+    def _add_profile(self, profile):
+        ''' Add the (finished) query profile ``profile`` to ``self.profile`` '''
+        if self.profile is None:
+            self.profile = QueryProfile(queries=0)
+        self.profile.add(profile)
 
     def remove_query(self, type):
         ''' Begin a remove query on the database's collection for `type`.
@@ -205,10 +611,12 @@ class Session(object):
             safe = self.safe
         if not obj.has_id():
             return None
-        collection = self.db[obj.get_collection_name()]
-        for index in obj.get_indexes():
-            index.ensure(collection)
-        return self.db[obj.get_collection_name()].remove(obj.mongo_id, safe=safe)
+        if self.identity_map is not None:
+            self.identity_map.discard(obj)
+        collection = self.backend[obj.get_collection_name()]
+        self.__auto_ensure_indexes(obj, collection)
+        return self.__observe('remove', type(obj), {'_id' : obj.mongo_id},
+            None, None, _affected, collection.remove, obj.mongo_id, safe=safe)
 
     def execute_remove(self, remove):
         ''' Execute a remove expression.  Should generally only be called implicitly.
@@ -218,11 +626,12 @@ class Session(object):
         if remove.safe != None:
             safe = remove.safe
 
-        collection = self.db[remove.type.get_collection_name()]
-        for index in remove.type.get_indexes():
-            index.ensure(collection)
+        collection = self.backend[remove.type.get_collection_name()]
+        self.__auto_ensure_indexes(remove.type, collection)
+        self.__expire_collection(remove.type)
 
-        return self.db[remove.type.get_collection_name()].remove(remove.query, safe=safe)
+        return self.__observe('remove', remove.type, remove.query, None,
+            None, _affected, collection.remove, remove.query, safe=safe)
 
     def execute_update(self, update, safe=False):
         ''' Execute an update expression.  Should generally only be called implicitly.
@@ -230,23 +639,24 @@ class Session(object):
 
         self.flush()
         assert len(update.update_data) > 0
-        collection = self.db[update.query.type.get_collection_name()]
-        for index in update.query.type.get_indexes():
-            index.ensure(collection)
+        collection = self.backend[update.query.type.get_collection_name()]
+        self.__auto_ensure_indexes(update.query.type, collection)
+        self.__expire_collection(update.query.type)
         kwargs = dict(
             upsert=update.get_upsert(),
             multi=update.get_multi(),
             safe=safe,
         )
-        print(kwargs)
-        collection.update(update.query.query, update.update_data, **kwargs)
+        return self.__observe('update', update.query.type, update.query.query,
+            update.update_data, update.query, _affected, collection.update,
+            update.query.query, update.update_data, **kwargs)
 
     def execute_find_and_modify(self, fm_exp):
         self.flush()
         # assert len(fm_exp.update_data) > 0
-        collection = self.db[fm_exp.query.type.get_collection_name()]
-        for index in fm_exp.query.type.get_indexes():
-            index.ensure(collection)
+        collection = self.backend[fm_exp.query.type.get_collection_name()]
+        self.__auto_ensure_indexes(fm_exp.query.type, collection)
+        self.__expire_collection(fm_exp.query.type)
         kwargs = {
             'query' : fm_exp.query.query,
             'update' : fm_exp.update_data,
@@ -264,7 +674,9 @@ class Session(object):
         if fm_exp.get_remove():
             kwargs['remove'] = fm_exp.get_remove()
 
-        value = collection.find_and_modify(**kwargs)
+        value = self.__observe('find_and_modify', fm_exp.query.type,
+            kwargs['query'], kwargs['update'], fm_exp.query, _found,
+            collection.find_and_modify, **kwargs)
 
         if value is None:
             return None
@@ -272,37 +684,118 @@ class Session(object):
         if kwargs['upsert'] and not kwargs.get('new') and len(value) == 0:
             return value
 
-        return fm_exp.query.type.unwrap(value, fields=fm_exp.query.get_fields())
+        return fm_exp.query.type.unwrap(value, fields=fm_exp.query.get_fields(),
+            trusted=fm_exp.query.get_trusted())
+
+    def ensure_indexes(self, *classes, **kwargs):
+        ''' Ensure the indexes of each of the document classes in ``classes``
+            on their collections.  This is the way to create indexes for
+            classes with ``config_auto_ensure_indexes`` turned off, e.g. at
+            application startup.
+
+            :param force: Call ``ensure_index`` even for indexes which were \
+                already ensured by this process (default: ``False``)
+        '''
+        force = kwargs.pop('force', False)
+        for cls in classes:
+            cls.ensure_indexes(self.backend[cls.get_collection_name()], force=force)
+
+    def __auto_ensure_indexes(self, cls, collection):
+        if cls.get_indexes() and cls.config_auto_ensure_indexes:
+            cls.ensure_indexes(collection)
+
+    def __expire_collection(self, cls):
+        if self.identity_map is not None:
+            self.identity_map.clear_collection(cls.get_collection_name())
 
     def get_indexes(self, cls):
         ''' Get the index information for the collection associated with
         `cls`.  Index information is returned in the same format as *pymongo*.
         '''
-        return self.db[cls.get_collection_name()].index_information()
+        return self.backend[cls.get_collection_name()].index_information()
 
     def clear(self):
         ''' Clear the queue of database operations without executing any of
              the pending operations'''
         self.queue = []
+        self.__new_items = {}
 
     def clear_collection(self, *classes):
         ''' Clear all objects from the collections associated with the
             objects in `*cls`. **use with caution!**'''
         for c in classes:
-            self.db[c.get_collection_name()].remove()
+            self.__observe('remove', c, {}, None, None, _affected,
+                self.backend[c.get_collection_name()].remove)
 
     def flush(self, safe=None):
-        ''' Perform all database operations currently in the queue'''
+        ''' Perform all database operations currently in the queue.  With
+            ``autoflush`` each item is saved on its own.  Otherwise new
+            queued items (those given an ``_id`` by :func:`insert`) are
+            grouped by collection and inserted ``insert_batch_size``
+            documents at a time, and other items are saved on their own.
+            An item queued more than once is written once.'''
         if safe is None:
             safe = self.safe
-        for index, item in enumerate(self.queue):
-            try:
-                item.commit(self.db, safe=safe)
-            except:
-                self.clear()
-                raise
+        items = _unique(self.queue)
+        event = None
+        if items and self.__observed():
+            event = self._begin_event('flush', 'flush', None)
+        try:
+            if self.autoflush:
+                for item in items:
+                    item.commit(self.backend, safe=safe)
+            else:
+                self.__insert_batches(items, safe)
+        except Exception as e:
+            # The listeners get the queue, part of which may have been written
+            if event is not None:
+                self._end_event('flush', event, error=e)
+            self.clear()
+            raise
+        if event is not None:
+            self._end_event('flush', event, len(items))
+        if metrics.active is not None and items:
+            metrics.active.flushed(items)
+        if self.identity_map is not None:
+            for item in items:
+                self.identity_map.add(item)
         self.clear()
 
+    def __insert_batches(self, items, safe):
+        by_collection = {}
+        saved = []
+        for item in items:
+            if id(item) in self.__new_items:
+                by_collection.setdefault(item.get_collection_name(), []).append(item)
+            else:
+                # Loaded (or explicitly identified) documents may already be
+                # in the database, so they are replaced rather than inserted
+                saved.append(item)
+
+        for name, items in by_collection.items():
+            collection = self.backend[name]
+            for cls in set(type(item) for item in items):
+                self.__auto_ensure_indexes(cls, collection)
+
+            for start in range(0, len(items), self.insert_batch_size):
+                batch = items[start:start + self.insert_batch_size]
+                for item in batch:
+                    item.precommit(self.backend)
+                values = [item.wrap() for item in batch]
+                ids = collection.insert([raw.writable(collection, value)
+                    for value in values], safe=safe)
+                for item, value, mongo_id in zip(batch, values, ids):
+                    item.mongo_id = mongo_id
+                    # Written through to the document cache, as by commit
+                    if cache.document_cache is not None:
+                        if not isinstance(value, raw.RawDocument):
+                            value['_id'] = mongo_id
+                        cache.document_cache.put(
+                            (self.backend.name, collection.name), value)
+
+        for item in saved:
+            item.commit(self.backend, safe=safe)
+
 
     def __enter__(self):
         return self
@@ -310,3 +803,81 @@ class Session(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.end()
         return False
+
+
+def _unique(items):
+    # items without the repeated ones, in order
+    seen = set()
+    unique = []
+    for item in items:
+        if id(item) not in seen:
+            seen.add(id(item))
+            unique.append(item)
+    return unique
+
+def _affected(status):
+    # The number of documents affected by a write, if it was safe
+    if isinstance(status, dict):
+        return status.get('n')
+    return None
+
+def _found(value):
+    return 0 if value is None else 1
+
+
+class ObservedQueryResult(QueryResult):
+    ''' The :class:`~mongoalchemy.query.QueryResult` of a session with
+        listeners.  It counts the results and calls the ``after_query``
+        listeners when they have all been read, or when the result is closed
+        or dropped before that.'''
+    event = None
+    returned = 0
+
+    def __next__(self):
+        try:
+            value = super(ObservedQueryResult, self).__next__()
+        except StopIteration:
+            self.__finish()
+            raise
+        except Exception as e:
+            self.__finish(e)
+            raise
+        self.returned += 1
+        return value
+
+    def __getitem__(self, index):
+        try:
+            value = super(ObservedQueryResult, self).__getitem__(index)
+        except Exception as e:
+            self.__finish(e)
+            raise
+        self.returned += 1
+        return value
+
+    def close(self):
+        self.__finish()
+        super(ObservedQueryResult, self).close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __finish(self, error=None):
+        event, self.event = self.event, None
+        if event is not None:
+            event.session._end_event('query', event, self.returned, error)
+
+
+class ObservedProfiledQueryResult(ObservedQueryResult, ProfiledQueryResult):
+    ''' The result of a profiled query on a session with listeners '''
+    pass
+
+# The result class for (has listeners, is profiled)
+_result_classes = {
+    (False, False) : QueryResult,
+    (True, False) : ObservedQueryResult,
+    (False, True) : ProfiledQueryResult,
+    (True, True) : ObservedProfiledQueryResult,
+}
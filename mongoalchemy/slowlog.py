@@ -0,0 +1,211 @@
+# The MIT License
+#
+# Copyright (c) 2010 Jeffrey Jenkins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' A log of slow database operations.  A :class:`SlowQueryLog` is attached
+    to one or more sessions and records every query, update, find and modify
+    and remove which takes longer than its threshold::
+
+        slow_log = SlowQueryLog(threshold=0.2, path='/var/log/app/slow.log')
+        slow_log.attach(session)
+
+    Each entry is a dictionary which is either passed to ``callback`` or
+    written to ``path`` as a line of JSON.  The file is rotated when it grows
+    past ``max_bytes``.  Entries have the keys:
+
+        * ``time``: the wall clock time the operation started at
+        * ``operation``: ``query``, ``update``, ``find_and_modify`` or ``remove``
+        * ``collection``: the collection name
+        * ``spec``: the (flattened) query document
+        * ``sort``, ``hints``, ``fields``, ``limit``, ``skip``: the query \
+            options, when the operation came from a \
+            :class:`~mongoalchemy.query.Query`
+        * ``update``: the update document of updates
+        * ``duration``: how long the operation took, in seconds
+        * ``count``: the number of documents returned or affected
+        * ``explain``: the output of ``cursor.explain()`` for the spec, or \
+            ``None`` if explains are being rate limited
+        * ``full_scan``: whether the plan scanned the whole collection
+        * ``scan_ratio``: documents scanned per document returned
+        * ``inefficient``: whether ``scan_ratio`` is at least the \
+            ``scan_ratio`` of the log
+
+    Explains are run on the session's backend after the slow operation.  At
+    most one is run every ``explain_interval`` seconds, so that a burst of
+    slow operations doesn't add a burst of expensive explains to an already
+    struggling server.
+'''
+
+import json
+import logging
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+
+class SlowQueryLog(object):
+
+    def __init__(self, threshold=0.1, path=None, callback=None,
+            max_bytes=10 * 1024 * 1024, backup_count=5, explain=True,
+            explain_interval=1.0, scan_ratio=10):
+        '''
+        :param threshold: the duration, in seconds, above which an \
+            operation is logged
+        :param path: the file to write entries to
+        :param callback: a function called with each entry.  At least one \
+            of ``path`` and ``callback`` must be given
+        :param max_bytes: the size at which the file is rotated
+        :param backup_count: the number of rotated files to keep
+        :param explain: whether to capture explain output
+        :param explain_interval: the minimum number of seconds between \
+            two explains
+        :param scan_ratio: the ratio of scanned to returned documents from \
+            which a plan is flagged as ``inefficient``
+        '''
+        if path is None and callback is None:
+            raise TypeError('SlowQueryLog needs a path or a callback')
+        self.threshold = threshold
+        self.callback = callback
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.scan_ratio = scan_ratio
+        self.handler = None
+        if path is not None:
+            self.handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                backupCount=backup_count)
+            self.handler.setFormatter(logging.Formatter('%(message)s'))
+        self.__lock = threading.Lock()
+        self.__last_explain = None
+
+    def attach(self, session):
+        ''' Start logging the slow operations of ``session`` '''
+        session.add_listener(after_query=self.after_operation,
+            after_write=self.after_operation)
+
+    def detach(self, session):
+        ''' Stop logging the slow operations of ``session`` '''
+        session.remove_listener(after_query=self.after_operation,
+            after_write=self.after_operation)
+
+    def close(self):
+        ''' Close the log file '''
+        if self.handler is not None:
+            self.handler.close()
+
+    def after_operation(self, event):
+        ''' The session listener.  Logs ``event`` if it was too slow '''
+        if event.duration < self.threshold or event.error is not None:
+            return
+        entry = self.entry(event)
+        if self.callback is not None:
+            self.callback(entry)
+        if self.handler is not None:
+            self.handler.handle(logging.makeLogRecord({
+                'msg' : json.dumps(entry, default=str, sort_keys=True)}))
+
+    def entry(self, event):
+        ''' Returns the log entry for the :class:`~mongoalchemy.session.SessionEvent`
+            ``event`` '''
+        entry = {
+            'time' : event.started,
+            'operation' : event.operation,
+            'collection' : event.collection,
+            'spec' : event.spec,
+            'duration' : event.duration,
+            'count' : event.count,
+        }
+        query = event.query
+        if query is not None:
+            entry['sort'] = query.sort
+            entry['hints'] = query.hints
+            entry['fields'] = [str(f) for f in query.get_fields()] \
+                if query.get_fields() else None
+            entry['limit'] = query.get_limit()
+            entry['skip'] = query.get_skip()
+        if event.document is not None:
+            entry['update'] = event.document
+
+        explain = None
+        if self.explain and self.__may_explain():
+            explain = self.run_explain(event)
+        entry['explain'] = explain
+        entry.update(plan_flags(explain, self.scan_ratio))
+        return entry
+
+    def __may_explain(self):
+        with self.__lock:
+            now = time.time()
+            if self.__last_explain is not None and \
+                    now - self.__last_explain < self.explain_interval:
+                return False
+            self.__last_explain = now
+            return True
+
+    def run_explain(self, event):
+        ''' Returns the explain output for the spec (and query options) of
+            ``event``, or ``None`` if it could not be explained '''
+        cursor = event.session.backend[event.collection].find(event.spec or {})
+        query = event.query
+        if query is not None:
+            if query.sort:
+                cursor.sort(query.sort)
+            if query.hints:
+                cursor.hint(query.hints)
+            if event.operation == 'query':
+                if query.get_limit() is not None:
+                    cursor.limit(query.get_limit())
+                if query.get_skip() is not None:
+                    cursor.skip(query.get_skip())
+        try:
+            return cursor.explain()
+        except Exception:
+            return None
+
+
+def plan_flags(explain, scan_ratio=10):
+    ''' Returns the ``full_scan``, ``scan_ratio`` and ``inefficient`` entries
+        for the ``explain`` output (in the MongoDB 2.x format, or with
+        ``queryPlanner`` and ``executionStats`` from later servers) '''
+    if explain is None:
+        return {'full_scan' : None, 'scan_ratio' : None, 'inefficient' : None}
+    if 'queryPlanner' in explain:
+        full_scan = _has_stage(explain['queryPlanner'].get('winningPlan', {}), 'COLLSCAN')
+        stats = explain.get('executionStats', {})
+        scanned = stats.get('totalDocsExamined', 0)
+        returned = stats.get('nReturned', 0)
+    else:
+        full_scan = str(explain.get('cursor', '')).startswith('BasicCursor')
+        scanned = explain.get('nscanned', 0)
+        returned = explain.get('n', 0)
+    ratio = float(scanned) / max(returned, 1)
+    return {
+        'full_scan' : full_scan,
+        'scan_ratio' : ratio,
+        'inefficient' : ratio >= scan_ratio,
+    }
+
+def _has_stage(plan, stage):
+    if plan.get('stage') == stage:
+        return True
+    children = plan.get('inputStages', [])
+    if 'inputStage' in plan:
+        children = children + [plan['inputStage']]
+    return any(_has_stage(child, stage) for child in children)
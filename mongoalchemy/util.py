@@ -20,6 +20,9 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import asyncio
+import functools
+
 def classproperty(fun):
     class Descriptor(property):
         def __get__(self, instance, owner):
@@ -35,3 +38,21 @@ class UNSET(object):
         return False
 UNSET = UNSET()
 
+
+def loading_method(base, name):
+    ''' Returns the method ``name`` of ``base`` for a lazily loaded subclass
+        of ``base``: it calls ``self._load()`` before the original method '''
+    method = getattr(base, name)
+    def loading(self, *args, **kwargs):
+        self._load()
+        return method(self, *args, **kwargs)
+    loading.__name__ = name
+    return loading
+
+
+def run_in_executor(executor, fun, *args, **kwargs):
+    ''' Returns an awaitable for the result of ``fun(*args, **kwargs)`` run in
+        ``executor`` (or the default executor of the running event loop if it
+        is ``None``) '''
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor, functools.partial(fun, *args, **kwargs))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Compares the generic Document wrap/unwrap code with the compiled codecs from
+:mod:`mongoalchemy.codec` on a wide and on a nested document.
+
+Usage: python scripts/benchmark_codec.py [repetitions]
+
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mongoalchemy.document import Document, DocumentField
+from mongoalchemy.fields import *
+
+
+WIDTH = 60
+
+
+def wide_class(name, compiled):
+    attrs = {'config_compiled_codec' : compiled}
+    for i in range(WIDTH):
+        kind = i % 6
+        if kind == 0:
+            attrs['f%d' % i] = StringField(max_length=100)
+        elif kind == 1:
+            attrs['f%d' % i] = IntField(min_value=0)
+        elif kind == 2:
+            attrs['f%d' % i] = FloatField()
+        elif kind == 3:
+            attrs['f%d' % i] = BoolField()
+        elif kind == 4:
+            attrs['f%d' % i] = DateTimeField()
+        else:
+            attrs['f%d' % i] = ListField(IntField())
+    return type(name, (Document,), attrs)
+
+
+def wide_values():
+    values = {}
+    for i in range(WIDTH):
+        kind = i % 6
+        values['f%d' % i] = ['some string', i, i / 3.0, True,
+            datetime(2011, 1, 1), list(range(10))][kind]
+    return values
+
+
+def nested_classes(prefix, compiled):
+    Leaf = type(prefix + 'Leaf', (Document,), {
+        'config_compiled_codec' : compiled,
+        'name' : StringField(),
+        'value' : FloatField(),
+        'tags' : SetField(StringField()),
+    })
+    Node = type(prefix + 'Node', (Document,), {
+        'config_compiled_codec' : compiled,
+        'name' : StringField(),
+        'leaves' : ListField(DocumentField(Leaf)),
+        'counts' : DictField(IntField()),
+    })
+    Root = type(prefix + 'Root', (Document,), {
+        'config_compiled_codec' : compiled,
+        'title' : StringField(),
+        'nodes' : ListField(DocumentField(Node)),
+        'main' : DocumentField(Node),
+    })
+    return Leaf, Node, Root
+
+
+def nested_doc(classes):
+    Leaf, Node, Root = classes
+    def node(n):
+        return Node(name='node %d' % n,
+            leaves=[Leaf(name='leaf %d' % i, value=i * 1.5, tags=set(['a', 'b']))
+                for i in range(10)],
+            counts=dict(('k%d' % i, i) for i in range(10)))
+    return Root(title='root', nodes=[node(n) for n in range(5)], main=node(99))
+
+
+def bench(label, fun, number):
+    seconds = min(timeit.repeat(fun, number=number, repeat=3))
+    print('%-32s %10.1f us/op' % (label, seconds / number * 1e6))
+    return seconds
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    GenericWide = wide_class('GenericWide', False)
+    CompiledWide = wide_class('CompiledWide', True)
+    generic_doc = GenericWide(**wide_values())
+    compiled_doc = CompiledWide(**wide_values())
+    son = generic_doc.wrap()
+    assert compiled_doc.wrap() == son
+
+    print('Wide document (%d fields), %d iterations' % (WIDTH, number))
+    g = bench('  generic wrap', generic_doc.wrap, number)
+    c = bench('  compiled wrap', compiled_doc.wrap, number)
+    print('  speedup: %.1fx' % (g / c))
+    g = bench('  generic unwrap', lambda: GenericWide.unwrap(son), number)
+    c = bench('  compiled unwrap', lambda: CompiledWide.unwrap(son), number)
+    print('  speedup: %.1fx' % (g / c))
+
+    number = max(1, number // 10)
+    generic_doc = nested_doc(nested_classes('Generic', False))
+    compiled_classes = nested_classes('Compiled', True)
+    compiled_doc = nested_doc(compiled_classes)
+    son = generic_doc.wrap()
+    assert compiled_doc.wrap() == son
+    GenericRoot = type(generic_doc)
+    CompiledRoot = compiled_classes[2]
+
+    print('Nested document (6 x 10 subdocuments), %d iterations' % number)
+    g = bench('  generic wrap', generic_doc.wrap, number)
+    c = bench('  compiled wrap', compiled_doc.wrap, number)
+    print('  speedup: %.1fx' % (g / c))
+    g = bench('  generic unwrap', lambda: GenericRoot.unwrap(son), number)
+    c = bench('  compiled unwrap', lambda: CompiledRoot.unwrap(son), number)
+    print('  speedup: %.1fx' % (g / c))
+
+
+if __name__ == '__main__':
+    main()
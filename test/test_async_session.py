@@ -0,0 +1,107 @@
+from nose.tools import *
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from mongoalchemy.async_session import AsyncSession
+from mongoalchemy.document import Document
+from mongoalchemy.fields import *
+from mongoalchemy.memory import MemoryBackend
+from mongoalchemy.query import QueryResult
+from test.util import get_memory_session
+
+class A(Document):
+    i = IntField()
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def get_session(**kwargs):
+    return get_memory_session(session_class=AsyncSession, **kwargs)
+
+def test_insert_and_iterate():
+    async def main():
+        s = get_session()
+        async with s:
+            for i in range(5):
+                await s.insert(A(i=i))
+            return [a.i async for a in s.query(A).filter(A.i > 1).ascending(A.i)]
+    eq_(run(main()), [2, 3, 4])
+
+def test_runs_in_executor():
+    threads = set()
+    class Backend(MemoryBackend):
+        def __getitem__(self, name):
+            threads.add(threading.current_thread())
+            return MemoryBackend.__getitem__(self, name)
+    async def main():
+        s = AsyncSession(Backend())
+        await s.insert(A(i=1))
+        eq_([a.i async for a in s.query(A)], [1])
+        await s.close()
+    run(main())
+    assert threading.current_thread() not in threads
+
+def test_batches():
+    async def main():
+        s = get_session()
+        s.session.autoflush = False
+        for i in range(250):
+            await s.insert(A(i=i))
+        await s.flush()
+        result = await s.run(s.session.execute_query, s.query(A))
+        result.async_batch_size = 100
+        values = [a.i async for a in result]
+        eq_(values, list(range(250)))
+    run(main())
+
+def test_update_remove_find_and_modify():
+    async def main():
+        s = get_session()
+        a = A(i=1)
+        await s.insert(a)
+        a.i = 2
+        await s.update(a)
+        eq_((await s.run(s.query(A).one)).i, 2)
+        await s.execute(s.query(A).filter(A.i == 2).inc(A.i, 1))
+        b = await s.find_and_modify(s.query(A).find_and_modify(new=True).inc(A.i, 1))
+        eq_(b.i, 4)
+        await s.remove(b)
+        eq_(await s.run(s.query(A).count), 0)
+        await s.insert(A(i=5))
+        await s.execute(s.remove_query(A).filter(A.i == 5))
+        eq_(await s.run(s.query(A).count), 0)
+    run(main())
+
+def test_wrap_session():
+    executor = ThreadPoolExecutor(max_workers=1)
+    session = get_memory_session(identity_map=True)
+    async def main():
+        s = AsyncSession(session, executor=executor)
+        a = A(i=1)
+        await s.insert(a)
+        eq_([x async for x in s.query(A)], [a])
+        assert [x async for x in s.query(A)][0] is a
+    run(main())
+    executor.shutdown()
+
+def test_error_after_batch():
+    async def main():
+        s = get_session()
+        backend = s.backend
+        backend['A'].insert([{'i' : 1}, {'i' : 'x'}])
+        seen = []
+        try:
+            async for a in s.query(A):
+                seen.append(a.i)
+            assert False
+        except BadValueException:
+            pass
+        eq_(seen, [1])
+    run(main())
+
+def test_sync_session_async_for():
+    s = get_memory_session()
+    s.insert(A(i=3))
+    async def main():
+        return [a.i async for a in s.query(A)]
+    eq_(run(main()), [3])
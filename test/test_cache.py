@@ -0,0 +1,309 @@
+from nose.tools import *
+from pymongo.errors import DuplicateKeyError
+from mongoalchemy.session import Session
+from mongoalchemy.document import Document, Index
+from mongoalchemy.fields import *
+from mongoalchemy.memory import MemoryBackend
+from mongoalchemy.cache import QueryCache, CachedCursor
+from test.util import get_memory_session
+
+class C(Document):
+    i = IntField()
+    l = ListField(IntField())
+
+class D(Document):
+    i = IntField()
+
+class U(Document):
+    i = IntField()
+    i_index = Index().ascending('i').unique()
+
+class Clock(object):
+    now = 0.0
+    def __call__(self):
+        return self.now
+
+def get_session(cache, backend=None, **kwargs):
+    s = get_memory_session(backend, cache=cache, **kwargs)
+    for i in range(3):
+        s.insert(C(i=i, l=[i]))
+    return s
+
+def test_hit():
+    cache = QueryCache()
+    try:
+        s = get_session(cache)
+        eq_([c.i for c in s.query(C).filter(C.i > 0)], [1, 2])
+        assert isinstance(iter(s.query(C).filter(C.i > 0)).cursor, CachedCursor)
+        eq_([c.i for c in s.query(C).filter(C.i > 0)], [1, 2])
+        eq_(s.query(C).filter(C.i > 0).count(), 2)
+        stats = cache.stats()
+        eq_((stats.entries, stats.hits, stats.stores), (1, 3, 1))
+        assert not isinstance(iter(s.query(C).filter(C.i > 1)).cursor, CachedCursor)
+        assert not isinstance(iter(s.query(C).filter(C.i > 0).limit(1)).cursor, CachedCursor)
+    finally:
+        cache.close()
+
+def test_partial_reads_are_not_cached():
+    cache = QueryCache()
+    try:
+        s = get_session(cache)
+        s.query(C).first()
+        eq_(cache.stats().stores, 0)
+        s.query(C).all()
+        eq_(cache.stats().stores, 1)
+    finally:
+        cache.close()
+
+def test_results_are_copies():
+    cache = QueryCache()
+    try:
+        s = get_session(cache)
+        s.query(C).filter(C.i == 1).one().l.append(5)
+        eq_(s.query(C).filter(C.i == 1).one().l, [1])
+        s.query(C).filter(C.i == 1).one().l.append(5)
+        eq_(s.query(C).filter(C.i == 1).one().l, [1])
+    finally:
+        cache.close()
+
+def test_not_cached():
+    cache = QueryCache()
+    try:
+        s = get_session(cache)
+        s.query(C).cached(False).all()
+        eq_(cache.stats().stores, 0)
+        s.query(C).all()
+        assert not isinstance(iter(s.query(C).cached(False)).cursor, CachedCursor)
+    finally:
+        cache.close()
+
+def test_write_invalidation():
+    cache = QueryCache()
+    try:
+        backend = MemoryBackend()
+        s = get_session(cache, backend)
+        other = Session(backend, cache=cache)
+        query = lambda: sorted(c.i for c in s.query(C))
+        eq_(query(), [0, 1, 2])
+        other.query(C).filter(C.i == 2).set(C.i, 3).execute()
+        eq_(query(), [0, 1, 3])
+        other.insert(C(i=4, l=[]))
+        eq_(query(), [0, 1, 3, 4])
+        other.remove(other.query(C).filter(C.i == 4).one())
+        eq_(query(), [0, 1, 3])
+        other.query(C).filter(C.i == 3).find_and_modify().set(C.i, 2).execute()
+        eq_(query(), [0, 1, 2])
+        other.remove_query(C).filter(C.i == 2).execute()
+        eq_(query(), [0, 1])
+        eq_(cache.stats().invalidations, 6)
+    finally:
+        cache.close()
+
+def test_partly_failed_flush_invalidation():
+    cache = QueryCache()
+    try:
+        s = get_memory_session(cache=cache, autoflush=False, insert_batch_size=1)
+        s.insert(U(i=0))
+        eq_([u.i for u in s.query(U)], [0])
+        s.insert(U(i=1))
+        s.insert(U(i=1))
+        assert_raises(DuplicateKeyError, s.flush)
+        eq_(sorted(u.i for u in s.query(U)), [0, 1])
+    finally:
+        cache.close()
+
+def test_invalidation_is_per_collection():
+    cache = QueryCache()
+    try:
+        s = get_session(cache)
+        s.query(C).all()
+        get_memory_session().insert(C(i=5, l=[]))
+        eq_(cache.stats().entries, 1)
+        s.insert(D(i=1))
+        eq_(cache.stats().entries, 1)
+    finally:
+        cache.close()
+
+def test_stale_results_are_not_stored():
+    cache = QueryCache()
+    try:
+        s = get_session(cache)
+        result = iter(s.query(C))
+        next(result)
+        s.query(C).filter(C.i == 0).set(C.i, 5).execute()
+        list(result)
+        eq_(cache.stats().stores, 0)
+    finally:
+        cache.close()
+
+def test_ttl():
+    clock = Clock()
+    cache = QueryCache(ttl=10, clock=clock)
+    try:
+        s = get_session(cache)
+        s.query(C).all()
+        clock.now = 9
+        s.query(C).all()
+        eq_(cache.stats().hits, 1)
+        clock.now = 10
+        s.query(C).all()
+        stats = cache.stats()
+        eq_((stats.hits, stats.expirations, stats.stores), (1, 1, 2))
+    finally:
+        cache.close()
+
+def test_lru():
+    cache = QueryCache(max_entries=2)
+    try:
+        s = get_session(cache)
+        for i in (0, 1, 0, 2):
+            s.query(C).filter(C.i == i).all()
+        stats = cache.stats()
+        eq_((stats.entries, stats.evictions, stats.hits), (2, 1, 1))
+        s.query(C).filter(C.i == 0).all()
+        eq_(cache.stats().hits, 2)
+        s.query(C).filter(C.i == 1).all()
+        eq_(cache.stats().hits, 2)
+    finally:
+        cache.close()
+
+def test_max_result_size():
+    cache = QueryCache(max_result_size=2)
+    try:
+        s = get_session(cache)
+        s.query(C).all()
+        s.query(C).limit(2).all()
+        eq_(cache.stats().stores, 1)
+    finally:
+        cache.close()
+
+def test_close():
+    cache = QueryCache()
+    s = get_session(cache)
+    s.query(C).all()
+    cache.close()
+    eq_(cache.stats().entries, 0)
+    eq_(s._Session__listeners, None)
+
+def test_only_sessions_using_the_cache_listen():
+    cache = QueryCache()
+    try:
+        s = get_session(cache)
+        other = get_memory_session(s.backend)
+        eq_(other._Session__listeners, None)
+        from mongoalchemy import session
+        eq_(session._global_listeners, None)
+        s.query(C).all()
+        s.query(C).filter(C.i == 0).set(C.i, 5).execute()
+        eq_(cache.stats().entries, 0)
+    finally:
+        cache.close()
+
+# Document cache
+
+from mongoalchemy.cache import enable_document_cache, disable_document_cache, DocumentCache
+from mongoalchemy import cache as cache_module
+
+def test_document_cache():
+    documents = enable_document_cache()
+    try:
+        s = get_session(None)
+        eq_(documents.stats().entries, 3)
+        c = s.query(C).filter(C.i == 1).one()
+        result = iter(s.query(C).filter(C.mongo_id == c.mongo_id))
+        assert isinstance(result.cursor, CachedCursor)
+        loaded = next(result)
+        eq_((loaded.i, loaded.l), (1, [1]))
+        loaded.l.append(2)
+        eq_(s.query(C).filter(C.mongo_id == c.mongo_id).one().l, [1])
+        assert documents.stats().size > 0
+
+        documents.clear()
+        assert not isinstance(iter(s.query(C).filter(C.mongo_id == c.mongo_id)).cursor, CachedCursor)
+        eq_(s.query(C).filter(C.mongo_id == c.mongo_id).one().i, 1)
+        eq_(documents.stats().entries, 1)
+        assert isinstance(iter(s.query(C).filter(C.mongo_id == c.mongo_id)).cursor, CachedCursor)
+    finally:
+        disable_document_cache()
+    assert cache_module.document_cache is None
+
+def test_document_cache_shared_by_sessions():
+    backend = MemoryBackend()
+    s = get_session(None, backend)
+    documents = enable_document_cache()
+    try:
+        id = s.query(C).filter(C.i == 2).one().mongo_id
+        s.query(C).filter(C.mongo_id == id).one()
+        eq_(Session(backend).query(C).filter(C.mongo_id == id).one().i, 2)
+        eq_(documents.stats().hits, 1)
+        eq_(get_memory_session().query(C).filter(C.mongo_id == id).first(), None)
+    finally:
+        disable_document_cache()
+
+def test_document_cache_writes():
+    documents = enable_document_cache()
+    try:
+        s = get_session(None)
+        documents.clear()
+        c = s.query(C).filter(C.i == 0).one()
+        by_id = lambda: s.query(C).filter(C.mongo_id == c.mongo_id).one()
+        by_id()
+        eq_(documents.stats().entries, 1)
+        c.i = 10
+        s.update(c)
+        eq_(documents.stats().entries, 0)
+        eq_(by_id().i, 10)
+        c.l = [3]
+        s.insert(c)
+        eq_(documents.stats().entries, 1)
+        eq_(by_id().l, [3])
+        s.query(C).filter(C.i == 10).set(C.i, 11).execute()
+        eq_(documents.stats().entries, 0)
+        eq_(by_id().i, 11)
+        s.remove(c)
+        eq_(documents.stats().entries, 0)
+        eq_(s.query(C).filter(C.mongo_id == c.mongo_id).first(), None)
+    finally:
+        disable_document_cache()
+
+def test_document_cache_batch_inserts():
+    documents = enable_document_cache()
+    try:
+        s = get_memory_session(autoflush=False)
+        c = C(i=1, l=[])
+        s.insert(c)
+        s.insert(C(i=2, l=[]))
+        s.flush()
+        eq_(documents.stats().entries, 2)
+        assert isinstance(iter(s.query(C).filter(C.mongo_id == c.mongo_id)).cursor, CachedCursor)
+        eq_(s.query(C).filter(C.mongo_id == c.mongo_id).one().i, 1)
+    finally:
+        disable_document_cache()
+
+def test_document_cache_budget():
+    documents = DocumentCache(max_bytes=150)
+    namespace = ('db', 'c')
+    documents.put(namespace, {'_id' : 1, 's' : 'x' * 40})
+    documents.put(namespace, {'_id' : 2, 's' : 'x' * 40})
+    documents.get(namespace, 1)
+    documents.put(namespace, {'_id' : 3, 's' : 'x' * 40})
+    eq_(documents.get(namespace, 2), None)
+    eq_(documents.get(namespace, 1)['s'], 'x' * 40)
+    stats = documents.stats()
+    eq_((stats.entries, stats.evictions), (2, 1))
+    assert stats.size <= 150
+    documents.put(namespace, {'_id' : 4, 's' : 'x' * 200})
+    eq_(documents.get(namespace, 4), None)
+
+def test_document_cache_only_for_id_lookups():
+    documents = enable_document_cache()
+    try:
+        s = get_session(None)
+        documents.clear()
+        id = s.query(C).filter(C.i == 2).one().mongo_id
+        s.query(C).filter(C.mongo_id == id).fields(C.i).one()
+        s.query(C).filter(C.mongo_id.in_(id)).one()
+        s.query(C).filter(C.mongo_id == id, C.i == 2).one()
+        eq_(documents.stats().entries, 0)
+    finally:
+        disable_document_cache()
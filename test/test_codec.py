@@ -0,0 +1,90 @@
+from nose.tools import *
+from datetime import datetime
+from mongoalchemy.document import Document, DocumentField
+from mongoalchemy.codec import get_codec
+from mongoalchemy.exceptions import ExtraValueException
+from mongoalchemy.fields import *
+
+class Inner(Document):
+    config_compiled_codec = True
+    i = IntField(min_value=0)
+
+class Wide(Document):
+    config_compiled_codec = True
+    s = StringField(max_length=5)
+    i = IntField(required=False)
+    f = FloatField(required=False)
+    b = BoolField(required=False)
+    dt = DateTimeField(required=False)
+    a = AnythingField(required=False)
+    n = IntField(allow_none=True, required=False)
+    l = ListField(IntField(), required=False)
+    st = SetField(StringField(), required=False)
+    d = DictField(FloatField(), required=False)
+    e = EnumField(StringField(), 'x', 'y', required=False)
+    v = IntField(validator=lambda x: x != 3, required=False)
+    sub = DocumentField(Inner, required=False)
+    subs = ListField(DocumentField(Inner), required=False)
+    c = IntField(required=False, db_field='cc')
+
+def wide():
+    return Wide(s='abc', i=1, f=1.5, b=True, dt=datetime(2011, 1, 1),
+        a={'x' : [1]}, l=[1, 2], st=set(['q']), d={'k' : 2.5}, e='x', v=4,
+        sub=Inner(i=1), subs=[Inner(i=2), Inner(i=3)], c=7)
+
+def test_wrap_matches_generic():
+    w = wide()
+    assert w.wrap() == w._wrap()
+    assert list(w.wrap().keys()) == list(w._wrap().keys())
+
+def test_unwrap_matches_generic():
+    son = wide()._wrap()
+    compiled = Wide.unwrap(son)
+    generic = Wide._unwrap(son)
+    for name in Wide.get_fields():
+        if name in generic._field_values:
+            assert getattr(compiled, name).__class__ == getattr(generic, name).__class__
+    assert compiled.wrap() == generic.wrap()
+    assert compiled._dirty == {}
+    assert compiled.sub.i == 1 and compiled.subs[1].i == 3
+    assert compiled.st == set(['q'])
+
+def test_unwrap_none():
+    w = Wide.unwrap({'s' : 'abc', 'n' : None})
+    assert w.n is None
+
+def test_unwrap_extra_fields_fall_back():
+    w = Wide.unwrap({'s' : 'abc', 'cc' : 1})
+    assert w.c == 1
+
+@raises(ExtraValueException)
+def test_unwrap_extra_field_error():
+    Wide.unwrap({'s' : 'abc', 'zz' : 1})
+
+@raises(BadValueException)
+def test_unwrap_bad_value():
+    Wide.unwrap({'s' : 'too long'})
+
+@raises(BadValueException)
+def test_unwrap_bad_subdocument():
+    Wide.unwrap({'s' : 'abc', 'subs' : [{'i' : -1}]})
+
+@raises(BadValueException)
+def test_unwrap_validator():
+    Wide.unwrap({'s' : 'abc', 'v' : 3})
+
+@raises(BadValueException)
+def test_wrap_bad_value():
+    w = wide()
+    w.i = 'a'
+    w.wrap()
+
+@raises(MissingValueException)
+def test_wrap_missing_value():
+    Wide().wrap()
+
+def test_codec_per_class():
+    class Sub(Inner):
+        j = IntField(required=False)
+    assert get_codec(Sub) is not get_codec(Inner)
+    assert Sub.unwrap({'i' : 1, 'j' : 2}).j == 2
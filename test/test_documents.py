@@ -382,3 +382,75 @@ def test_multiple_id_fields():
         b = IntField(db_field='_id')
 
 
+
+def test_schema():
+    schema = T._schema
+    assert [name for name, _ in schema.fields] == sorted(T.get_fields())
+    assert schema.db_fields['a'] == 'aa'
+    assert schema.names['aa'] == 'a'
+    assert schema.names['_id'] == 'mongo_id'
+    assert schema.collection_name == 'T'
+    assert schema.indexes == (T.index,)
+
+def test_trusted_unwrap():
+    class TrustDoc(Document):
+        i = IntField(min_value=0)
+        l = ListField(DocumentField(TestDoc))
+    bad = {'i' : -1, 'l' : [{'int1' : 1}]}
+    try:
+        TrustDoc.unwrap(bad)
+        assert False, 'untrusted unwrap did not validate'
+    except BadValueException:
+        pass
+    t = TrustDoc.unwrap(bad, trusted=True)
+    assert t.i == -1 and t.l[0].int1 == 1
+
+def test_trusted_unwrap_skips_validators():
+    calls = []
+    def validator(value):
+        calls.append(value)
+        return True
+    class TrustDoc2(Document):
+        config_trusted_unwrap = True
+        i = IntField(validator=validator)
+    TrustDoc2.unwrap({'i' : 1})
+    assert calls == []
+    TrustDoc2.unwrap({'i' : 1}, trusted=False)
+    assert calls
+
+def test_document_field_validators_run_once():
+    calls = []
+    def validator(value):
+        calls.append(value)
+        return True
+    class Inner(Document):
+        i = IntField(validator=validator)
+    class Outer(Document):
+        inner = DocumentField(Inner)
+        inners = ListField(DocumentField(Inner))
+    obj = {'inner' : {'i' : 1}, 'inners' : [{'i' : 2}, {'i' : 3}]}
+    o = Outer.unwrap(obj)
+    eq_(len(calls), 3)
+    eq_(o.wrap(), obj)
+    eq_(len(calls), 6)
+
+@raises(BadValueException)
+def test_document_field_unwrap_error():
+    class Inner2(Document):
+        i = IntField()
+    DocumentField(Inner2).unwrap({'i' : 'one'})
+
+def test_schema_follows_config_changes():
+    class Renamed(Document):
+        i = IntField()
+    class RenamedChild(Renamed):
+        pass
+    Renamed.config_collection_name = 'other'
+    eq_(Renamed.get_collection_name(), 'other')
+    eq_(RenamedChild.get_collection_name(), 'other')
+    class LaterChild(Renamed):
+        pass
+    eq_(LaterChild.get_collection_name(), 'other')
+    del Renamed.config_collection_name
+    eq_(Renamed.get_collection_name(), 'Renamed')
+    eq_(RenamedChild.get_collection_name(), 'RenamedChild')
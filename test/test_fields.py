@@ -57,6 +57,149 @@ def test_custom_validator():
     assert field.is_valid_unwrap(0) == True
     assert field.is_valid_unwrap(2) == False
 
+class ReprCounter(object):
+    reprs = 0
+    def __repr__(self):
+        ReprCounter.reprs += 1
+        return 'ReprCounter()'
+
+def test_check_wrap():
+    field = IntField(min_value=0)
+    assert field.check_wrap(1) is None
+    failure = field.check_wrap(-1)
+    assert isinstance(failure, ValidationFailure)
+    eq_(failure.value, -1)
+    assert isinstance(failure.exception(), BadValueException)
+    assert field.check_unwrap('1') is not None
+    assert field.check_unwrap(None) is not None
+    assert IntField(allow_none=True).check_unwrap(None) is None
+    assert IntField(validator=lambda x : x == 0).check_wrap(2) is not None
+
+def test_check_wrap_raising_field():
+    class OddField(IntField):
+        def validate_wrap(self, value):
+            if value % 2 == 0:
+                self._fail_validation(value, 'even')
+    assert OddField().check_wrap(1) is None
+    eq_(OddField().check_wrap(2).reason, 'even')
+    assert OddField().is_valid_unwrap(2) == False
+
+def test_failure_message_is_lazy():
+    value = ReprCounter()
+    ReprCounter.reprs = 0
+    assert IntField().is_valid_wrap(value) == False
+    assert ListField(IntField()).check_wrap_value(value) is not None
+    try:
+        IntField().wrap(value)
+        assert False
+    except BadValueException as e:
+        eq_(ReprCounter.reprs, 0)
+        assert 'ReprCounter()' in str(e)
+    eq_(ReprCounter.reprs, 1)
+
+def counting_validator(calls):
+    def validator(value):
+        calls.append(value)
+        return True
+    return validator
+
+def test_validator_runs_once():
+    calls = []
+    field = IntField(validator=counting_validator(calls))
+    field.wrap(1)
+    eq_(len(calls), 1)
+    field.unwrap(1)
+    eq_(len(calls), 2)
+
+def test_nested_validators_run_once():
+    item_calls = []
+    list_calls = []
+    field = ListField(ListField(IntField(validator=counting_validator(item_calls)),
+        validator=counting_validator(list_calls)))
+    value = [[1, 2], [3], [4, 5, 6]]
+    eq_(field.wrap(value), value)
+    eq_(len(item_calls), 6)
+    eq_(len(list_calls), 3)
+    eq_(field.unwrap(value), value)
+    eq_(len(item_calls), 12)
+    eq_(len(list_calls), 6)
+
+def test_nested_dict_validators_run_once():
+    calls = []
+    field = DictField(TupleField(IntField(validator=counting_validator(calls)),
+        StringField()))
+    value = {'a' : (1, 'x'), 'b' : (2, 'y')}
+    field.wrap(value)
+    eq_(len(calls), 2)
+    field.unwrap(field.wrap(value))
+    eq_(len(calls), 6)
+
+@raises(BadValueException)
+def test_nested_wrap_still_validates():
+    ListField(DictField(IntField())).wrap([{'a' : 1}, {'b' : 'not an int'}])
+
+def test_wrap_value_validates_once():
+    item_calls = []
+    list_calls = []
+    field = ListField(IntField(validator=counting_validator(item_calls)),
+        validator=counting_validator(list_calls))
+    eq_(field.wrap_value(1), 1)
+    eq_(len(item_calls), 1)
+    eq_(field.wrap_value([1, 2]), [1, 2])
+    eq_(len(item_calls), 3)
+    eq_(len(list_calls), 1)
+
+@raises(BadValueException)
+def test_wrap_value_still_validates():
+    ListField(IntField(validator=lambda x : x > 0)).wrap_value(-1)
+
+class UpperField(StringField):
+    def wrap(self, value):
+        return StringField.wrap(self, value).upper()
+
+def test_wrap_value_uses_overridden_wrap():
+    eq_(ListField(UpperField()).wrap_value('a'), 'A')
+    eq_(ListField(UpperField()).wrap_value(['a', 'b']), ['A', 'B'])
+
+class EvenListField(ListField):
+    def validate_wrap(self, value):
+        ListField._raw_validate_wrap(self, value)
+        if len(value) % 2:
+            self._fail_validation(value, 'odd number of elements')
+    def validate_unwrap(self, value):
+        ListField._raw_validate_unwrap(self, value)
+        if len(value) % 2:
+            self._fail_validation(value, 'odd number of elements')
+
+class EvenDictField(DictField):
+    def validate_wrap(self, value):
+        DictField._raw_validate_wrap(self, value)
+        if len(value) % 2:
+            self._fail_validation(value, 'odd number of keys')
+
+def test_overridden_container_validation():
+    field = EvenListField(IntField())
+    eq_(field.wrap([1, 2]), [1, 2])
+    eq_(field.unwrap([1, 2]), [1, 2])
+    assert_raises(BadValueException, field.wrap, [1])
+    assert_raises(BadValueException, field.unwrap, [1])
+    assert_raises(BadValueException, field.wrap, [1, 'a'])
+    field = EvenDictField(IntField())
+    eq_(field.wrap({'a' : 1, 'b' : 2}), {'a' : 1, 'b' : 2})
+    assert_raises(BadValueException, field.wrap, {'a' : 1})
+
+def test_overridden_container_validators_run_once():
+    calls = []
+    field = EvenListField(IntField(), validator=counting_validator(calls))
+    field.wrap([1, 2])
+    eq_(len(calls), 1)
+    field.unwrap([1, 2])
+    eq_(len(calls), 2)
+
+@raises(BadValueException)
+def test_nested_unwrap_still_validates():
+    KVField(StringField(), ListField(IntField(min_value=0))).unwrap([{'k' : 'a', 'v' : [-1]}])
+
 # String Tests
 @raises(BadValueException)
 def string_wrong_type_test():
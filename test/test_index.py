@@ -1,7 +1,8 @@
 from nose.tools import *
-from mongoalchemy.document import Document, Index, DocumentField
+from mongoalchemy.document import Document, Index, DocumentField, ensured_index_registry, \
+        forget_ensured_indexes
 from mongoalchemy.fields import *
-from test.util import known_failure, get_session
+from test.util import known_failure, get_session, get_memory_session
 
 class TestDoc(Document):
 
@@ -33,6 +34,40 @@ def test_indexes():
         for k, v in d.items():
             assert got[idx][k] == d[k]
 
+class NoAutoDoc(Document):
+    config_auto_ensure_indexes = False
+    int1 = IntField()
+    index_1 = Index().ascending('int1')
+
+def test_index_registry():
+    s = get_session()
+    s.clear_collection(TestDoc)
+    s.insert(TestDoc(int1=1, str1='d', str2='e', str3='f'))
+    name = s.db[TestDoc.get_collection_name()].full_name
+    ensured = [key for key in ensured_index_registry if key[0] == name]
+    assert len(ensured) == len(TestDoc.get_indexes())
+
+def test_forget_ensured_indexes():
+    s = get_memory_session()
+    collection = s.backend[TestDoc.get_collection_name()]
+    s.insert(TestDoc(int1=1, str1='a', str2='b', str3='c'))
+    assert 'str3_-1' in s.get_indexes(TestDoc)
+    forget_ensured_indexes(collection)
+    assert not [key for key in ensured_index_registry if key[0] == collection.full_name]
+    # Dropping the collection forgets its indexes too
+    s.insert(TestDoc(int1=2, str1='d', str2='e', str3='f'))
+    collection.drop()
+    s.insert(TestDoc(int1=3, str1='g', str2='h', str3='i'))
+    assert 'str3_-1' in s.get_indexes(TestDoc)
+
+def test_no_auto_ensure():
+    s = get_session()
+    s.db[NoAutoDoc.get_collection_name()].drop()
+    s.insert(NoAutoDoc(int1=1))
+    assert 'int1_1' not in s.get_indexes(NoAutoDoc)
+    s.ensure_indexes(NoAutoDoc)
+    assert 'int1_1' in s.get_indexes(NoAutoDoc)
+
 @known_failure
 @raises(Exception)
 def no_field_index_test():
@@ -0,0 +1,93 @@
+from nose.tools import *
+from copy import deepcopy
+from mongoalchemy.document import Document, DocumentField
+from mongoalchemy.fields import *
+from test.util import get_memory_session
+
+class Counted(IntField):
+    unwraps = 0
+    def unwrap(self, value):
+        Counted.unwraps += 1
+        return IntField.unwrap(self, value)
+
+class Inner(Document):
+    n = IntField()
+
+class L(Document):
+    a = IntField()
+    b = StringField(db_field='bb')
+    big = ListField(Counted())
+    inner = DocumentField(Inner)
+    d = DictField(IntField())
+
+def get_session():
+    s = get_memory_session()
+    s.insert(L(a=1, b='x', big=list(range(100)), inner=Inner(n=2), d={'k' : 3}))
+    Counted.unwraps = 0
+    return s
+
+def test_lazy_fields():
+    s = get_session()
+    doc = s.query(L).lazy().one()
+    eq_(set(doc._field_values.raw), set(['a', 'b', 'big', 'inner', 'd', 'mongo_id']))
+    eq_(doc.b, 'x')
+    assert 'b' not in doc._field_values.raw
+    eq_(len(doc._field_values.raw), 5)
+    eq_((doc.a, doc.inner.n, doc.d), (1, 2, {'k' : 3}))
+    eq_(doc.get_dirty_ops(), {})
+
+def test_lazy_list():
+    s = get_session()
+    big = s.query(L).lazy().one().big
+    eq_(Counted.unwraps, 0)
+    eq_(len(big), 100)
+    eq_((big[3], big[-1]), (3, 99))
+    eq_(Counted.unwraps, 2)
+    eq_(big[3], 3)
+    eq_(big[5:8], [5, 6, 7])
+    eq_(Counted.unwraps, 5)
+    eq_(sum(big), sum(range(100)))
+    eq_(Counted.unwraps, 100)
+
+def test_lazy_list_changes():
+    s = get_session()
+    big = s.query(L).lazy().one().big
+    big.append(100)
+    eq_(Counted.unwraps, 100)
+    eq_(big[-1], 100)
+    eq_(big, list(range(101)))
+    copied = deepcopy(s.query(L).lazy().one().big)
+    eq_(type(copied), list)
+    eq_(copied, list(range(100)))
+
+def test_lazy_update():
+    s = get_session()
+    doc = s.query(L).lazy().one()
+    doc.a = 5
+    eq_(doc.get_dirty_ops(), {'$set' : {'a' : 5}})
+    s.update(doc)
+    doc = s.query(L).lazy().one()
+    eq_(doc.wrap()['big'], list(range(100)))
+    s.insert(doc)
+    eq_(s.query(L).one().a, 5)
+
+def test_lazy_validation():
+    s = get_session()
+    s.backend['L'].update({}, {'$set' : {'a' : 5.0}})
+    doc = s.query(L).lazy().one()
+    eq_(doc.b, 'x')
+    assert_raises(BadValueException, getattr, doc, 'a')
+    eq_(s.query(L).lazy().trusted().one().a, 5)
+
+def test_lazy_partial():
+    s = get_session()
+    doc = s.query(L).lazy().fields(L.a, L.inner.n).one()
+    eq_((doc.a, doc.inner.n), (1, 2))
+    assert_raises(FieldNotRetrieved, getattr, doc, 'b')
+
+def test_lazy_identity_map():
+    s = get_memory_session(identity_map=True)
+    s.insert(L(a=1, b='x', big=[], inner=Inner(n=2), d={}))
+    s.identity_map.clear()
+    doc = s.query(L).lazy().one()
+    assert s.query(L).one() is doc
@@ -0,0 +1,183 @@
+from nose.tools import *
+import re
+from pymongo.errors import OperationFailure, DuplicateKeyError
+from mongoalchemy.document import Document, Index, DocumentField
+from mongoalchemy.fields import *
+from mongoalchemy.memory import MemoryBackend, matches, apply_update
+from test.util import get_memory_session
+
+
+def get_collection():
+    c = MemoryBackend()['test']
+    c.insert([
+        {'_id' : 1, 'name' : 'ann', 'age' : 30, 'tags' : ['a', 'b'],
+            'address' : {'city' : 'boston', 'zip' : '02134'},
+            'pets' : [{'kind' : 'cat', 'age' : 3}, {'kind' : 'dog', 'age' : 7}]},
+        {'_id' : 2, 'name' : 'bob', 'age' : 25, 'tags' : ['b'],
+            'address' : {'city' : 'nyc'}, 'pets' : []},
+        {'_id' : 3, 'name' : 'cat', 'age' : 35.5, 'tags' : [],
+            'pets' : [{'kind' : 'cat', 'age' : 1}]},
+    ])
+    return c
+
+def ids(c, spec, **kwargs):
+    return [d['_id'] for d in c.find(spec, **kwargs)]
+
+# Queries
+
+def test_equality():
+    c = get_collection()
+    eq_(ids(c, {'name' : 'bob'}), [2])
+    eq_(ids(c, {'tags' : 'b'}), [1, 2])
+    eq_(ids(c, {'tags' : ['b']}), [2])
+    eq_(ids(c, {'address.city' : 'boston'}), [1])
+    eq_(ids(c, {'pets.kind' : 'cat'}), [1, 3])
+    eq_(ids(c, {'address.zip' : None}), [2, 3])
+    eq_(ids(c, {'age' : 35.5, 'name' : 'cat'}), [3])
+
+def test_comparisons():
+    c = get_collection()
+    eq_(ids(c, {'age' : {'$gt' : 25}}), [1, 3])
+    eq_(ids(c, {'age' : {'$gte' : 25, '$lt' : 35}}), [1, 2])
+    eq_(ids(c, {'age' : {'$lte' : 25}}), [2])
+    eq_(ids(c, {'name' : {'$gt' : 5}}), [])
+    eq_(ids(c, {'pets.age' : {'$gt' : 5}}), [1])
+    eq_(ids(c, {'name' : {'$ne' : 'ann'}}), [2, 3])
+
+def test_in_nin():
+    c = get_collection()
+    eq_(ids(c, {'name' : {'$in' : ['ann', 'cat']}}), [1, 3])
+    eq_(ids(c, {'tags' : {'$in' : ['a']}}), [1])
+    eq_(ids(c, {'tags' : {'$nin' : ['b']}}), [3])
+    eq_(ids(c, {'name' : {'$in' : [re.compile('^b')]}}), [2])
+
+def test_logical():
+    c = get_collection()
+    eq_(ids(c, {'$or' : [{'name' : 'ann'}, {'age' : {'$gt' : 30}}]}), [1, 3])
+    eq_(ids(c, {'$and' : [{'tags' : 'b'}, {'age' : {'$lt' : 30}}]}), [2])
+    eq_(ids(c, {'age' : {'$not' : {'$gt' : 25}}}), [2])
+    eq_(ids(c, {'name' : {'$not' : re.compile('^a')}}), [2, 3])
+
+def test_regex():
+    c = get_collection()
+    eq_(ids(c, {'name' : re.compile('b')}), [2])
+    eq_(ids(c, {'name' : {'$regex' : '^A', '$options' : 'i'}}), [1])
+
+def test_array_operators():
+    c = get_collection()
+    eq_(ids(c, {'tags' : {'$size' : 1}}), [2])
+    eq_(ids(c, {'tags' : {'$all' : ['a', 'b']}}), [1])
+    eq_(ids(c, {'pets' : {'$elemMatch' : {'kind' : 'cat', 'age' : {'$gt' : 2}}}}), [1])
+    eq_(ids(c, {'address' : {'$exists' : False}}), [3])
+
+@raises(OperationFailure)
+def test_bad_operator():
+    get_collection().find({'age' : {'$bad' : 1}}).count()
+
+def test_cursor():
+    c = get_collection()
+    eq_(ids(c, {}, fields=['name']), [1, 2, 3])
+    eq_(c.find({}, fields=['name'])[0], {'_id' : 1, 'name' : 'ann'})
+    eq_(c.find({}, fields={'address.city' : True, '_id' : False})[1], {'address' : {'city' : 'nyc'}})
+    eq_([d['_id'] for d in c.find().sort([('age', -1)])], [3, 1, 2])
+    eq_([d['_id'] for d in c.find().sort([('age', 1)]).skip(1).limit(1)], [1])
+    eq_(c.find({'tags' : 'b'}).count(), 2)
+    eq_(c.find().skip(1).count(with_limit_and_skip=True), 2)
+    eq_(sorted(c.find().distinct('tags')), ['a', 'b'])
+    assert c.find().explain()['cursor'] == 'BasicCursor'
+
+def test_returned_documents_are_copies():
+    c = get_collection()
+    doc = c.find_one({'_id' : 1})
+    doc['tags'].append('c')
+    eq_(c.find_one({'_id' : 1})['tags'], ['a', 'b'])
+
+# Updates
+
+def test_update_operators():
+    doc = {'_id' : 1, 'n' : 1, 'l' : [1, 2, 3], 's' : {'a' : 1}}
+    eq_(apply_update(doc, {'$inc' : {'n' : 2}}, {})['n'], 3)
+    eq_(apply_update(doc, {'$set' : {'s.b.c' : 2}}, {})['s'], {'a' : 1, 'b' : {'c' : 2}})
+    eq_(apply_update(doc, {'$unset' : {'s.a' : True}}, {})['s'], {})
+    eq_(apply_update(doc, {'$push' : {'l' : 4}}, {})['l'], [1, 2, 3, 4])
+    eq_(apply_update(doc, {'$pushAll' : {'l' : [4, 5]}}, {})['l'], [1, 2, 3, 4, 5])
+    eq_(apply_update(doc, {'$addToSet' : {'l' : 3}}, {})['l'], [1, 2, 3])
+    eq_(apply_update(doc, {'$pull' : {'l' : 2}}, {})['l'], [1, 3])
+    eq_(apply_update(doc, {'$pull' : {'l' : {'$gt' : 1}}}, {})['l'], [1])
+    eq_(apply_update(doc, {'$pullAll' : {'l' : [1, 3]}}, {})['l'], [2])
+    eq_(apply_update(doc, {'$pop' : {'l' : 1}}, {})['l'], [1, 2])
+    eq_(apply_update(doc, {'$pop' : {'l' : -1}}, {})['l'], [2, 3])
+    eq_(doc, {'_id' : 1, 'n' : 1, 'l' : [1, 2, 3], 's' : {'a' : 1}})
+
+def test_positional_update():
+    c = get_collection()
+    c.update({'pets.kind' : 'dog'}, {'$set' : {'pets.$.age' : 8}})
+    eq_(c.find_one(1)['pets'][1], {'kind' : 'dog', 'age' : 8})
+
+def test_multi_and_upsert():
+    c = get_collection()
+    c.update({'tags' : 'b'}, {'$inc' : {'age' : 1}}, multi=True)
+    eq_([d['age'] for d in c.find()], [31, 26, 35.5])
+    status = c.update({'name' : 'dan'}, {'$set' : {'age' : 1}}, upsert=True, safe=True)
+    eq_(c.find_one(status['upserted']), {'_id' : status['upserted'], 'name' : 'dan', 'age' : 1})
+
+@raises(OperationFailure)
+def test_inc_non_number():
+    get_collection().update({'_id' : 1}, {'$inc' : {'name' : 1}})
+
+def test_find_and_modify():
+    c = get_collection()
+    old = c.find_and_modify({'name' : 'ann'}, {'$set' : {'age' : 1}})
+    eq_(old['age'], 30)
+    new = c.find_and_modify({'name' : 'ann'}, {'$set' : {'age' : 2}}, new=True, fields={'age' : True})
+    eq_(new, {'_id' : 1, 'age' : 2})
+    eq_(c.find_and_modify({'name' : 'zed'}, {'$set' : {'age' : 2}}), None)
+    removed = c.find_and_modify({}, sort=[('age', -1)], remove=True)
+    eq_(removed['_id'], 3)
+    eq_(c.find().count(), 2)
+
+@raises(DuplicateKeyError)
+def test_unique_index():
+    c = get_collection()
+    c.ensure_index([('name', 1)], unique=True)
+    assert 'name_1' in c.index_information()
+    c.insert({'name' : 'ann'})
+
+# Sessions
+
+class Owner(Document):
+    name = StringField()
+
+class Animal(Document):
+    name = StringField()
+    age = IntField()
+    tags = ListField(StringField())
+    owner = DocumentField(Owner, required=False)
+    name_index = Index().ascending('name').unique()
+
+def test_session():
+    s = get_memory_session()
+    for i, name in enumerate(['rex', 'tom', 'kit']):
+        s.insert(Animal(name=name, age=i, tags=[name[0]], owner=Owner(name='o%d' % i)))
+    eq_([a.name for a in s.query(Animal).filter(Animal.age > 0).ascending(Animal.age)], ['tom', 'kit'])
+    eq_(s.query(Animal).filter(Animal.name.in_('rex', 'kit')).count(), 2)
+    eq_(s.query(Animal).filter(Animal.owner.name == 'o1').one().name, 'tom')
+    eq_(s.query(Animal).filter(~(Animal.name == 'rex')).count(), 2)
+    eq_(s.query(Animal).filter(Animal.tags == 'k').one().name, 'kit')
+
+    s.query(Animal).filter(Animal.name == 'rex').set(Animal.age, 10).append(Animal.tags, 'x').execute()
+    rex = s.query(Animal).filter(Animal.name == 'rex').one()
+    eq_((rex.age, rex.tags), (10, ['r', 'x']))
+
+    kit = s.query(Animal).filter(Animal.name == 'kit').find_and_modify(new=True).inc(Animal.age, 5).execute()
+    eq_(kit.age, 7)
+
+    s.remove(rex)
+    eq_(s.query(Animal).count(), 2)
+    assert 'name_1' in s.get_indexes(Animal)
+
+@raises(DuplicateKeyError)
+def test_session_unique_index():
+    s = get_memory_session()
+    s.insert(Animal(name='rex', age=1, tags=[]))
+    s.insert(Animal(name='rex', age=2, tags=[]))
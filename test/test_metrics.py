@@ -0,0 +1,98 @@
+from nose.tools import *
+import os
+import tempfile
+import threading
+from mongoalchemy import metrics
+from mongoalchemy.document import Document, Index, DocumentField
+from mongoalchemy.fields import *
+from test.util import get_memory_session
+
+class Inner(Document):
+    s = StringField()
+
+class M(Document):
+    i = IntField()
+    inner = DocumentField(Inner, required=False)
+    i_index = Index().ascending('i')
+
+def setup_registry(**kwargs):
+    return metrics.enable(metrics.MetricsRegistry(**kwargs))
+
+def teardown():
+    metrics.disable()
+
+def test_disabled():
+    metrics.disable()
+    s = get_memory_session()
+    s.insert(M(i=1))
+    s.query(M).all()
+    assert metrics.active is None
+
+@with_setup(teardown=teardown)
+def test_counts():
+    registry = setup_registry(measure_bytes=True)
+    s = get_memory_session(autoflush=False, safe=True)
+    for i in range(3):
+        s.insert(M(i=i, inner=Inner(s='x')))
+    s.flush()
+    eq_(len(s.query(M).filter(M.i > 0).all()), 2)
+    s.query(M).set(M.i, 5).multi().execute()
+    counters, histograms = registry.collect()
+    eq_(counters[('documents_wrapped_total', ('M',))], 3)
+    eq_(counters[('documents_wrapped_total', ('Inner',))], 3)
+    eq_(counters[('documents_unwrapped_total', ('M',))], 2)
+    eq_(counters[('documents_unwrapped_total', ('Inner',))], 2)
+    assert counters[('bytes_encoded_total', ('M',))] > 0
+    eq_(counters[('operations_total', ('M', 'query'))], 1)
+    eq_(counters[('operation_documents_total', ('M', 'query'))], 2)
+    eq_(counters[('operations_total', ('M', 'update'))], 1)
+    eq_(counters[('index_ensures_total', ('M',))], 1)
+    flush = histograms[('flush_documents', ('M',))]
+    eq_(flush[registry.buckets['flush_documents'].index(5)], 1)
+    eq_(histograms[('operation_seconds', ('M', 'query'))][-2:-1], [0])
+
+@with_setup(teardown=teardown)
+def test_validation_failures():
+    registry = setup_registry()
+    s = get_memory_session()
+    s.backend['M'].insert({'i' : 'x'})
+    assert_raises(BadValueException, s.query(M).all)
+    assert_raises(BadValueException, M(i='x').wrap)
+    counters, _ = registry.collect()
+    eq_(counters[('validation_failures_total', ('M', 'unwrap'))], 1)
+    eq_(counters[('validation_failures_total', ('M', 'wrap'))], 1)
+
+@with_setup(teardown=teardown)
+def test_threads_merged():
+    registry = setup_registry()
+    def work():
+        for i in range(100):
+            M.unwrap({'i' : i})
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    work()
+    counters, _ = registry.collect()
+    eq_(counters[('documents_unwrapped_total', ('M',))], 500)
+    # Finished threads are folded into one set of totals
+    counters, _ = registry.collect()
+    eq_(counters[('documents_unwrapped_total', ('M',))], 500)
+
+@with_setup(teardown=teardown)
+def test_render():
+    registry = setup_registry()
+    s = get_memory_session()
+    s.insert(M(i=1))
+    s.query(M).all()
+    text = registry.render()
+    assert '# TYPE mongoalchemy_documents_unwrapped_total counter' in text
+    assert 'mongoalchemy_documents_unwrapped_total{class="M"} 1\n' in text
+    assert 'mongoalchemy_operation_seconds_bucket{class="M",operation="query",le="+Inf"} 1\n' in text
+    assert 'mongoalchemy_operation_seconds_count{class="M",operation="query"} 1\n' in text
+    path = os.path.join(tempfile.mkdtemp(), 'metrics.prom')
+    registry.write(path)
+    eq_(open(path).read(), registry.render())
+    registry.reset()
+    eq_(registry.render(), '')
@@ -100,6 +100,36 @@ def test_cls_modification():
     assert D()._fields['f'].required != _req()
 
 
+def test_resolved_at_class_creation():
+    class D(Document):
+        f = Field()
+    assert '_resolved_config' in D._fields['f'].__dict__
+    assert D._fields['f'].required == _req()
+
+
+def test_field_modification():
+    class D(Document):
+        f = Field()
+    assert D._fields['f'].required == _req()
+    D._fields['f'].required = not _req()
+    assert D._fields['f'].required != _req()
+
+
+def test_config_mutation_without_configure():
+    class D(Document):
+        f = Field()
+    assert D._fields['f'].required == _req()
+    old = _req()
+    options.CONFIG['required'] = not old
+    try:
+        # Stale until explicitly invalidated
+        assert D._fields['f'].required == old
+        options.invalidate()
+        assert D._fields['f'].required == _req()
+    finally:
+        options.configure(required=old)
+
+
 def test_configure_with_dict():
     options.configure({'namespace':'foobar'})
     assert options.CONFIG['namespace'] == 'foobar'
@@ -0,0 +1,95 @@
+import threading
+from nose.tools import *
+from mongoalchemy.document import Document
+from mongoalchemy.fields import *
+from mongoalchemy.query_expression import BadQueryException
+from mongoalchemy.parallel import ParallelScanResult
+from test.util import get_seeded_session
+
+class P(Document):
+    i = IntField()
+    kind = StringField()
+
+def make(i):
+    return P(i=i, kind='even' if i % 2 == 0 else 'odd')
+
+def scan_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('mongoalchemy-scan')]
+
+def test_partition():
+    s = get_seeded_session(make, 40)
+    parts = s.query(P).filter(P.i >= 10).partition(4, field=P.i)
+    eq_(len(parts), 4)
+    values = [sorted(p.i for p in part) for part in parts]
+    eq_(values, [list(range(10, 17)), list(range(17, 25)), list(range(25, 32)),
+        list(range(32, 40))])
+
+def test_partition_by_id():
+    s = get_seeded_session(make, 40)
+    parts = s.query(P).partition(3)
+    ids = [set(p.mongo_id for p in part) for part in parts]
+    eq_(sum(len(i) for i in ids), 40)
+    eq_(len(set.union(*ids)), 40)
+
+def test_partition_duplicate_bounds():
+    s = get_seeded_session(make, 10)
+    parts = s.query(P).partition(4, field='kind')
+    eq_(len(parts), 2)
+    eq_([set(p.kind for p in part) for part in parts], [{'even'}, {'odd'}])
+
+def test_partition_keeps_sort():
+    s = get_seeded_session(make, 40)
+    part = s.query(P).descending(P.i).partition(2, field=P.i)[1]
+    eq_([p.i for p in part], list(range(39, 19, -1)))
+
+@raises(BadQueryException)
+def test_partition_limit():
+    get_seeded_session(make, 40).query(P).limit(5).partition(2)
+
+def test_parallel_scan():
+    s = get_seeded_session(make, 40)
+    result = s.query(P).filter(P.kind == 'odd').batch_size(3).parallel_scan(workers=4, field=P.i)
+    assert isinstance(result, ParallelScanResult)
+    eq_(sorted(p.i for p in result), list(range(1, 40, 2)))
+    eq_(scan_threads(), [])
+
+def test_parallel_scan_batches():
+    s = get_seeded_session(make, 40)
+    result = s.query(P).batch_size(5).parallel_scan(workers=2, field=P.i)
+    batches = list(result.iter_batches())
+    eq_(sorted(len(b) for b in batches), [5] * 8)
+    for batch in batches:
+        assert len(set(p.i < 20 for p in batch)) == 1
+
+def test_parallel_scan_callback():
+    s = get_seeded_session(make, 40)
+    names = s.query(P).parallel_scan(workers=4, field=P.i,
+        callback=lambda result: (threading.current_thread().name, [p.i for p in result]))
+    eq_([values for _, values in names],
+        [list(range(k, k + 10)) for k in range(0, 40, 10)])
+    assert all(name.startswith('mongoalchemy-scan') for name, _ in names)
+
+@raises(ValueError)
+def test_parallel_scan_callback_error():
+    def callback(result):
+        raise ValueError()
+    get_seeded_session(make, 40).query(P).parallel_scan(workers=2, callback=callback)
+
+def test_parallel_scan_error():
+    s = get_seeded_session(make, 40)
+    s.backend['P'].update({'i' : 25}, {'$set' : {'i' : 'bad'}})
+    result = s.query(P).parallel_scan(workers=4)
+    try:
+        list(result)
+        assert False
+    except Exception:
+        pass
+    eq_(scan_threads(), [])
+
+def test_parallel_scan_close():
+    s = get_seeded_session(make, 200)
+    result = s.query(P).batch_size(2).parallel_scan(workers=4, depth=1)
+    next(result)
+    result.close()
+    eq_(scan_threads(), [])
+    assert len(list(result)) < 199
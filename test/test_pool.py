@@ -0,0 +1,91 @@
+from nose.tools import *
+import threading
+import time
+from mongoalchemy.pool import SessionPool, ScopedSession, scoped_session
+from mongoalchemy.document import Document
+from mongoalchemy.fields import *
+from mongoalchemy.memory import MemoryBackend
+from mongoalchemy.exceptions import SessionPoolTimeout
+from test.util import get_memory_session
+
+class P(Document):
+    i = IntField()
+
+def test_thread_scoped():
+    scoped = scoped_session(MemoryBackend(), pool_size=2)
+    s = scoped()
+    assert scoped() is s
+    assert scoped.has_session()
+    others = []
+    def other():
+        others.append(scoped())
+        scoped.remove()
+    t = threading.Thread(target=other)
+    t.start()
+    t.join()
+    assert others[0] is not s
+    eq_(scoped.stats().in_use, 1)
+    eq_(scoped.stats().idle, 1)
+    scoped.remove()
+    assert not scoped.has_session()
+    eq_(scoped.stats().in_use, 0)
+    eq_(scoped.stats().idle, 2)
+
+def test_proxy_and_context():
+    scoped = scoped_session(MemoryBackend(), pool_size=1)
+    with scoped as s:
+        s.insert(P(i=1))
+        eq_(scoped.query(P).count(), 1)
+    assert not scoped.has_session()
+    eq_(scoped.stats().checkouts, 1)
+
+def test_reused_session_is_flushed():
+    scoped = scoped_session(MemoryBackend(), pool_size=1, autoflush=False)
+    s = scoped()
+    s.insert(P(i=1))
+    scoped.remove()
+    assert scoped() is s
+    eq_(s.queue, [])
+    eq_(s.query(P).count(), 1)
+
+def test_bounded():
+    pool = SessionPool(get_memory_session, size=1)
+    s = pool.checkout()
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.checkout()))
+    t.start()
+    while pool.stats().waiting == 0:
+        time.sleep(0.001)
+    time.sleep(0.01)
+    pool.checkin(s)
+    t.join()
+    assert got[0] is s
+    stats = pool.stats()
+    eq_((stats.in_use, stats.idle, stats.waiting, stats.waits), (1, 0, 0, 1))
+    assert stats.wait_time >= 0.01
+    assert stats.max_wait_time == stats.wait_time
+
+@raises(SessionPoolTimeout)
+def test_timeout():
+    pool = SessionPool(get_memory_session, size=1, timeout=0.01)
+    pool.checkout()
+    pool.checkout()
+
+def test_factory_error():
+    def factory():
+        raise ValueError()
+    pool = SessionPool(factory, size=1)
+    assert_raises(ValueError, pool.checkout)
+    eq_(pool.stats().in_use, 0)
+    assert_raises(ValueError, pool.checkout)
+
+def test_scopefunc():
+    scope = ['a']
+    scoped = ScopedSession(SessionPool(get_memory_session, size=2),
+        scopefunc=lambda: scope[0])
+    a = scoped()
+    scope[0] = 'b'
+    assert scoped() is not a
+    scoped.remove()
+    scope[0] = 'a'
+    assert scoped() is a
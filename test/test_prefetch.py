@@ -0,0 +1,102 @@
+import gc
+import threading
+import time
+from nose.tools import *
+from mongoalchemy.document import Document
+from mongoalchemy.fields import *
+from mongoalchemy.query import PrefetchingResult
+from test.util import get_seeded_session
+
+class F(Document):
+    i = IntField()
+
+def make(i):
+    return F(i=i)
+
+def prefetch_threads():
+    return [t for t in threading.enumerate() if t.name == 'mongoalchemy-prefetch']
+
+def wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_prefetch():
+    s = get_seeded_session(make, 20)
+    result = iter(s.query(F).ascending(F.i).batch_size(3).prefetch())
+    assert isinstance(result, PrefetchingResult)
+    eq_([f.i for f in result], list(range(20)))
+    eq_(prefetch_threads(), [])
+
+def test_batches():
+    s = get_seeded_session(make, 10)
+    result = iter(s.query(F).ascending(F.i).batch_size(4).prefetch())
+    eq_(next(result).i, 0)
+    eq_([[f.i for f in batch] for batch in result.iter_batches()],
+        [[1, 2, 3], [4, 5, 6, 7], [8, 9]])
+    eq_(list(iter(s.query(F).batch_size(4).prefetch()).map(lambda f: f.i).chunk(5).map(len)), [5, 5])
+
+class Counted(IntField):
+    unwraps = 0
+    def unwrap(self, value):
+        Counted.unwraps += 1
+        return IntField.unwrap(self, value)
+
+class C(Document):
+    config_collection_name = 'F'
+    i = Counted()
+
+def test_backpressure():
+    s = get_seeded_session(make, 20)
+    Counted.unwraps = 0
+    result = iter(s.query(C).batch_size(1).prefetch(depth=2))
+    next(result)
+    # The batch being read, two queued and one waiting to be queued
+    assert wait_for(lambda: Counted.unwraps == 4)
+    time.sleep(0.05)
+    eq_(Counted.unwraps, 4)
+    eq_(len(list(result)), 19)
+
+def test_early_stop():
+    s = get_seeded_session(make, 20)
+    result = iter(s.query(F).batch_size(1).prefetch(depth=1))
+    next(result)
+    assert prefetch_threads()
+    result.close()
+    eq_(prefetch_threads(), [])
+    eq_(list(result), [])
+
+def test_dropped_result_stops():
+    s = get_seeded_session(make, 20)
+    eq_(s.query(F).ascending(F.i).batch_size(1).prefetch(depth=1).first().i, 0)
+    gc.collect()
+    assert wait_for(lambda: not prefetch_threads())
+
+def test_with_block():
+    s = get_seeded_session(make, 20)
+    with iter(s.query(F).batch_size(2).prefetch()) as result:
+        next(result)
+    eq_(prefetch_threads(), [])
+
+class Failing(Document):
+    config_collection_name = 'F'
+    i = IntField(max_value=15)
+
+def test_errors():
+    s = get_seeded_session(make, 20)
+    values = []
+    result = iter(s.query(Failing).ascending(Failing.i).batch_size(3).prefetch())
+    try:
+        for f in result:
+            values.append(f.i)
+        assert False
+    except BadValueException:
+        pass
+    eq_(values, list(range(16)))
+    eq_(prefetch_threads(), [])
+
+def test_not_started_for_count():
+    s = get_seeded_session(make, 20)
+    eq_(s.query(F).prefetch().count(), 20)
+    eq_(prefetch_threads(), [])
@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+from nose.tools import *
+from mongoalchemy.document import Document, DocumentField
+from mongoalchemy.fields import *
+from mongoalchemy.raw import RawDocument
+from mongoalchemy import parallel
+from test.util import get_seeded_session
+
+class Item(Document):
+    n = IntField()
+    tags = ListField(StringField())
+
+class Order(Document):
+    number = IntField()
+    items = DictField(ListField(DocumentField(Item)))
+
+def make(i):
+    return Order(number=i, items={'a' : [Item(n=i, tags=['x'] * (i % 3))]})
+
+def total(order):
+    return (order.number, sum(len(item.tags) for item in order.items['a']))
+
+def check_worker(order):
+    if order.number == 7:
+        raise ValueError('bad order')
+    return order.number
+
+def test_pickle_query_fields():
+    for qfield in [Order.number, Order.items, Order.mongo_id, Item.tags]:
+        eq_(str(pickle.loads(pickle.dumps(qfield))), str(qfield))
+    qfield = pickle.loads(pickle.dumps(Order.items.matched_index()))
+    eq_(str(qfield), 'items.$')
+
+def test_process_map():
+    s = get_seeded_session(make, 30)
+    results = iter(s.query(Order).ascending(Order.number).batch_size(4))
+    eq_(list(results.process_map(total, workers=2)), [(i, i % 3) for i in range(30)])
+
+def test_process_map_documents():
+    s = get_seeded_session(make, 30)
+    results = iter(s.query(Order).ascending(Order.number))
+    orders = list(results.process_map(workers=2, size=7, window=1))
+    eq_([o.number for o in orders], list(range(30)))
+    eq_(orders[4].items['a'][0].n, 4)
+
+def test_process_map_fields():
+    s = get_seeded_session(make, 5)
+    results = iter(s.query(Order).fields(Order.number).ascending(Order.number))
+    orders = list(results.process_map(workers=1))
+    eq_([o.number for o in orders], list(range(5)))
+    assert orders[0].partial
+    rows = iter(s.query(Order).fields(Order.number, values_only=True).ascending(Order.number))
+    eq_(list(rows.process_map(workers=1)), [(i,) for i in range(5)])
+
+def test_process_map_executor():
+    s = get_seeded_session(make, 30)
+    with ThreadPoolExecutor(3) as executor:
+        results = iter(s.query(Order).ascending(Order.number).batch_size(5))
+        pipeline = results.process_map(total, executor=executor, window=2)
+        eq_(list(pipeline.map(lambda row: row[0]).chunk(10)),
+            [list(range(k, k + 10)) for k in range(0, 30, 10)])
+
+def test_process_map_listeners():
+    s = get_seeded_session(make, 30)
+    events = []
+    s.add_listener(after_query=events.append)
+    eq_(len(list(iter(s.query(Order)).process_map(total, workers=1))), 30)
+    eq_([e.count for e in events], [30])
+
+@raises(ValueError)
+def test_process_map_error():
+    s = get_seeded_session(make, 30)
+    list(iter(s.query(Order).batch_size(4)).process_map(check_worker, workers=2))
+
+def test_query_process_map_sends_raw_bson():
+    s = get_seeded_session(make, 5)
+    encoded = []
+    encode = parallel._encode
+    parallel._encode = lambda document: encoded.append(type(document)) or encode(document)
+    try:
+        query = s.query(Order).ascending(Order.number)
+        eq_(list(query.process_map(total, workers=1)), [(i, i % 3) for i in range(5)])
+    finally:
+        parallel._encode = encode
+    eq_(encoded, [RawDocument] * 5)
+    assert not query.is_raw_bson()
@@ -312,3 +312,15 @@ def test_resolve_fields():
 
     q = s.query(Resolver).filter(Resolver.i.in_(6))
     q = s.query(Resolver).set(Resolver.i, 6)
+
+def test_trusted():
+    s = get_session()
+    s.clear_collection(T)
+    s.db[T.get_collection_name()].insert({'i' : 5.0})
+    assert s.query(T).trusted().one().i == 5
+    try:
+        s.query(T).one()
+        assert False, 'untrusted query did not validate'
+    except BadValueException:
+        pass
+    s.clear_collection(T)
@@ -0,0 +1,72 @@
+from nose.tools import *
+from mongoalchemy.document import Document, Index
+from mongoalchemy.fields import *
+from mongoalchemy.query import QueryResult, ProfiledQueryResult, QueryProfile
+from test.util import get_seeded_session
+
+class Q(Document):
+    i = IntField()
+    s = StringField()
+    i_index = Index().ascending('i')
+
+def make(i):
+    return Q(i=i, s=str(i))
+
+def test_not_profiled():
+    s = get_seeded_session(make, 5)
+    assert type(s.query(Q).__iter__()) is QueryResult
+    s.query(Q).all()
+    eq_(s.profile, None)
+
+def test_query_profile():
+    s = get_seeded_session(make, 5)
+    result = iter(s.query(Q).profile().filter(Q.i > 1))
+    eq_(len(list(result)), 3)
+    profile = result.profile
+    eq_(profile.queries, 1)
+    eq_(profile.documents, 3)
+    assert profile.compile > 0
+    eq_(sorted(profile.field_times), ['IntField', 'ObjectIdField', 'StringField'])
+    assert profile.unwrap >= sum(profile.field_times.values())
+    eq_(profile.batches[0][1], 3)
+    eq_(sum(count for _, count in profile.batches), 3)
+    assert profile.total >= profile.unwrap + profile.fetch
+
+def test_batches_counted_with_batch_size():
+    s = get_seeded_session(make, 5)
+    documents = list(s.backend['Q'].find({}))
+    result = ProfiledQueryResult(iter(documents), Q, batch_size=2)
+    result.profile = QueryProfile()
+    eq_(len(list(result)), 5)
+    eq_([count for _, count in result.profile.batches], [2, 2, 1])
+
+def test_session_aggregate():
+    s = get_seeded_session(make, 5, profile_queries=True)
+    s.query(Q).all()
+    s.query(Q).filter(Q.i == 1).one()
+    s.query(Q).profile(False).all()
+    eq_(s.profile.queries, 2)
+    eq_(s.profile.documents, 6)
+    eq_(s.profile.as_dict()['batches'], len(s.profile.batches))
+
+def test_partial_iteration_not_aggregated():
+    s = get_seeded_session(make, 5)
+    result = iter(s.query(Q).profile())
+    next(result)
+    eq_(result.profile.documents, 1)
+    eq_(s.profile, None)
+
+def test_profiled_with_listeners():
+    s = get_seeded_session(make, 5, profile_queries=True)
+    events = []
+    s.add_listener(after_query=events.append)
+    s.query(Q).all()
+    eq_(events[0].count, 5)
+    eq_(s.profile.documents, 5)
+
+def test_partial_reads_are_profiled():
+    s = get_seeded_session(make, 5, profile_queries=True)
+    eq_(s.query(Q).first().i, 0)
+    eq_(s.query(Q).count(), 5)
+    eq_(s.query(Q)[2].i, 2)
+    eq_((s.profile.queries, s.profile.documents), (3, 1))
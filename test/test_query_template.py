@@ -0,0 +1,111 @@
+from nose.tools import *
+from mongoalchemy.document import Document
+from mongoalchemy.fields import *
+from mongoalchemy.query import QueryTemplate, BoundQuery
+from mongoalchemy.query_expression import bind, BadQueryException
+from test.util import get_memory_session, get_seeded_session
+
+class T(Document):
+    i = IntField()
+    s = StringField()
+
+def make(i):
+    return T(i=i, s=str(i))
+
+def test_execute():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).filter(T.i > bind('min'), T.s.in_(bind('strs'))).ascending(T.i).compile()
+    assert isinstance(template, QueryTemplate)
+    eq_(template.parameters, frozenset(['min', 'strs']))
+    eq_([t.i for t in template.execute(min=1, strs=['0', '2', '4'])], [2, 4])
+    eq_([t.i for t in template.execute(min=3, strs=['0', '2', '4'])], [4])
+
+def test_filter_by():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).filter_by(s=bind('s')).compile()
+    eq_(template.bind(s='3').one().i, 3)
+    eq_(template.bind(s='3').query, {'s' : '3'})
+
+def test_bound_values_are_wrapped():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).filter(T.i == bind('i')).compile()
+    assert_raises(BadValueException, template.bind, i='1')
+
+def test_static_parts_are_shared():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).filter(T.s.in_('1', '2'), T.i < bind('i')).compile()
+    first = template.bind(i=2).query
+    second = template.bind(i=3).query
+    eq_(first, {'s' : {'$in' : ['1', '2']}, 'i' : {'$lt' : 2}})
+    eq_(second['i'], {'$lt' : 3})
+    assert first['s'] is second['s']
+
+def test_no_parameters():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).filter(T.i == 1).compile()
+    eq_(template.parameters, frozenset())
+    eq_(template.bind().query, template.bind().query)
+    eq_(template.bind().one().s, '1')
+
+@raises(BadQueryException)
+def test_missing_parameter():
+    get_seeded_session(make, 5).query(T).filter(T.i == bind('i')).compile().bind()
+
+@raises(BadQueryException)
+def test_unknown_parameter():
+    get_seeded_session(make, 5).query(T).filter(T.i == bind('i')).compile().bind(i=1, j=2)
+
+@raises(BadQueryException)
+def test_bound_query_is_fixed():
+    get_seeded_session(make, 5).query(T).filter(T.i == bind('i')).compile().bind(i=1).filter(T.s == '1')
+
+def test_template_is_independent_of_query():
+    s = get_seeded_session(make, 5)
+    query = s.query(T).filter(T.i > bind('i'))
+    template = query.compile()
+    query.filter(T.s == '4').descending(T.i)
+    eq_([t.i for t in template.execute(i=2)], [3, 4])
+    bound = template.bind(i=2).descending(T.i)
+    eq_([t.i for t in bound], [4, 3])
+    eq_(template.bind(i=2).sort, [])
+
+def test_bound_query_settings():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).filter(T.i >= bind('i')).descending(T.i).limit(2).fields(T.i).compile()
+    bound = template.bind(i=1)
+    assert isinstance(bound, BoundQuery)
+    eq_([t.i for t in bound], [4, 3])
+    eq_(bound.count(), 4)
+    eq_([t.i for t in bound.clone().skip(1)], [3, 2])
+    eq_(bound.get_skip(), None)
+
+def test_bound_update():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).filter(T.i == bind('i')).compile()
+    template.bind(i=2).set(T.s, 'two').execute()
+    eq_(template.bind(i=2).one().s, 'two')
+
+def test_key():
+    s = get_seeded_session(make, 5)
+    def compile(value):
+        return s.query(T).filter(T.i > bind('i'), T.s == value).compile()
+    eq_(compile('1').key, compile('1').key)
+    assert compile('1').key != compile('2').key
+    assert s.query(T).filter({'i' : 1}).compile().key != \
+        s.query(T).filter({'i' : True}).compile().key
+    assert compile('1').key != s.query(T).filter(T.i > bind('j'), T.s == '1').compile().key
+    assert compile('1').key != s.query(T).filter(T.i > bind('i'), T.s == '1').limit(1).compile().key
+    hash(compile('1').key)
+
+def test_with_session():
+    template = get_memory_session().query(T).filter(T.i == bind('i')).compile()
+    s = get_seeded_session(make, 5)
+    eq_(template.with_session(s).bind(i=3).one().s, '3')
+    eq_(template.with_session(s).key, template.key)
+
+def test_profiled_bind_time():
+    s = get_seeded_session(make, 5)
+    template = s.query(T).profile().filter(T.i == bind('i')).compile()
+    result = template.execute(i=1)
+    eq_(len(list(result)), 1)
+    assert result.profile.compile > 0
@@ -0,0 +1,118 @@
+import pickle
+import re
+from datetime import datetime
+from bson import BSON
+from nose.tools import *
+from mongoalchemy.document import Document, DocumentField
+from mongoalchemy.fields import *
+from mongoalchemy.raw import RawDocument, RawCursor
+from mongoalchemy import cache
+from test.util import get_seeded_session
+
+class Meta(Document):
+    tenant = StringField()
+
+class Event(Document):
+    kind = StringField()
+    n = IntField()
+    tags = ListField(StringField())
+    meta = DocumentField(Meta)
+
+def make(i):
+    return Event(kind='k%d' % i, n=i, tags=['a', 'b'], meta=Meta(tenant='t%d' % (i % 2)))
+
+def test_raw_document():
+    value = {'s' : 'héllo', 'i' : 5, 'f' : 1.5, 'b' : False, 'none' : None,
+        'l' : [1, {'a' : 2}], 'd' : {'x' : 'y'}, 'r' : re.compile('ab'),
+        'dt' : datetime(2020, 1, 1), 'big' : 2 ** 40, 'bin' : b'xyz'}
+    doc = RawDocument(BSON.encode(value))
+    eq_(list(doc), list(value))
+    eq_(len(doc), len(value))
+    for k in value:
+        if k != 'r':
+            eq_(doc[k], value[k])
+    eq_(doc['r'].pattern, 'ab')
+    assert 'i' in doc and 'zz' not in doc
+    eq_(doc.get('zz', 1), 1)
+    assert_raises(KeyError, lambda: doc['zz'])
+    eq_(dict((k, e.decode()) for k, e in doc.elements())['d'], {'x' : 'y'})
+    eq_(pickle.loads(pickle.dumps(doc))['s'], 'héllo')
+
+def test_raw_output():
+    s = get_seeded_session(make, 3)
+    docs = list(s.query('Event').raw_bson().raw_output())
+    eq_(len(docs), 3)
+    assert all(isinstance(d, RawDocument) for d in docs)
+    eq_([d['n'] for d in docs], [0, 1, 2])
+    eq_(docs[1]['meta'], {'tenant' : 't1'})
+    cursor = s.backend['Event'].find()
+    eq_(docs[2].decode(), list(cursor)[2])
+
+def test_forward_raw_document():
+    s = get_seeded_session(make, 3)
+    doc = s.query('Event').raw_bson().raw_output().filter({'n' : 1}).one()
+    s.backend['Copy'].insert(doc)
+    eq_(s.backend['Copy'].find_one(), doc.decode())
+
+def test_lazy_fields():
+    s = get_seeded_session(make, 3)
+    event = s.query(Event).raw_bson().filter(Event.n == 2).one()
+    assert isinstance(event._raw, RawDocument)
+    eq_(sorted(event._field_values.raw), ['kind', 'meta', 'mongo_id', 'n', 'tags'])
+    eq_(event.n, 2)
+    eq_(sorted(event._field_values.raw), ['kind', 'meta', 'mongo_id', 'tags'])
+    eq_(event.meta.tenant, 't0')
+    eq_(event.tags, ['a', 'b'])
+
+def test_unmodified_save_sends_raw():
+    s = get_seeded_session(make, 3)
+    event = s.query(Event).raw_bson().filter(Event.n == 1).one()
+    event.kind
+    assert event.wrap() is event._raw
+    collection = s.backend['Event']
+    saved = []
+    save = collection.save
+    collection.save = lambda doc, safe=False: saved.append(doc) or save(doc, safe)
+    s.insert(event)
+    assert saved[0] is event._raw
+    eq_(s.query(Event).filter(Event.n == 1).one().kind, 'k1')
+
+def test_modified_save_wraps():
+    s = get_seeded_session(make, 3)
+    event = s.query(Event).raw_bson().filter(Event.n == 1).one()
+    event.tags.append('c')
+    value = event.wrap()
+    assert not isinstance(value, RawDocument)
+    eq_(value['tags'], ['a', 'b', 'c'])
+
+    event = s.query(Event).raw_bson().filter(Event.n == 1).one()
+    event.kind = 'new'
+    assert not isinstance(event.wrap(), RawDocument)
+    s.insert(event)
+    eq_(s.query(Event).filter(Event.n == 1).one().kind, 'new')
+
+def test_partial_not_raw():
+    s = get_seeded_session(make, 3)
+    event = s.query(Event).raw_bson().fields(Event.n).filter(Event.n == 1).one()
+    eq_(event._raw, None)
+    eq_(event.n, 1)
+
+def test_raw_skips_caches():
+    cache.enable_document_cache()
+    try:
+        s = get_seeded_session(make, 3)
+        event = s.query(Event).filter(Event.n == 1).one()
+        doc = s.query(Event).raw_bson().filter(Event.mongo_id == event.mongo_id).one()
+        assert isinstance(doc._raw, RawDocument)
+        cache.document_cache.clear()
+        s.insert(doc)
+        eq_(cache.document_cache.get((s.backend.name, 'Event'), event.mongo_id)['n'], 1)
+    finally:
+        cache.disable_document_cache()
+
+def test_raw_cursor_batches():
+    s = get_seeded_session(make, 3)
+    s.insert(Event(kind='k', n=5, tags=[], meta=Meta(tenant='t')))
+    result = iter(s.query(Event).raw_bson().batch_size(2))
+    assert isinstance(result.cursor, RawCursor)
+    eq_([len(batch) for batch in result.iter_batches()], [2, 2])
@@ -0,0 +1,63 @@
+from nose.tools import *
+from mongoalchemy.document import Document
+from mongoalchemy.fields import *
+from mongoalchemy.query import QueryResult, ResultPipeline
+from test.util import get_seeded_session
+
+class P(Document):
+    i = IntField()
+
+def make(i):
+    return P(i=i)
+
+def values(batches):
+    return [[p.i for p in batch] for batch in batches]
+
+def test_server_batches():
+    s = get_seeded_session(make, 10)
+    eq_(values(iter(s.query(P).ascending(P.i).batch_size(4)).iter_batches()),
+        [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+    eq_(values(iter(s.query(P).ascending(P.i).limit(3)).iter_batches()), [[0, 1, 2]])
+
+def test_sized_batches():
+    s = get_seeded_session(make, 10)
+    result = iter(s.query(P).ascending(P.i).batch_size(4))
+    eq_(values(result.iter_batches(6)), [[0, 1, 2, 3, 4, 5], [6, 7, 8, 9]])
+    eq_(list(iter(s.query(P).filter(P.i > 20)).iter_batches()), [])
+
+def test_batches_counted_with_batch_size():
+    # Cursors which don't tell batches apart are split by the batch size
+    s = get_seeded_session(make, 10)
+    documents = sorted(s.backend['P'].find({}), key=lambda d: d['i'])
+    eq_(values(QueryResult(iter(documents), P, batch_size=4).iter_batches()),
+        [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+
+def test_batches_are_lazy():
+    s = get_seeded_session(make, 10)
+    result = iter(s.query(P).ascending(P.i).batch_size(2))
+    batches = result.iter_batches()
+    eq_([p.i for p in next(iter(batches))], [0, 1])
+    eq_(result.cursor.buffered(), 0)
+    eq_(next(result).i, 2)
+
+def test_pipeline():
+    s = get_seeded_session(make, 10)
+    result = iter(s.query(P).ascending(P.i))
+    pipeline = result.map(lambda p: p.i * 2).filter(lambda i: i % 3).chunk(3)
+    assert isinstance(pipeline, ResultPipeline)
+    eq_(list(pipeline), [[2, 4, 8], [10, 14, 16]])
+
+def test_pipeline_is_lazy():
+    s = get_seeded_session(make, 10)
+    seen = []
+    def record(p):
+        seen.append(p.i)
+        return p.i
+    pipeline = iter(iter(s.query(P).ascending(P.i)).map(record).chunk(2))
+    eq_(next(pipeline), [0, 1])
+    eq_(seen, [0, 1])
+
+def test_batch_pipeline():
+    s = get_seeded_session(make, 10)
+    result = iter(s.query(P).ascending(P.i).batch_size(5))
+    eq_(list(result.iter_batches().map(len)), [5, 5])
@@ -2,7 +2,7 @@ from nose.tools import *
 from mongoalchemy.session import Session
 from mongoalchemy.document import Document, Index, DocumentField
 from mongoalchemy.fields import *
-from test.util import known_failure, DB_NAME
+from test.util import known_failure, DB_NAME, get_memory_session
 from pymongo.errors import DuplicateKeyError
 
 class T(Document):
@@ -86,3 +86,98 @@ def test_update_push():
     t = s.query(T).one()
     assert s.query(T).one().i == 7 and t.l == [3, 4]
 
+
+def test_deferred_insert():
+    s = Session.connect(DB_NAME, autoflush=False)
+    s.clear_collection(T)
+    t = T(i=1)
+    s.insert(t)
+    assert t.mongo_id is not None
+    assert len(s.queue) == 1
+    s.flush()
+    assert len(s.queue) == 0
+    assert s.query(T).one().mongo_id == t.mongo_id
+
+def test_deferred_insert_batches():
+    s = Session.connect(DB_NAME, autoflush=False, insert_batch_size=3)
+    s.clear_collection(T, TUnique)
+    for i in range(10):
+        s.insert(T(i=i))
+        s.insert(TUnique(i=i))
+    # querying flushes the queue
+    assert s.query(T).count() == 10
+    assert len(s.queue) == 0
+    assert s.query(TUnique).count() == 10
+
+def test_deferred_insert_error():
+    s = Session.connect(DB_NAME, autoflush=False)
+    s.clear_collection(TUnique)
+    s.insert(TUnique(i=1))
+    s.insert(TUnique(i=1))
+    try:
+        s.flush(safe=True)
+        assert False, 'No error raised on safe flush for second unique item'
+    except DuplicateKeyError:
+        assert len(s.queue) == 0
+
+def test_identity_map():
+    s = Session.connect(DB_NAME, identity_map=True)
+    s.clear_collection(T)
+    t = T(i=1)
+    s.insert(t)
+    assert s.query(T).one() is t
+    # partial loads are never mapped
+    assert s.query(T).fields(T.i).one() is not t
+    t2 = s.query(T).one()
+    assert t2 is t
+
+def test_identity_map_expired_by_update():
+    s = Session.connect(DB_NAME, identity_map=True)
+    s.clear_collection(T)
+    s.insert(T(i=1))
+    t = s.query(T).one()
+    s.query(T).filter(T.i == 1).set(T.i, 2).execute()
+    t2 = s.query(T).one()
+    assert t2 is not t
+    assert t2.i == 2
+
+def test_identity_map_expired_by_session_update():
+    s = get_memory_session(identity_map=True)
+    s.insert(T(i=1))
+    t = s.query(T).one()
+    t.i = 2
+    s.update(t, update_ops={T.i : '$inc'})
+    t2 = s.query(T).one()
+    assert t2 is not t
+    eq_(t2.i, 3)
+    assert s.query(T).one() is t2
+
+def test_identity_map_remove():
+    s = Session.connect(DB_NAME, identity_map=True)
+    s.clear_collection(T)
+    t = T(i=1)
+    s.insert(t)
+    s.remove(t)
+    assert len(s.identity_map) == 0
+
+def test_deferred_insert_loaded_document():
+    s = get_memory_session(autoflush=False)
+    t = T(i=1)
+    s.insert(t)
+    s.flush()
+    loaded = s.query(T).one()
+    loaded.i = 2
+    s.insert(loaded)
+    s.insert(loaded)
+    s.flush()
+    eq_([x.i for x in s.query(T).all()], [2])
+
+def test_deferred_insert_unsafe_save():
+    s = get_memory_session(autoflush=False, safe=False)
+    t = T(i=1)
+    s.insert(t)
+    s.flush()
+    t.i = 3
+    s.insert(t)
+    s.flush()
+    eq_([x.i for x in s.query(T).all()], [3])
@@ -0,0 +1,122 @@
+from nose.tools import *
+from pymongo.errors import OperationFailure
+from mongoalchemy.session import Session, ObservedQueryResult
+from mongoalchemy.query import QueryResult
+from mongoalchemy.document import Document
+from mongoalchemy.exceptions import MultipleResultsFound
+from mongoalchemy.fields import *
+from test.util import get_memory_session
+
+class E(Document):
+    i = IntField()
+
+class Recorder(object):
+    def __init__(self, session):
+        self.events = []
+        session.add_listener(**dict((name, self.record(name)) for name in
+            ('before_query', 'after_query', 'before_write', 'after_write',
+             'before_flush', 'after_flush')))
+    def record(self, name):
+        def listener(event):
+            self.events.append((name, event.operation, event.collection, event.count))
+            if name.startswith('after'):
+                assert event.duration >= 0
+            else:
+                assert event.duration is None
+        return listener
+
+def test_no_listeners():
+    s = get_memory_session()
+    s.insert(E(i=1))
+    assert type(s.query(E).__iter__()) is QueryResult
+
+def test_query_events():
+    s = get_memory_session()
+    for i in range(3):
+        s.insert(E(i=i))
+    r = Recorder(s)
+    eq_(len(s.query(E).filter(E.i > 0).all()), 2)
+    eq_(r.events, [('before_query', 'query', 'E', None), ('after_query', 'query', 'E', 2)])
+
+def test_partial_query_events():
+    s = get_memory_session()
+    for i in range(3):
+        s.insert(E(i=i))
+    r = Recorder(s)
+    eq_(s.query(E).first().i, 0)
+    eq_(s.query(E).count(), 3)
+    eq_(s.query(E)[1].i, 1)
+    eq_(sorted(s.query(E).distinct(E.i)), [0, 1, 2])
+    s.query(E).explain()
+    assert_raises(MultipleResultsFound, s.query(E).one)
+    eq_([name for name, _, _, _ in r.events], ['before_query', 'after_query'] * 6)
+    eq_([count for name, _, _, count in r.events if name == 'after_query'],
+        [1, 0, 1, 0, 0, 2])
+
+def test_dropped_result_event():
+    s = get_memory_session()
+    s.insert(E(i=1))
+    s.insert(E(i=2))
+    r = Recorder(s)
+    result = iter(s.query(E))
+    next(result)
+    del result
+    eq_(r.events[-1], ('after_query', 'query', 'E', 1))
+
+def test_write_events():
+    s = get_memory_session(safe=True)
+    e = E(i=1)
+    s.insert(e)
+    r = Recorder(s)
+    s.query(E).filter(E.i == 1).set(E.i, 2).safe().execute()
+    s.query(E).find_and_modify().set(E.i, 3).execute()
+    s.remove(e)
+    eq_(r.events, [
+        ('before_write', 'update', 'E', None), ('after_write', 'update', 'E', 1),
+        ('before_write', 'find_and_modify', 'E', None), ('after_write', 'find_and_modify', 'E', 1),
+        ('before_write', 'remove', 'E', None), ('after_write', 'remove', 'E', 1),
+    ])
+
+def test_flush_events():
+    s = get_memory_session(autoflush=False)
+    r = Recorder(s)
+    s.flush()
+    eq_(r.events, [])
+    s.insert(E(i=1))
+    s.insert(E(i=2))
+    s.flush()
+    eq_(r.events, [('before_flush', 'flush', None, None), ('after_flush', 'flush', None, 2)])
+
+def test_flush_event_counts_items_once():
+    s = get_memory_session(autoflush=False)
+    r = Recorder(s)
+    e = E(i=1)
+    s.insert(e)
+    s.insert(e)
+    s.insert(E(i=2))
+    s.flush()
+    eq_(r.events[-1], ('after_flush', 'flush', None, 2))
+    eq_(s.query(E).count(), 2)
+
+def test_error_event():
+    s = get_memory_session()
+    errors = []
+    s.add_listener(after_write=lambda event: errors.append(event.error))
+    s.backend['E'].insert({'i' : 'x'})
+    assert_raises(OperationFailure, s.query(E).inc(E.i, 1).execute)
+    assert isinstance(errors[0], OperationFailure)
+
+def test_remove_listener():
+    s = get_memory_session()
+    events = []
+    listener = lambda event: events.append(event)
+    s.add_listener(after_query=listener)
+    s.query(E).all()
+    s.remove_listener(after_query=listener)
+    s.query(E).all()
+    eq_(len(events), 1)
+    assert type(s.query(E).__iter__()) is QueryResult
+
+@raises(TypeError)
+def test_unknown_listener():
+    get_memory_session().add_listener(after_everything=lambda event: None)
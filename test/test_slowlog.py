@@ -0,0 +1,79 @@
+from nose.tools import *
+import json
+import os
+import tempfile
+from mongoalchemy.document import Document
+from mongoalchemy.fields import *
+from mongoalchemy.slowlog import SlowQueryLog, plan_flags
+from test.util import get_memory_session
+
+class S(Document):
+    i = IntField()
+
+def get_session(log):
+    s = get_memory_session(safe=True)
+    for i in range(20):
+        s.insert(S(i=i))
+    log.attach(s)
+    return s
+
+def test_query_entry():
+    entries = []
+    log = SlowQueryLog(threshold=0, callback=entries.append, explain_interval=0)
+    s = get_session(log)
+    s.query(S).filter(S.i > 17).descending(S.i).limit(5).all()
+    entry, = entries
+    eq_(entry['operation'], 'query')
+    eq_(entry['collection'], 'S')
+    eq_(entry['spec'], {'i' : {'$gt' : 17}})
+    eq_(entry['sort'], [('i', -1)])
+    eq_(entry['limit'], 5)
+    eq_(entry['count'], 2)
+    eq_(entry['explain']['nscanned'], 20)
+    eq_(entry['full_scan'], True)
+    eq_(entry['scan_ratio'], 10.0)
+    eq_(entry['inefficient'], True)
+
+def test_threshold():
+    entries = []
+    log = SlowQueryLog(threshold=60, callback=entries.append)
+    s = get_session(log)
+    s.query(S).all()
+    s.query(S).set(S.i, 1).execute()
+    eq_(entries, [])
+
+def test_explain_rate_limit():
+    entries = []
+    log = SlowQueryLog(threshold=0, callback=entries.append, explain_interval=60)
+    s = get_session(log)
+    s.query(S).filter(S.i == 1).set(S.i, 2).execute()
+    s.remove_query(S).filter(S.i == 2).execute()
+    eq_([e['operation'] for e in entries], ['update', 'remove'])
+    eq_(entries[0]['update'], {'$set' : {'i' : 2}})
+    assert entries[0]['explain'] is not None
+    eq_(entries[1]['explain'], None)
+    eq_(entries[1]['full_scan'], None)
+
+def test_file_and_detach():
+    path = os.path.join(tempfile.mkdtemp(), 'slow.log')
+    log = SlowQueryLog(threshold=0, path=path)
+    s = get_session(log)
+    s.query(S).filter(S.i == 3).all()
+    log.detach(s)
+    s.query(S).all()
+    log.close()
+    lines = open(path).read().splitlines()
+    eq_(len(lines), 1)
+    eq_(json.loads(lines[0])['spec'], {'i' : 3})
+
+def test_plan_flags():
+    eq_(plan_flags({'cursor' : 'BtreeCursor i_1', 'n' : 5, 'nscanned' : 5}),
+        {'full_scan' : False, 'scan_ratio' : 1.0, 'inefficient' : False})
+    flags = plan_flags({'queryPlanner' : {'winningPlan' : {'stage' : 'FETCH',
+            'inputStage' : {'stage' : 'COLLSCAN'}}},
+        'executionStats' : {'nReturned' : 0, 'totalDocsExamined' : 1000}})
+    eq_(flags, {'full_scan' : True, 'scan_ratio' : 1000.0, 'inefficient' : True})
+
+@raises(TypeError)
+def test_needs_output():
+    SlowQueryLog()
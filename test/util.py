@@ -5,6 +5,7 @@ Utilities used throughout the tests.
 
 from functools import wraps
 from mongoalchemy.session import Session
+from mongoalchemy.memory import MemoryBackend
 
 
 DB_NAME = 'mongoalchemy-unit-test'
@@ -33,3 +34,26 @@ def get_session(*args, **kwargs):
     """
     return Session.connect(DB_NAME, *args, **kwargs)
 
+
+
+def get_memory_session(backend=None, session_class=Session, **kwargs):
+    """
+    Returns a session on ``backend`` (a new :class:`MemoryBackend` by default)
+    for tests which don't need a MongoDB server.
+
+    """
+    if backend is None:
+        backend = MemoryBackend()
+    return session_class(backend, **kwargs)
+
+
+def get_seeded_session(make, n, **kwargs):
+    """
+    Returns a memory session (see :func:`get_memory_session`) holding the
+    documents ``make(0)`` to ``make(n - 1)``.
+
+    """
+    s = get_memory_session(**kwargs)
+    for i in range(n):
+        s.insert(make(i))
+    return s